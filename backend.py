@@ -7,27 +7,52 @@ __version__ = "2.0"
 __maintainer__ = "Rodrigue Chakode"
 __status__ = "Production"
 
+import abc
 import argparse
+import array
 import base64
+import bisect
 import calendar
 import collections
+import concurrent.futures
+import contextlib
+import csv
 import enum
 import errno
+import fcntl
 import fnmatch
+import functools
+import gzip
+import hashlib
+import heapq
+import itertools
 import json
 import logging
+import math
+import mimetypes
+import mmap
+import multiprocessing
 import os
+import queue
+import re
+import signal
+import sqlite3
+import struct
+import sys
+import tempfile
 import threading
 import time
 import traceback
+import types
 import urllib
-from typing import Any, List
+import zlib
 
 import flask
 
 from flask_cors import CORS, cross_origin
 
 import prometheus_client
+import prometheus_client.core
 
 import requests
 
@@ -38,6 +63,7 @@ import urllib3
 from waitress import serve as waitress_serve
 
 import werkzeug.middleware.dispatcher as wsgi
+import werkzeug.security
 
 urllib3.disable_warnings()
 
@@ -51,6 +77,44 @@ def create_directory_if_not_exists(path):
             raise
 
 
+def replace_file_atomically(path, data):
+    """Write data to path through a temporary file renamed over it, so readers never see a partial file."""
+    directory, filename = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix=".%s." % filename, suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+DATASET_DIGESTS = {}
+
+
+def write_dataset_file(path, content):
+    """Write a frontend dataset file atomically, along with its gzip-compressed .gz sibling.
+
+    The plain file is replaced first and its sibling right after, so a .gz file older than the plain
+    file is stale and must not be served. Files whose content has not changed since they were last
+    written are left untouched, which also keeps their ETag.
+
+    :return: True if the file was written, False if it was unchanged
+    """
+    data = content.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    if DATASET_DIGESTS.get(path) == digest and os.path.exists(path) and os.path.exists(path + ".gz"):
+        PROMETHEUS_DATASET_UNCHANGED_EXPORTER.inc()
+        return False
+    replace_file_atomically(path, data)
+    replace_file_atomically(path + ".gz", gzip.compress(data, compresslevel=6, mtime=0))
+    DATASET_DIGESTS[path] = digest
+    return True
+
+
 def get_backend_config_env(var_name, default_value=None):
     """Retrieve environment variable, prioritizing KL_ prefix over KOA_ using explicit check."""
     kl_var = "KL_{}".format(var_name)
@@ -64,6 +128,39 @@ def get_backend_config_env(var_name, default_value=None):
     return default_value
 
 
+class NamespaceFilter:
+    """Match namespaces against included and excluded glob patterns.
+
+    Each pattern list is compiled once into a single regular expression, and the verdict for each
+    namespace is cached until reset() is called (once per polling cycle).
+    """
+
+    def __init__(self, included_patterns, excluded_patterns):
+        self.all_included = len(included_patterns) == 0 or "*" in included_patterns
+        self.included_regex = self.compile_patterns(included_patterns)
+        self.excluded_regex = self.compile_patterns(excluded_patterns)
+        self.verdicts = {}
+
+    @staticmethod
+    def compile_patterns(patterns):
+        if not patterns:
+            return None
+        return re.compile("|".join(fnmatch.translate(p) for p in patterns))
+
+    def allow(self, namespace):
+        verdict = self.verdicts.get(namespace)
+        if verdict is None:
+            if self.excluded_regex is not None and self.excluded_regex.match(namespace):
+                verdict = False
+            else:
+                verdict = self.all_included or self.included_regex.match(namespace) is not None
+            self.verdicts[namespace] = verdict
+        return verdict
+
+    def reset(self):
+        self.verdicts.clear()
+
+
 class Config:
     version = "26.01.1"
     db_round_decimals = 6
@@ -95,6 +192,24 @@ class Config:
         i for i in get_backend_config_env("EXCLUDED_NAMESPACES", "").replace(" ", ",").split(",") if i
     ]
     nvidia_dcgm_endpoint = get_backend_config_env("NVIDIA_DCGM_ENDPOINT", None)
+    k8s_api_pool_size = int(get_backend_config_env("K8S_API_POOL_SIZE", "6"))
+    rrdcached_address = get_backend_config_env("RRDCACHED_ADDRESS", None)
+    rrd_write_queue_size = int(get_backend_config_env("RRD_WRITE_QUEUE_SIZE", "4"))
+    k8s_list_page_size = int(get_backend_config_env("K8S_LIST_PAGE_SIZE", "0"))
+    k8s_informer_enabled = (lambda v: v.lower() in ("yes", "true"))(
+        get_backend_config_env("K8S_INFORMER_ENABLED", "false")
+    )
+    k8s_watch_timeout_sec = int(get_backend_config_env("K8S_WATCH_TIMEOUT_SEC", "300"))
+    export_workers = int(get_backend_config_env("EXPORT_WORKERS", "0"))
+    usage_cache_max_points = int(get_backend_config_env("USAGE_CACHE_MAX_POINTS", "1000000"))
+    trend_max_points = int(get_backend_config_env("TREND_MAX_POINTS", "0"))
+    prometheus_top_n = int(get_backend_config_env("PROMETHEUS_TOP_N", "0"))
+    storage_backend = get_backend_config_env("STORAGE_BACKEND", "rrd")
+    sqlite_path = get_backend_config_env("SQLITE_PATH", "%s.sqlite" % db_location)
+    mmap_path = get_backend_config_env("MMAP_PATH", "%s.ring" % db_location)
+    catalog_path = get_backend_config_env("CATALOG_PATH", None)
+    retention_grace_days = int(get_backend_config_env("RETENTION_GRACE_DAYS", "0"))
+    archive_location = get_backend_config_env("ARCHIVE_LOCATION", "%s.archive" % db_location)
 
     def process_cost_model_config(self):
         cost_model_label = "cumulative"
@@ -116,13 +231,16 @@ class Config:
 
     def __init__(self):
         self.billing_hourly_rate = None
+        self.namespace_filter = NamespaceFilter(self.included_namespaces, self.excluded_namespaces)
         self.process_billing_hourly_rate_config()
         self.load_rbac_auth_token()
         self.process_cost_model_config()
         create_directory_if_not_exists(self.frontend_data_location)
         cost_model_label, cost_model_unit = self.process_cost_model_config()
-        with open(str("%s/backend.json" % self.frontend_data_location), "w") as fd:
-            fd.write('{"cost_model":"%s", "currency":"%s"}' % (cost_model_label, cost_model_unit))
+        write_dataset_file(
+            str("%s/backend.json" % self.frontend_data_location),
+            '{"cost_model":"%s", "currency":"%s"}' % (cost_model_label, cost_model_unit),
+        )
 
         # check listener port
         try:
@@ -136,20 +254,9 @@ class Config:
         else:
             self.koa_verify_ssl_option = self.k8s_verify_ssl
 
-    @staticmethod
-    def match(items, pattern):
-        return any([fnmatch.fnmatch(i, pattern) for i in items])
-
     @staticmethod
     def allow_namespace(namespace):
-        if KOA_CONFIG.match(KOA_CONFIG.excluded_namespaces, namespace):
-            return False
-
-        no_namespace_included = len(KOA_CONFIG.included_namespaces) == 0
-        all_namespaces_enabled = "*" in KOA_CONFIG.included_namespaces
-        namespace_matched = KOA_CONFIG.match(KOA_CONFIG.included_namespaces, namespace)
-
-        return no_namespace_included or all_namespaces_enabled or namespace_matched
+        return KOA_CONFIG.namespace_filter.allow(namespace)
 
     def load_rbac_auth_token(self):
         """Load the service account token when applicable."""
@@ -208,36 +315,143 @@ class RrdPeriod(enum.IntEnum):
 
 
 # initialize Prometheus exporter
-PROMETHEUS_HOURLY_USAGE_EXPORTER = prometheus_client.Gauge(
-    "koa_namespace_hourly_usage",
-    "Current hourly resource usage per namespace",
-    ["namespace", "resource"],
-)
-PROMETHEUS_PERIODIC_USAGE_EXPORTERS = {
-    RrdPeriod.PERIOD_14_DAYS_SEC: prometheus_client.Gauge(
-        "koa_namespace_daily_usage",
-        "Current daily resource usage per namespace",
-        ["namespace", "resource"],
-    ),
-    RrdPeriod.PERIOD_YEAR_SEC: prometheus_client.Gauge(
-        "koa_namespace_monthly_usage",
-        "Current monthly resource usage per namespace",
-        ["namespace", "resource"],
-    ),
+PROMETHEUS_HOURLY_USAGE_METRIC = "koa_namespace_hourly_usage"
+PROMETHEUS_PERIODIC_USAGE_METRICS = {
+    RrdPeriod.PERIOD_14_DAYS_SEC: "koa_namespace_daily_usage",
+    RrdPeriod.PERIOD_YEAR_SEC: "koa_namespace_monthly_usage",
 }
-
-PROMETHEUS_PERIODIC_REQUESTS_EXPORTERS = {
-    RrdPeriod.PERIOD_14_DAYS_SEC: prometheus_client.Gauge(
-        "koa_namespace_daily_requests",
-        "Current daily resource reservation per namespace",
-        ["namespace", "resource"],
-    ),
-    RrdPeriod.PERIOD_YEAR_SEC: prometheus_client.Gauge(
-        "koa_namespace_monthly_requests",
-        "Current monthly resource reservation per namespace",
-        ["namespace", "resource"],
-    ),
+PROMETHEUS_PERIODIC_REQUESTS_METRICS = {
+    RrdPeriod.PERIOD_14_DAYS_SEC: "koa_namespace_daily_requests",
+    RrdPeriod.PERIOD_YEAR_SEC: "koa_namespace_monthly_requests",
 }
+PROMETHEUS_ANALYTICS_METRICS = {
+    PROMETHEUS_HOURLY_USAGE_METRIC: "Current hourly resource usage per namespace",
+    "koa_namespace_daily_usage": "Current daily resource usage per namespace",
+    "koa_namespace_monthly_usage": "Current monthly resource usage per namespace",
+    "koa_namespace_daily_requests": "Current daily resource reservation per namespace",
+    "koa_namespace_monthly_requests": "Current monthly resource reservation per namespace",
+}
+
+
+class AnalyticsMetricsCollector:
+    """Expose the per-namespace analytics metrics at scrape time, from the snapshot of the last export.
+
+    Each export cycle publishes a new immutable snapshot replacing the previous one as a whole, so
+    series of namespaces that are no longer exported disappear. When top_n is set, only the top_n
+    namespaces with the largest values are kept for each metric and resource.
+    """
+
+    def __init__(self, top_n=None):
+        self.top_n = KOA_CONFIG.prometheus_top_n if top_n is None else top_n
+        self.snapshot = types.MappingProxyType({})
+
+    def publish(self, samples):
+        """Replace the snapshot with samples, a dict of {(namespace, resource): value} per metric name."""
+        snapshot = {}
+        for name, values in samples.items():
+            items = sorted(values.items())
+            if self.top_n > 0:
+                by_resource = collections.defaultdict(list)
+                for labels, value in items:
+                    by_resource[labels[1]].append((labels, value))
+                items = []
+                for resource_items in by_resource.values():
+                    items.extend(heapq.nlargest(self.top_n, resource_items, key=lambda item: item[1]))
+            snapshot[name] = tuple(items)
+        self.snapshot = types.MappingProxyType(snapshot)
+
+    def families(self, snapshot):
+        for name, documentation in PROMETHEUS_ANALYTICS_METRICS.items():
+            family = prometheus_client.core.GaugeMetricFamily(name, documentation, labels=["namespace", "resource"])
+            for labels, value in snapshot.get(name, ()):
+                family.add_metric(labels, value)
+            yield family
+
+    def describe(self):
+        return list(self.families({}))
+
+    def collect(self):
+        return self.families(self.snapshot)
+
+
+ANALYTICS_METRICS_COLLECTOR = AnalyticsMetricsCollector()
+prometheus_client.REGISTRY.register(ANALYTICS_METRICS_COLLECTOR)
+
+PROMETHEUS_RRD_WRITE_THROUGHPUT_EXPORTER = prometheus_client.Gauge(
+    "koa_puller_rrd_write_samples_per_second",
+    "Number of samples written per second when flushing the last polling cycle to RRD files",
+)
+
+PROMETHEUS_WRITE_QUEUE_DEPTH_EXPORTER = prometheus_client.Gauge(
+    "koa_puller_write_queue_depth",
+    "Number of sample batches waiting to be written to RRD files",
+)
+
+PROMETHEUS_WRITE_QUEUE_FULL_EXPORTER = prometheus_client.Counter(
+    "koa_puller_write_queue_full",
+    "Number of times the puller was blocked because the sample write queue was full",
+)
+
+PROMETHEUS_WRITE_QUEUE_BLOCKED_EXPORTER = prometheus_client.Counter(
+    "koa_puller_write_queue_blocked_seconds",
+    "Time spent by the puller waiting for room in the sample write queue",
+)
+
+PROMETHEUS_STAGE_DURATION_EXPORTER = prometheus_client.Gauge(
+    "koa_cycle_stage_duration_seconds",
+    "Duration of each stage of the last puller and exporter cycles",
+    ["cycle", "stage"],
+)
+
+PROMETHEUS_STAGE_DEADLINE_EXCEEDED_EXPORTER = prometheus_client.Counter(
+    "koa_cycle_stage_deadline_exceeded",
+    "Number of times a stage of the puller or exporter cycles exceeded its deadline",
+    ["cycle", "stage"],
+)
+
+PROMETHEUS_WATCH_ERRORS_EXPORTER = prometheus_client.Counter(
+    "koa_informer_watch_errors",
+    "Number of Kubernetes watches failed with an error other than an expired resource version",
+    ["api_context", "code"],
+)
+
+PROMETHEUS_MISSED_TICKS_EXPORTER = prometheus_client.Counter(
+    "koa_scheduler_missed_ticks",
+    "Number of scheduled runs skipped because the previous run overran its period",
+    ["cycle"],
+)
+
+PROMETHEUS_RRD_FETCHES_EXPORTER = prometheus_client.Gauge(
+    "koa_exporter_rrd_fetches_per_cycle",
+    "Number of rrdtool fetches performed during the last analytics export cycle",
+)
+
+PROMETHEUS_USAGE_CACHE_REQUESTS_EXPORTER = prometheus_client.Counter(
+    "koa_api_usage_cache_requests",
+    "Number of series lookups made by /api/v2/usage queries, by result (hit or miss)",
+    ["result"],
+)
+
+PROMETHEUS_USAGE_CACHE_POINTS_EXPORTER = prometheus_client.Gauge(
+    "koa_api_usage_cache_points",
+    "Number of usage points held in memory to answer /api/v2/usage queries",
+)
+
+PROMETHEUS_DATASET_UNCHANGED_EXPORTER = prometheus_client.Counter(
+    "koa_dataset_files_unchanged",
+    "Number of dataset file writes skipped because their content had not changed",
+)
+
+PROMETHEUS_ARCHIVED_DATABASES_EXPORTER = prometheus_client.Counter(
+    "koa_lifecycle_archived_databases",
+    "Number of databases of inactive namespaces compacted into archives and removed from storage",
+)
+
+PROMETHEUS_API_LATENCY_EXPORTER = prometheus_client.Gauge(
+    "koa_puller_api_request_duration_seconds",
+    "Duration of the last request made by the puller to each collected endpoint",
+    ["endpoint"],
+)
 
 # create Flask application
 app = flask.Flask(__name__, static_url_path=KOA_CONFIG.static_content_location, template_folder=".")
@@ -273,10 +487,85 @@ def send_css(path):
     return flask.send_from_directory("css", path)
 
 
+class DatasetETags:
+    """Compute the content-hash ETags of dataset files, once per version of each file."""
+
+    def __init__(self):
+        self.etags = {}
+        self.lock = threading.Lock()
+
+    def get(self, path, dataset_file):
+        """Return the ETag of the open dataset_file read from path, hashing its content if it changed."""
+        stat = os.fstat(dataset_file.fileno())
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.etags.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: dataset_file.read(1 << 16), b""):
+            digest.update(chunk)
+        dataset_file.seek(0)
+        etag = digest.hexdigest()[:32]
+        with self.lock:
+            self.etags[path] = (version, etag)
+        return etag
+
+
+DATASET_ETAGS = DatasetETags()
+
+
+def read_fresh_gzip_sibling(path, dataset_file):
+    """Return the content of the .gz sibling of a dataset file, or None if missing or stale."""
+    try:
+        with open(path + ".gz", "rb") as gzip_file:
+            if os.fstat(gzip_file.fileno()).st_mtime_ns < os.fstat(dataset_file.fileno()).st_mtime_ns:
+                return None
+            return gzip_file.read()
+    except OSError:
+        return None
+
+
+def send_dataset_file(path):
+    """Send a dataset file, gzip-compressed when the client accepts it, with ETag-based revalidation."""
+    dataset_path = werkzeug.security.safe_join(KOA_CONFIG.frontend_data_location, path)
+    if dataset_path is None or not os.path.isfile(dataset_path):
+        flask.abort(404)
+
+    content_encoding = None
+    with open(dataset_path, "rb") as dataset_file:
+        etag = DATASET_ETAGS.get(dataset_path, dataset_file)
+        content = None
+        if "gzip" in flask.request.accept_encodings and not dataset_path.endswith(".gz"):
+            content = read_fresh_gzip_sibling(dataset_path, dataset_file)
+            if content is not None:
+                content_encoding = "gzip"
+                etag = "%s-gzip" % etag
+        if flask.request.if_none_match.contains(etag):
+            response = flask.Response(status=304)
+        else:
+            if content is None:
+                content = dataset_file.read()
+            mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            if dataset_path.endswith(".gz"):
+                mimetype = "application/gzip"
+            response = flask.Response(content, mimetype=mimetype)
+            if content_encoding is not None:
+                response.headers["Content-Encoding"] = content_encoding
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    return response
+
+
 @app.route("/dataset/<path:path>")
 @cross_origin()
 def download_dataset(path):
-    return flask.send_from_directory("static/data", path)
+    return send_dataset_file(path)
+
+
+@app.route("%s/data/<path:path>" % KOA_CONFIG.static_content_location)
+def send_static_dataset(path):
+    return send_dataset_file(path)
 
 
 @app.route("/")
@@ -290,12 +579,179 @@ def render():
     )
 
 
+USAGE_QUERY_CATEGORIES = {
+    "usage": "",
+    "rf": Config.request_efficiency_db_file_extension(),
+    "gpu": Config.gpu_db_file_extension(),
+}
+
+
+def parse_query_time(value, default):
+    """Parse a query time given as epoch seconds or as an ISO 8601 UTC timestamp."""
+    if value is None or value == "":
+        return default
+    if value.isdigit():
+        return int(value)
+    return calendar.timegm(time.strptime(value, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+@app.route("/api/v2/usage")
+@cross_origin()
+def query_usage():
+    """Query the cpu or memory usage trend of namespaces over a time range.
+
+    Query parameters: namespace (comma-separated, all by default), resource (cpu or memory),
+    category (usage, rf or gpu), from and to (epoch seconds or ISO 8601 UTC timestamps), and step
+    (seconds, points are averaged when coarser than the stored resolution).
+    """
+    args = flask.request.args
+    resource = args.get("resource", "cpu")
+    category = args.get("category", "usage")
+    if resource not in ("cpu", "memory") or category not in USAGE_QUERY_CATEGORIES:
+        return flask.jsonify({"error": "Unexpected resource or category"}), 400
+    try:
+        end = parse_query_time(args.get("to"), calendar.timegm(time.gmtime()))
+        start = parse_query_time(args.get("from"), end - int(RrdPeriod.PERIOD_7_DAYS_SEC))
+        step = int(args.get("step", 0))
+    except ValueError:
+        return flask.jsonify({"error": "Invalid from, to or step parameter"}), 400
+
+    suffix = USAGE_QUERY_CATEGORIES[category]
+    if args.get("namespace"):
+        namespaces = [ns for ns in args.get("namespace").split(",") if ns]
+    else:
+        other_suffixes = [other for other in USAGE_QUERY_CATEGORIES.values() if other and other != suffix]
+        namespaces = [
+            db[: len(db) - len(suffix)]
+            for db in USAGE_QUERY_CACHE.dbnames()
+            if db.endswith(suffix) and not any(db.endswith(other) for other in other_suffixes)
+        ]
+
+    value_index = 1 if resource == "cpu" else 2
+    data = []
+    for ns in namespaces:
+        series = USAGE_QUERY_CACHE.get(ns + suffix)
+        if series is None:
+            continue
+        native_step, points = series
+        for point in UsageQueryCache.resample(points, native_step, step, start, end):
+            data.append({"name": ns, "dateUTC": format_utc_timestamp(point[0]), "usage": point[value_index]})
+    return flask.jsonify(
+        {"resource": resource, "category": category, "from": start, "to": end, "step": step, "data": data}
+    )
+
+
+def node_heatmap_info(node_name, node_info):
+    """Compute the heatmap entry of a node from its nodes.json representation."""
+    # Calculate CPU usage percentage
+    cpu_usage_pct = 0.0
+    if node_info.get("cpuAllocatable", 0) > 0:
+        cpu_used = node_info.get("cpuUsage", 0)
+        cpu_usage_pct = (cpu_used / node_info["cpuAllocatable"]) * 100
+
+    # Calculate memory usage percentage
+    memory_usage_pct = 0.0
+    if node_info.get("memAllocatable", 0) > 0:
+        mem_used = node_info.get("memUsage", 0)
+        memory_usage_pct = (mem_used / node_info["memAllocatable"]) * 100
+
+    # Calculate node size based on CPU capacity (for rectangle sizing)
+    cpu_capacity = node_info.get("cpuCapacity", 1)
+    base_size = 50  # Base rectangle size
+    size_multiplier = max(1, cpu_capacity / 2)  # Scale based on CPU cores
+    rect_size = min(base_size * size_multiplier, 200)  # Cap max size
+
+    # GPU usage percentage is already stored as a percentage (0-100)
+    gpu_usage_pct = node_info.get("gpuUsage", 0)
+    gpu_count = node_info.get("gpuCount", 0)
+    gpu_mem_usage = node_info.get("gpuMemUsage", 0)
+    gpu_mem_free = node_info.get("gpuMemFree", 0)
+    gpu_mem_total = gpu_mem_usage + gpu_mem_free
+    gpu_mem_usage_pct = (gpu_mem_usage / gpu_mem_total * 100) if gpu_mem_total > 0 else 0
+
+    return {
+        "name": node_name,
+        "cpuUsagePercent": round(cpu_usage_pct, 2),
+        "memoryUsagePercent": round(memory_usage_pct, 2),
+        "gpuComputeUsagePercent": round(gpu_usage_pct, 2),
+        "gpuMemoryUsagePercent": round(gpu_mem_usage_pct, 2),
+        "cpuCapacity": node_info.get("cpuCapacity", 0),
+        "memoryCapacity": node_info.get("memCapacity", 0),
+        "cpuAllocatable": node_info.get("cpuAllocatable", 0),
+        "memoryAllocatable": node_info.get("memAllocatable", 0),
+        "cpuUsage": node_info.get("cpuUsage", 0),
+        "memoryUsage": node_info.get("memUsage", 0),
+        "gpuCount": gpu_count,
+        "gpuComputeUsage": gpu_usage_pct,
+        "gpuMemoryUsage": gpu_mem_usage,
+        "gpuMemoryFree": gpu_mem_free,
+        "gpuMemoryTotal": gpu_mem_total,
+        "state": node_info.get("state", "Unknown"),
+        "podsRunning": len(node_info.get("podsRunning", [])),
+        "rectSize": round(rect_size, 0),
+    }
+
+
+class NodeHeatmapCache:
+    """Keep the node heatmap response of the last puller cycle, serialized and gzip-compressed once.
+
+    The entry, and thus its ETag and Last-Modified date, is only replaced when the heatmap content
+    changes, so that polls of an unchanged heatmap are answered with 304.
+    """
+
+    def __init__(self):
+        self.entry = None
+
+    def update(self, nodes):
+        """Build the heatmap from the Node objects of the current cycle, keyed by node name."""
+        marshaller = JSONMarshaller()
+        heatmap_data = [node_heatmap_info(name, marshaller.default(node)) for name, node in nodes.items()]
+        content = json.dumps(heatmap_data, separators=(",", ":"))
+        etag = hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+        if self.entry is not None and self.entry["etag"] == etag:
+            return False
+        now = int(time.time())
+        body = json.dumps(
+            {"nodes": heatmap_data, "timestamp": now, "total_nodes": len(heatmap_data)}, separators=(",", ":")
+        ).encode("utf-8")
+        self.entry = {
+            "etag": etag,
+            "last_modified": now,
+            "body": body,
+            "gzip_body": gzip.compress(body, compresslevel=6, mtime=0),
+        }
+        return True
+
+    def response(self):
+        """Return the cached heatmap response for the current request, or None if not built yet."""
+        entry = self.entry
+        if entry is None:
+            return None
+        if "gzip" in flask.request.accept_encodings:
+            response = flask.Response(entry["gzip_body"], mimetype="application/json")
+            response.headers["Content-Encoding"] = "gzip"
+            response.set_etag("%s-gzip" % entry["etag"])
+        else:
+            response = flask.Response(entry["body"], mimetype="application/json")
+            response.set_etag(entry["etag"])
+        response.last_modified = entry["last_modified"]
+        response.vary.add("Accept-Encoding")
+        return response.make_conditional(flask.request)
+
+
+NODE_HEATMAP_CACHE = NodeHeatmapCache()
+
+
 @app.route("/api/nodes/heatmap")
 @cross_origin()
 def get_node_heatmap_data():
     """Get node heatmap data for CPU and memory usage visualization."""
     try:
-        # Read nodes data
+        cached_response = NODE_HEATMAP_CACHE.response()
+        if cached_response is not None:
+            return cached_response
+
+        # Read nodes data, until the puller has built the heatmap
         nodes_file = f"{KOA_CONFIG.frontend_data_location}/nodes.json"
         if not os.path.exists(nodes_file):
             return flask.jsonify({"error": "Nodes data not available", "nodes": []})
@@ -303,57 +759,7 @@ def get_node_heatmap_data():
         with open(nodes_file, "r") as f:
             nodes_data = json.load(f)
 
-        heatmap_data = []
-        for node_name, node_info in nodes_data.items():
-            # Calculate CPU usage percentage
-            cpu_usage_pct = 0.0
-            if hasattr(node_info, "cpuAllocatable") and node_info.get("cpuAllocatable", 0) > 0:
-                cpu_used = node_info.get("cpuUsage", 0)
-                cpu_usage_pct = (cpu_used / node_info["cpuAllocatable"]) * 100
-
-            # Calculate memory usage percentage
-            memory_usage_pct = 0.0
-            if hasattr(node_info, "memAllocatable") and node_info.get("memAllocatable", 0) > 0:
-                mem_used = node_info.get("memUsage", 0)
-                memory_usage_pct = (mem_used / node_info["memAllocatable"]) * 100
-
-            # Calculate node size based on CPU capacity (for rectangle sizing)
-            cpu_capacity = node_info.get("cpuCapacity", 1)
-            base_size = 50  # Base rectangle size
-            size_multiplier = max(1, cpu_capacity / 2)  # Scale based on CPU cores
-            rect_size = min(base_size * size_multiplier, 200)  # Cap max size
-
-            # GPU usage percentage is already stored as a percentage (0-100)
-            gpu_usage_pct = node_info.get("gpuUsage", 0)
-            gpu_count = node_info.get("gpuCount", 0)
-            gpu_mem_usage = node_info.get("gpuMemUsage", 0)
-            gpu_mem_free = node_info.get("gpuMemFree", 0)
-            gpu_mem_total = gpu_mem_usage + gpu_mem_free
-            gpu_mem_usage_pct = (gpu_mem_usage / gpu_mem_total * 100) if gpu_mem_total > 0 else 0
-
-            node_heatmap_info = {
-                "name": node_name,
-                "cpuUsagePercent": round(cpu_usage_pct, 2),
-                "memoryUsagePercent": round(memory_usage_pct, 2),
-                "gpuComputeUsagePercent": round(gpu_usage_pct, 2),
-                "gpuMemoryUsagePercent": round(gpu_mem_usage_pct, 2),
-                "cpuCapacity": node_info.get("cpuCapacity", 0),
-                "memoryCapacity": node_info.get("memCapacity", 0),
-                "cpuAllocatable": node_info.get("cpuAllocatable", 0),
-                "memoryAllocatable": node_info.get("memAllocatable", 0),
-                "cpuUsage": node_info.get("cpuUsage", 0),
-                "memoryUsage": node_info.get("memUsage", 0),
-                "gpuCount": gpu_count,
-                "gpuComputeUsage": gpu_usage_pct,
-                "gpuMemoryUsage": gpu_mem_usage,
-                "gpuMemoryFree": gpu_mem_free,
-                "gpuMemoryTotal": gpu_mem_total,
-                "state": node_info.get("state", "Unknown"),
-                "podsRunning": len(node_info.get("podsRunning", [])),
-                "rectSize": round(rect_size, 0),
-            }
-            heatmap_data.append(node_heatmap_info)
-
+        heatmap_data = [node_heatmap_info(node_name, node_info) for node_name, node_info in nodes_data.items()]
         return flask.jsonify(
             {
                 "nodes": heatmap_data,
@@ -388,7 +794,81 @@ def get_http_resource_or_return_none_on_error(url):
     return data
 
 
+K8S_QUANTITY_BINARY_SUFFIXES = {
+    "Ki": 1024,
+    "Mi": 1048576,
+    "Gi": 1073741824,
+    "Ti": 1099511627776,
+    "Pi": 1125899906842624,
+    "Ei": 1152921504606847000,
+}
+
+K8S_QUANTITY_DECIMAL_SUFFIXES = {
+    "k": 1e3,
+    "K": 1e3,
+    "M": 1e6,
+    "G": 1e9,
+    "T": 1e12,
+    "P": 1e15,
+    "E": 1e18,
+    "m": 1e-3,
+    "u": 1e-6,
+    "n": 1e-9,
+}
+
+
+@functools.lru_cache(maxsize=16384)
+def format_utc_timestamp(epoch):
+    """Render an epoch time as an ISO 8601 UTC timestamp, once per distinct time axis point."""
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_quantity(quantity):
+    """Decode a Kubernetes resource quantity (e.g. "100m", "128Mi") into a float.
+
+    Results are memoized since a cluster only uses a small set of distinct quantity strings.
+    """
+    multiplier = K8S_QUANTITY_BINARY_SUFFIXES.get(quantity[-2:])
+    if multiplier is not None:
+        return multiplier * float(quantity[:-2])
+    multiplier = K8S_QUANTITY_DECIMAL_SUFFIXES.get(quantity[-1:])
+    if multiplier is not None:
+        return multiplier * float(quantity[:-1])
+    return float(quantity)
+
+
 class Node:
+    __slots__ = (
+        "id",
+        "name",
+        "state",
+        "message",
+        "cpuCapacity",
+        "cpuAllocatable",
+        "cpuUsage",
+        "cpuRequest",
+        "cpuUsagePercent",
+        "memCapacity",
+        "memAllocatable",
+        "memUsage",
+        "memRequest",
+        "memUsagePercent",
+        "containerRuntime",
+        "podsRunning",
+        "podsNotRunning",
+        "region",
+        "os",
+        "instanceType",
+        "hourlyPrice",
+        "gpuCapacity",
+        "gpuAllocatable",
+        "gpuCount",
+        "gpuUsage",
+        "gpuMemUsage",
+        "gpuMemFree",
+    )
+
     def __init__(self):
         self.id = ""
         self.name = ""
@@ -397,9 +877,13 @@ class Node:
         self.cpuCapacity = 0.0
         self.cpuAllocatable = 0.0
         self.cpuUsage = 0.0
+        self.cpuRequest = 0.0
+        self.cpuUsagePercent = 0.0
         self.memCapacity = 0.0
         self.memAllocatable = 0.0
         self.memUsage = 0.0
+        self.memRequest = 0.0
+        self.memUsagePercent = 0.0
         self.containerRuntime = ""
         self.podsRunning = []
         self.podsNotRunning = []
@@ -407,6 +891,8 @@ class Node:
         self.os = ""
         self.instanceType = ""
         self.hourlyPrice = 0.0
+        self.gpuCapacity = 0.0
+        self.gpuAllocatable = 0.0
         # GPU metrics aggregated from pods running on this node
         self.gpuCount = 0
         self.gpuUsage = 0.0  # GPU compute utilization percentage
@@ -415,6 +901,22 @@ class Node:
 
 
 class Pod:
+    __slots__ = (
+        "name",
+        "namespace",
+        "id",
+        "nodeName",
+        "phase",
+        "state",
+        "cpuUsage",
+        "memUsage",
+        "cpuRequest",
+        "memRequest",
+        "gpuUsage",
+        "gpuMemUsage",
+        "gpuCount",
+    )
+
     def __init__(self):
         self.name = ""
         self.namespace = ""
@@ -439,6 +941,8 @@ class GpuMetrics:
     Multiple GPUs on the same pod will have their metrics summed.
     """
 
+    __slots__ = ("namespace", "pod", "gpuCpuUsage", "gpuMemBandwidth", "gpuMemUsage", "gpuMemFree", "gpuCount")
+
     def __init__(self):
         self.namespace = ""
         self.pod = ""
@@ -454,6 +958,15 @@ class GpuMetrics:
         self.gpuCount = 0
 
 
+# Mapping of the DCGM metrics extracted by the puller to GpuMetrics attributes
+DCGM_METRIC_MAPPING = {
+    "DCGM_FI_DEV_GPU_UTIL": "gpuCpuUsage",
+    "DCGM_FI_DEV_MEM_COPY_UTIL": "gpuMemBandwidth",
+    "DCGM_FI_DEV_FB_USED": "gpuMemUsage",
+    "DCGM_FI_DEV_FB_FREE": "gpuMemFree",
+}
+
+
 class ResourceCapacities:
     def __init__(self, cpu, mem):
         self.cpu = cpu
@@ -526,41 +1039,13 @@ class K8sUsage:
         self.memCapacity = 0.0
         self.cpuAllocatable = 0.0
         self.memAllocatable = 0.0
-        self.capacityQuantities = {
-            "Ki": 1024,
-            "Mi": 1048576,
-            "Gi": 1073741824,
-            "Ti": 1099511627776,
-            "Pi": 1125899906842624,
-            "Ei": 1152921504606847000,
-            "k": 1e3,
-            "K": 1e3,
-            "M": 1e6,
-            "G": 1e9,
-            "T": 1e12,
-            "P": 1e15,
-            "E": 1e18,
-            "m": 1e-3,
-            "u": 1e-6,
-            "n": 1e-9,
-            "None": 1,
-        }
 
         # GPU metrics storage: key is "pod.namespace", value is GpuMetrics instance
         self.gpuMetricsByPod = {}
 
-    def decode_capacity(self, cap_input):
-        data_length = len(cap_input)
-        cap_unit = "None"
-        cap_value = cap_input
-        if cap_input.endswith(("Ki", "Mi", "Gi", "Ti", "Pi", "Ei")):
-            cap_unit = cap_input[data_length - 2 :]
-            cap_value = cap_input[0 : data_length - 2]
-        elif cap_input.endswith(("n", "u", "m", "k", "K", "M", "G", "T", "P", "E")):
-            cap_unit = cap_input[data_length - 1 :]
-            cap_value = cap_input[0 : data_length - 1]
-        KOA_LOGGER.debug(cap_value)
-        return self.capacityQuantities[cap_unit] * float(cap_value)
+    @staticmethod
+    def decode_capacity(cap_input):
+        return decode_quantity(cap_input)
 
     def extract_namespaces_and_initialize_usage(self, data):
         # exit if not valid data
@@ -568,7 +1053,11 @@ class K8sUsage:
             return
         # process likely valid data
         data_json = json.loads(data)
-        for _, item in enumerate(data_json["items"]):
+        self.extract_namespace_items(data_json["items"])
+
+    def extract_namespace_items(self, items):
+        """Initialize namespace usage from an iterable of namespace items."""
+        for item in items:
             metadata = item.get("metadata", None)
             if metadata is not None:
                 if not KOA_CONFIG.allow_namespace(metadata.get("name")):
@@ -584,7 +1073,11 @@ class K8sUsage:
             return
         # process likely valid data
         data_json = json.loads(data)
-        for _, item in enumerate(data_json["items"]):
+        self.extract_node_items(data_json["items"])
+
+    def extract_node_items(self, items):
+        """Extract nodes from an iterable of node items."""
+        for item in items:
             node = Node()
             node.podsRunning = []
             node.podsNotRunning = []
@@ -597,12 +1090,12 @@ class K8sUsage:
             status = item.get("status", None)
             if status is not None:
                 node.containerRuntime = status["nodeInfo"]["containerRuntimeVersion"]
-                node.cpuCapacity = self.decode_capacity(status["capacity"]["cpu"])
-                node.cpuAllocatable = self.decode_capacity(status["allocatable"]["cpu"])
-                node.memCapacity = self.decode_capacity(status["capacity"]["memory"])
-                node.memAllocatable = self.decode_capacity(status["allocatable"]["memory"])
-                node.gpuCapacity = self.decode_capacity(status["capacity"].get("nvidia.com/gpu", "0"))
-                node.gpuAllocatable = self.decode_capacity(status["allocatable"].get("nvidia.com/gpu", "0"))
+                node.cpuCapacity = decode_quantity(status["capacity"]["cpu"])
+                node.cpuAllocatable = decode_quantity(status["allocatable"]["cpu"])
+                node.memCapacity = decode_quantity(status["capacity"]["memory"])
+                node.memAllocatable = decode_quantity(status["allocatable"]["memory"])
+                node.gpuCapacity = decode_quantity(status["capacity"].get("nvidia.com/gpu", "0"))
+                node.gpuAllocatable = decode_quantity(status["allocatable"].get("nvidia.com/gpu", "0"))
 
                 for _, cond in enumerate(status["conditions"]):
                     node.message = cond["message"]
@@ -636,8 +1129,8 @@ class K8sUsage:
         for _, item in enumerate(data_json["items"]):
             node = self.nodes.get(item["metadata"]["name"], None)
             if node is not None:
-                node.cpuUsage = self.decode_capacity(item["usage"]["cpu"])
-                node.memUsage = self.decode_capacity(item["usage"]["memory"])
+                node.cpuUsage = decode_quantity(item["usage"]["cpu"])
+                node.memUsage = decode_quantity(item["usage"]["memory"])
                 self.nodes[node.name] = node
 
     def extract_pods(self, data):
@@ -647,12 +1140,17 @@ class K8sUsage:
 
         # process likely valid data
         data_json = json.loads(data)
-        for _, item in enumerate(data_json["items"]):
+        self.extract_pod_items(data_json["items"])
+
+    def extract_pod_items(self, items):
+        """Extract pods from an iterable of pod items, e.g. a list or a paginated stream."""
+        for item in items:
             if not KOA_CONFIG.allow_namespace(item["metadata"]["namespace"]):
                 continue
 
             pod = Pod()
-            pod.namespace = item["metadata"]["namespace"]
+            # namespaces are shared by many pods, intern them to store each name once
+            pod.namespace = sys.intern(item["metadata"]["namespace"])
             pod.name = "%s.%s" % (item["metadata"]["name"], pod.namespace)
             pod.id = item["metadata"]["uid"]
             pod.phase = item["status"]["phase"]
@@ -682,7 +1180,7 @@ class K8sUsage:
             if pod.state == "PodNotScheduled":
                 pod.nodeName = None
             else:
-                pod.nodeName = item["spec"]["nodeName"]
+                pod.nodeName = sys.intern(item["spec"]["nodeName"])
                 pod.cpuRequest = 0.0
                 pod.memRequest = 0.0
 
@@ -692,8 +1190,8 @@ class K8sUsage:
                     if resources is not None:
                         resource_requests = resources.get("requests", None)
                         if resource_requests is not None:
-                            pod.cpuRequest += self.decode_capacity(resource_requests.get("cpu", "0"))
-                            pod.memRequest += self.decode_capacity(resource_requests.get("memory", "0"))
+                            pod.cpuRequest += decode_quantity(resource_requests.get("cpu", "0"))
+                            pod.memRequest += decode_quantity(resource_requests.get("memory", "0"))
 
             self.pods[pod.name] = pod
 
@@ -703,7 +1201,11 @@ class K8sUsage:
             return
         # process likely valid data
         data_json = json.loads(data)
-        for _, item in enumerate(data_json["items"]):
+        self.extract_pod_metrics_items(data_json["items"])
+
+    def extract_pod_metrics_items(self, items):
+        """Extract pod metrics from an iterable of PodMetrics items, e.g. a list or a paginated stream."""
+        for item in items:
             if not KOA_CONFIG.allow_namespace(item["metadata"]["namespace"]):
                 continue
             pod_name = "%s.%s" % (
@@ -715,8 +1217,8 @@ class K8sUsage:
                 pod.cpuUsage = 0.0
                 pod.memUsage = 0.0
                 for _, container in enumerate(item["containers"]):
-                    pod.cpuUsage += self.decode_capacity(container["usage"]["cpu"])
-                    pod.memUsage += self.decode_capacity(container["usage"]["memory"])
+                    pod.cpuUsage += decode_quantity(container["usage"]["cpu"])
+                    pod.memUsage += decode_quantity(container["usage"]["memory"])
                 self.pods[pod.name] = pod
 
     def extract_gpu_metrics(self, data_json):
@@ -738,18 +1240,10 @@ class K8sUsage:
         if data_json is None:
             return
 
-        # Mapping of DCGM metric names to GpuMetrics attributes
-        metric_mapping = {
-            "DCGM_FI_DEV_GPU_UTIL": "gpuCpuUsage",
-            "DCGM_FI_DEV_MEM_COPY_UTIL": "gpuMemBandwidth",
-            "DCGM_FI_DEV_FB_USED": "gpuMemUsage",
-            "DCGM_FI_DEV_FB_FREE": "gpuMemFree",
-        }
-
         # Track which GPUs we've seen per pod to count them correctly
         gpus_per_pod = {}
 
-        for metric_name, attr_name in metric_mapping.items():
+        for metric_name, attr_name in DCGM_METRIC_MAPPING.items():
             metric_data = data_json.get(metric_name, [])
 
             for entry in metric_data:
@@ -808,71 +1302,66 @@ class K8sUsage:
         if not self.gpuMetricsByPod:
             return
 
-        with open(str("%s/gpu_metrics.json" % KOA_CONFIG.frontend_data_location), "w") as fd:
-            fd.write(json.dumps(self.gpuMetricsByPod, cls=JSONMarshaller))
+        write_dataset_file(
+            str("%s/gpu_metrics.json" % KOA_CONFIG.frontend_data_location),
+            json.dumps(self.gpuMetricsByPod, cls=JSONMarshaller),
+        )
 
     def consolidate_ns_usage(self):
         """Consolidate namespace usage.
 
-        :return:
+        Usage and requests of scheduled pods are summed per namespace and pods are attached to
+        their node in a single pass over the pods.
         """
-        self.cpuUsageAllPods = 0.0
-        self.memUsageAllPods = 0.0
+        usage_by_ns = self.usageByNamespace
+        request_by_ns = self.requestByNamespace
+        nodes = self.nodes
+        cpu_usage_all_pods = 0.0
+        mem_usage_all_pods = 0.0
         for pod in self.pods.values():
-            if pod.nodeName is not None and hasattr(pod, "cpuUsage") and hasattr(pod, "memUsage"):
-                self.cpuUsageAllPods += pod.cpuUsage
-                self.memUsageAllPods += pod.memUsage
-
-                ns_pod_usage = self.usageByNamespace.get(pod.namespace, None)
-                if ns_pod_usage is not None:
-                    ns_pod_usage.cpu += pod.cpuUsage
-                    ns_pod_usage.mem += pod.memUsage
-                ns_pod_request = self.requestByNamespace.get(pod.namespace, None)
-                if ns_pod_request is not None:
-                    ns_pod_request.cpu += pod.cpuRequest
-                    ns_pod_request.mem += pod.memRequest
-                pod_node = self.nodes.get(pod.nodeName, None)
-                if pod_node is not None:
-                    pod_node.podsRunning.append(pod)
-        self.cpuCapacity += 0.0
-        self.memCapacity += 0.0
-        for node in self.nodes.values():
-            if hasattr(node, "cpuCapacity") and hasattr(node, "memCapacity"):
-                self.cpuCapacity += node.cpuCapacity
-                self.memCapacity += node.memCapacity
-        self.cpuAllocatable += 0.0
-        self.memAllocatable += 0.0
-        for node in self.nodes.values():
-            if hasattr(node, "cpuAllocatable") and hasattr(node, "memAllocatable"):
-                self.cpuAllocatable += node.cpuAllocatable
-                self.memAllocatable += node.memAllocatable
+            if pod.nodeName is None:
+                continue
+            cpu_usage_all_pods += pod.cpuUsage
+            mem_usage_all_pods += pod.memUsage
+
+            ns_pod_usage = usage_by_ns.get(pod.namespace, None)
+            if ns_pod_usage is not None:
+                ns_pod_usage.cpu += pod.cpuUsage
+                ns_pod_usage.mem += pod.memUsage
+            ns_pod_request = request_by_ns.get(pod.namespace, None)
+            if ns_pod_request is not None:
+                ns_pod_request.cpu += pod.cpuRequest
+                ns_pod_request.mem += pod.memRequest
+            pod_node = nodes.get(pod.nodeName, None)
+            if pod_node is not None:
+                pod_node.podsRunning.append(pod)
+        self.cpuUsageAllPods = cpu_usage_all_pods
+        self.memUsageAllPods = mem_usage_all_pods
+
+        self.cpuCapacity += sum(node.cpuCapacity for node in nodes.values())
+        self.memCapacity += sum(node.memCapacity for node in nodes.values())
+        self.cpuAllocatable += sum(node.cpuAllocatable for node in nodes.values())
+        self.memAllocatable += sum(node.memAllocatable for node in nodes.values())
 
     def calculate_node_usage(self):
         """Calculate individual node CPU, memory, and GPU usage from running pods."""
-        for _, node in self.nodes.items():
-            node.cpuUsage = 0.0
-            node.memUsage = 0.0
-            node.cpuRequest = 0.0
-            node.memRequest = 0.0
+        gpu_metrics_by_pod = self.gpuMetricsByPod
+        for node in self.nodes.values():
+            pods_running = node.podsRunning
+            node.cpuUsage = sum(pod.cpuUsage for pod in pods_running)
+            node.memUsage = sum(pod.memUsage for pod in pods_running)
+            node.cpuRequest = sum(pod.cpuRequest for pod in pods_running)
+            node.memRequest = sum(pod.memRequest for pod in pods_running)
             node.gpuCount = 0
             node.gpuUsage = 0.0
             node.gpuMemUsage = 0.0
             node.gpuMemFree = 0.0
 
-            # Sum up usage from all pods running on this node
-            if hasattr(node, "podsRunning") and node.podsRunning:
-                for pod in node.podsRunning:
-                    if hasattr(pod, "cpuUsage") and hasattr(pod, "memUsage"):
-                        node.cpuUsage += pod.cpuUsage
-                        node.memUsage += pod.memUsage
-                    if hasattr(pod, "cpuRequest") and hasattr(pod, "memRequest"):
-                        node.cpuRequest += pod.cpuRequest
-                        node.memRequest += pod.memRequest
-
-                    # Aggregate GPU metrics from pod and copy to pod object
-                    pod_key = pod.name  # pod.name is already "podname.namespace"
-                    if pod_key in self.gpuMetricsByPod:
-                        gpu_metrics = self.gpuMetricsByPod[pod_key]
+            # Aggregate GPU metrics from pods and copy them to pod objects
+            if gpu_metrics_by_pod:
+                for pod in pods_running:
+                    gpu_metrics = gpu_metrics_by_pod.get(pod.name)  # pod.name is already "podname.namespace"
+                    if gpu_metrics is not None:
                         # Copy GPU metrics to pod for frontend display
                         pod.gpuUsage = gpu_metrics.gpuCpuUsage
                         pod.gpuMemUsage = gpu_metrics.gpuMemUsage
@@ -884,12 +1373,12 @@ class K8sUsage:
                         node.gpuMemFree += gpu_metrics.gpuMemFree
 
             # Calculate usage percentages
-            if hasattr(node, "cpuAllocatable") and node.cpuAllocatable > 0:
+            if node.cpuAllocatable > 0:
                 node.cpuUsagePercent = round((node.cpuUsage / node.cpuAllocatable) * 100, 2)
             else:
                 node.cpuUsagePercent = 0.0
 
-            if hasattr(node, "memAllocatable") and node.memAllocatable > 0:
+            if node.memAllocatable > 0:
                 node.memUsagePercent = round((node.memUsage / node.memAllocatable) * 100, 2)
             else:
                 node.memUsagePercent = 0.0
@@ -899,8 +1388,9 @@ class K8sUsage:
                 node.gpuUsage = round(node.gpuUsage / node.gpuCount, 2)
 
     def dump_nodes(self):
-        with open(str("%s/nodes.json" % KOA_CONFIG.frontend_data_location), "w") as fd:
-            fd.write(json.dumps(self.nodes, cls=JSONMarshaller))
+        write_dataset_file(
+            str("%s/nodes.json" % KOA_CONFIG.frontend_data_location), json.dumps(self.nodes, cls=JSONMarshaller)
+        )
 
 
 def compute_usage_percent_ratio(value, total):
@@ -912,189 +1402,1540 @@ class ResUsageType(enum.IntEnum):
     MEMORY = 1
 
 
-class Rrd:
-    def __init__(self, db_files_location=None, dbname=None):
-        create_directory_if_not_exists(db_files_location)
-        self.dbname = dbname
-        self.rrd_location = str("%s/%s" % (KOA_CONFIG.db_location, dbname))
-        self.create_rrd_file_if_not_exists()
+class RrdRegistry:
+    """Keep track of the RRD files known to exist, so that they are only checked and created once."""
 
-    def get_creation_time_epoch(self):
-        return int(os.path.getctime(self.rrd_location))
+    def __init__(self):
+        self.known_directories = set()
+        self.known_files = set()
+        self.lock = threading.Lock()
 
-    @staticmethod
-    def get_date_group(timeUTC, period):
-        if period == RrdPeriod.PERIOD_YEAR_SEC:
-            return time.strftime("%b %Y", timeUTC)
-        return time.strftime("%d %b", timeUTC)
+    def ensure(self, rrd, db_files_location):
+        """Make sure the RRD file of the given Rrd instance exists."""
+        if rrd.rrd_location in self.known_files:
+            return
+        with self.lock:
+            if db_files_location not in self.known_directories:
+                create_directory_if_not_exists(db_files_location)
+                self.known_directories.add(db_files_location)
+            rrd.create_rrd_file_if_not_exists()
+            self.known_files.add(rrd.rrd_location)
 
-    def create_rrd_file_if_not_exists(self):
-        if not os.path.exists(self.rrd_location):
-            xfs = 2 * KOA_CONFIG.polling_interval_sec
-            rrdtool.create(
-                self.rrd_location,
-                "--step",
-                str(KOA_CONFIG.polling_interval_sec),
-                "--start",
-                "0",
-                str("DS:cpu_usage:GAUGE:%d:U:U" % xfs),
-                str("DS:mem_usage:GAUGE:%d:U:U" % xfs),
-                "RRA:AVERAGE:0.5:1:4032",
-                "RRA:AVERAGE:0.5:12:8880",
-            )
+    def forget(self, rrd_location):
+        """Drop a RRD file from the registry, e.g. after it has been removed."""
+        with self.lock:
+            self.known_files.discard(rrd_location)
 
-    def add_sample(self, timestamp_epoch, cpu_usage, mem_usage):
-        KOA_LOGGER.debug("[puller][sample] %s, %f, %f", self.dbname, cpu_usage, mem_usage)
+
+RRD_REGISTRY = RrdRegistry()
+
+
+def rrdcached_options():
+    """Return the rrdtool options to route reads and writes through rrdcached, when configured."""
+    if KOA_CONFIG.rrdcached_address:
+        return ["--daemon", KOA_CONFIG.rrdcached_address]
+    return []
+
+
+class TimeSeriesStorage(abc.ABC):
+    """Storage engine of the usage series, one per database (namespace, __rf and __gpu twins).
+
+    Rrd instances are handles on a database and delegate their reads and writes to the configured
+    storage. Points are (timestamp, cpu, mem) tuples, where timestamp ends the consolidation
+    interval and cpu and mem are None when unknown. Engines supporting bulk reads answer
+    read_points_many with a single scan across databases.
+    """
+
+    name = None
+    bulk_reads = False
+
+    @abc.abstractmethod
+    def ensure(self, rrd, db_files_location):
+        """Make sure the database of the given Rrd handle exists."""
+
+    @abc.abstractmethod
+    def write(self, rrd, samples, writer=None):
+        """Append (timestamp, cpu, mem) samples, in increasing timestamp order, to a database."""
+
+    def write_many(self, samples_by_dbname, writer=None):
+        """Append the samples of several databases, see write."""
+        for dbname, samples in samples_by_dbname.items():
+            Rrd(db_files_location=KOA_CONFIG.db_location, dbname=dbname).add_samples(samples, writer=writer)
+
+    @abc.abstractmethod
+    def last_update(self, rrd):
+        """Return the epoch time of the last sample written to a database."""
+
+    @abc.abstractmethod
+    def read_points(self, rrd, step, start, end):
+        """Read the points consolidated with AVERAGE between start and end."""
+
+    def read_points_many(self, dbnames, step, start, end):
+        """Read the same range from several databases, see read_points.
+
+        :return: dict of points by database name
+        """
+        return {
+            dbname: self.read_points(Rrd(db_files_location=KOA_CONFIG.db_location, dbname=dbname), step, start, end)
+            for dbname in dbnames
+        }
+
+    @abc.abstractmethod
+    def list_databases(self):
+        """Return the names of the existing databases."""
+
+    @abc.abstractmethod
+    def remove(self, dbname):
+        """Delete a database and its samples."""
+
+    def resolution(self, step, start):
+        """Select the finest of self.archives, (resolution, retained rows) pairs, fitting step and covering start."""
+        now = calendar.timegm(time.gmtime())
+        for resolution, retained_rows in self.archives:
+            if resolution >= step and start >= now - resolution * retained_rows:
+                return resolution
+        return self.archives[-1][0]
+
+
+class RrdStorage(TimeSeriesStorage):
+    """Store each database in a RRD file under KL_DB_LOCATION, written and read with rrdtool."""
+
+    name = "rrd"
+
+    def ensure(self, rrd, db_files_location):
+        RRD_REGISTRY.ensure(rrd, db_files_location)
+
+    def write(self, rrd, samples, writer=None):
+        """Write samples in a single rrdtool update.
+
+        :param writer: function called like rrdtool.update, mainly to substitute it in tests
+        """
         try:
-            rrdtool.update(
-                self.rrd_location,
-                "%s:%s:%s"
-                % (
-                    timestamp_epoch,
-                    round(cpu_usage, KOA_CONFIG.db_round_decimals),
-                    round(mem_usage, KOA_CONFIG.db_round_decimals),
-                ),
+            (writer or rrdtool.update)(
+                *rrdcached_options(), rrd.rrd_location, *[Rrd.format_sample(*sample) for sample in samples]
             )
         except rrdtool.OperationalError:
             KOA_LOGGER.error("failing adding rrd sample => %s", traceback.format_exc())
 
-    def dump_trend_data(self, period, step_in=None):
-        now_epoch_utc = calendar.timegm(time.gmtime())
-        step = int(step_in) if step_in is not None else int(RrdPeriod.PERIOD_1_HOUR_SEC)
+    def last_update(self, rrd):
+        return int(rrdtool.last(*rrdcached_options(), rrd.rrd_location))
 
-        rrd_end_ts_in = int(int(calendar.timegm(time.gmtime()) * step) / step)
-        rrd_start_ts_in = int(rrd_end_ts_in - int(period))
+    def read_points(self, rrd, step, start, end):
         rrd_result = rrdtool.fetch(
-            self.rrd_location,
+            *rrdcached_options(),
+            rrd.rrd_location,
             "AVERAGE",
             "-r",
             str(step),
             "-s",
-            str(rrd_start_ts_in),
+            str(start),
             "-e",
-            str(rrd_end_ts_in),
+            str(end),
         )
         rrd_start_ts_out, _, step = rrd_result[0]
-        rrd_current_ts = rrd_start_ts_out
-        res_usage = collections.defaultdict(list)
-        sum_res_usage = collections.defaultdict(lambda: 0.0)
-        for _, cdp in enumerate(rrd_result[2]):
-            rrd_current_ts += step
-            if len(cdp) == 2:
-                try:
-                    rrd_cdp_gmtime = time.gmtime(rrd_current_ts)
-                    current_cpu_usage = round(100 * float(cdp[0]), KOA_CONFIG.db_round_decimals) / 100
-                    current_mem_usage = round(100 * float(cdp[1]), KOA_CONFIG.db_round_decimals) / 100
-                    datetime_utc_json = time.strftime("%Y-%m-%dT%H:%M:%SZ", rrd_cdp_gmtime)
-                    res_usage[ResUsageType.CPU].append(
-                        '{"name":"%s","dateUTC":"%s","usage":%f}' % (self.dbname, datetime_utc_json, current_cpu_usage)
-                    )
-                    res_usage[ResUsageType.MEMORY].append(
-                        '{"name":"%s","dateUTC":"%s","usage":%f}' % (self.dbname, datetime_utc_json, current_mem_usage)
-                    )
-                    sum_res_usage[ResUsageType.CPU] += current_cpu_usage
-                    sum_res_usage[ResUsageType.MEMORY] += current_mem_usage
-                    if calendar.timegm(rrd_cdp_gmtime) == int(
-                        int(now_epoch_utc / RrdPeriod.PERIOD_1_HOUR_SEC) * RrdPeriod.PERIOD_1_HOUR_SEC
-                    ):
-                        PROMETHEUS_HOURLY_USAGE_EXPORTER.labels(self.dbname, ResUsageType.CPU.name).set(
-                            current_cpu_usage
-                        )
-                        PROMETHEUS_HOURLY_USAGE_EXPORTER.labels(self.dbname, ResUsageType.MEMORY.name).set(
-                            current_mem_usage
-                        )
-                except Exception:
-                    pass
+        return Rrd.decode_cdps(rrd_start_ts_out, step, rrd_result[2])
 
-        if sum_res_usage[ResUsageType.CPU] > 0.0 and sum_res_usage[ResUsageType.MEMORY] > 0.0:
-            return (",".join(res_usage[ResUsageType.CPU]), ",".join(res_usage[ResUsageType.MEMORY]))
-        else:
-            if step_in is None:
-                return self.dump_trend_data(period, step_in=RrdPeriod.PERIOD_5_MINS_SEC)
-        return "", ""
+    def list_databases(self):
+        for _, _, filenames in os.walk(KOA_CONFIG.db_location):
+            return [fn for fn in filenames if not fn.startswith(DatabaseCatalog.file_name)]
+        return []
 
-    def dump_histogram_data(self, period, step_in=None):
-        step = int(step_in) if step_in is not None else int(RrdPeriod.PERIOD_1_HOUR_SEC)
+    def remove(self, dbname):
+        location = Rrd.get_location(dbname)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(location)
+        RRD_REGISTRY.forget(location)
 
-        rrd_end_ts = int(int(calendar.timegm(time.gmtime()) * step) / step)
-        rrd_start_ts = int(rrd_end_ts - int(period))
-        rrd_result = rrdtool.fetch(
-            self.rrd_location,
-            "AVERAGE",
-            "-r",
-            str(step),
-            "-s",
-            str(rrd_start_ts),
-            "-e",
-            str(rrd_end_ts),
-        )
-        rrd_start_ts_out, _, step = rrd_result[0]
-        rrd_current_ts = rrd_start_ts_out
-        periodic_cpu_usage = collections.defaultdict(lambda: 0.0)
-        periodic_mem_usage = collections.defaultdict(lambda: 0.0)
-        for _, cdp in enumerate(rrd_result[2]):
-            rrd_current_ts += step
-            if len(cdp) == 2:
-                try:
-                    rrd_cdp_gmtime = time.gmtime(rrd_current_ts)
-                    date_group = self.get_date_group(rrd_cdp_gmtime, period)
-                    current_cpu_usage = round(100 * float(cdp[0]), KOA_CONFIG.db_round_decimals) / 100
-                    current_mem_usage = round(100 * float(cdp[1]), KOA_CONFIG.db_round_decimals) / 100
-                    periodic_cpu_usage[date_group] += current_cpu_usage
-                    periodic_mem_usage[date_group] += current_mem_usage
-                except Exception:
-                    pass
-        return periodic_cpu_usage, periodic_mem_usage
 
-    @staticmethod
-    def dump_trend_analytics(dbfiles, category="usage", prefix=""):
-        """Compute the analytics trends given a category.
+class SqliteStorage(TimeSeriesStorage):
+    """Store all the databases in a single SQLite file in WAL mode.
 
-        :param dbfiles: array of RRD files
-        :param category: may be 'usage' or 'rf' (request factor) according the type of analytics trends expected
-        :param prefix: optional prefix for output filenames (e.g., 'gpu_')
-        :return: None
+    Samples are kept in one table keyed by (series, resolution, timestamp), at the polling
+    resolution and hourly, with the retention of the RRD archives. Each row holds the cpu and mem
+    sums and the sample count of its interval, so that averages are consolidated on write, and an
+    interval is unknown when less than half of it was sampled. Reads of many databases over the
+    same range are served by one query.
+    """
+
+    name = "sqlite"
+    bulk_reads = True
+    max_query_parameters = 500
+
+    def __init__(self, path, polling_interval_sec=None):
+        self.path = path
+        step = int(polling_interval_sec or KOA_CONFIG.polling_interval_sec)
+        self.polling_interval_sec = step
+        # (resolution, retained rows), as the RRAs of RrdStorage
+        self.archives = ((step, 4032), (12 * step, 8880))
+        self.series_ids = {}
+        self.local = threading.local()
+        self.schema_lock = threading.Lock()
+        self.schema_ready = False
+
+    def connection(self):
+        """Return the connection of the calling thread, creating the schema on first use."""
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            return conn
+        with self.schema_lock:
+            if not self.schema_ready:
+                create_directory_if_not_exists(os.path.dirname(os.path.abspath(self.path)))
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self.schema_ready:
+                with conn:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS series ("
+                        "id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, last_update INTEGER NOT NULL DEFAULT 0)"
+                    )
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS samples ("
+                        "series_id INTEGER NOT NULL, resolution INTEGER NOT NULL, ts INTEGER NOT NULL, "
+                        "cpu_sum REAL NOT NULL, mem_sum REAL NOT NULL, samples INTEGER NOT NULL, "
+                        "PRIMARY KEY (series_id, resolution, ts)) WITHOUT ROWID"
+                    )
+                self.schema_ready = True
+        self.local.conn = conn
+        return conn
+
+    def series_id(self, conn, dbname):
+        series_id = self.series_ids.get(dbname)
+        if series_id is None:
+            conn.execute("INSERT OR IGNORE INTO series (name) VALUES (?)", (dbname,))
+            series_id = conn.execute("SELECT id FROM series WHERE name = ?", (dbname,)).fetchone()[0]
+            self.series_ids[dbname] = series_id
+        return series_id
+
+    def ensure(self, rrd, db_files_location):
+        if rrd.dbname not in self.series_ids:
+            conn = self.connection()
+            with conn:
+                self.series_id(conn, rrd.dbname)
+
+    def write(self, rrd, samples, writer=None):
+        self.write_many({rrd.dbname: samples})
+
+    def write_many(self, samples_by_dbname, writer=None):
+        """Write the samples of several databases in one transaction.
+
+        As with rrdtool, samples older than the last update of their database are ignored.
         """
-        res_usage = collections.defaultdict(list)
-        KOA_LOGGER.debug(
-            "[dump_trend_analytics] category=%s, prefix=%s, dbfiles_count=%d", category, prefix, len(dbfiles)
-        )
-        for _, db in enumerate(dbfiles):
-            if db == KOA_CONFIG.db_billing_hourly_rate and not KOA_CONFIG.enable_debug:
-                continue
+        decimals = KOA_CONFIG.db_round_decimals
+        conn = self.connection()
+        with conn:
+            rows = []
+            expired = []
+            last_updates = []
+            for dbname, samples in samples_by_dbname.items():
+                series_id = self.series_id(conn, dbname)
+                last_update = conn.execute("SELECT last_update FROM series WHERE id = ?", (series_id,)).fetchone()[0]
+                newest = last_update
+                for ts, cpu, mem in samples:
+                    ts = int(ts)
+                    if ts <= newest:
+                        continue
+                    newest = ts
+                    for resolution, _ in self.archives:
+                        label = -(-ts // resolution) * resolution
+                        rows.append((series_id, resolution, label, round(cpu, decimals), round(mem, decimals)))
+                if newest > last_update:
+                    last_updates.append((newest, series_id))
+                    for resolution, retained_rows in self.archives:
+                        expired.append((series_id, resolution, newest - resolution * retained_rows))
+            conn.executemany(
+                "INSERT INTO samples (series_id, resolution, ts, cpu_sum, mem_sum, samples) VALUES (?, ?, ?, ?, ?, 1) "
+                "ON CONFLICT (series_id, resolution, ts) DO UPDATE SET cpu_sum = cpu_sum + excluded.cpu_sum, "
+                "mem_sum = mem_sum + excluded.mem_sum, samples = samples + 1",
+                rows,
+            )
+            conn.executemany("DELETE FROM samples WHERE series_id = ? AND resolution = ? AND ts <= ?", expired)
+            conn.executemany("UPDATE series SET last_update = ? WHERE id = ?", last_updates)
+
+    def import_points(self, dbname, resolution, points):
+        """Store consolidated points of a database at one of the archive resolutions, e.g. on migration."""
+        samples = resolution // self.polling_interval_sec
+        conn = self.connection()
+        with conn:
+            series_id = self.series_id(conn, dbname)
+            conn.executemany(
+                "INSERT OR REPLACE INTO samples (series_id, resolution, ts, cpu_sum, mem_sum, samples) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (series_id, resolution, ts, cpu * samples, mem * samples, samples)
+                    for ts, cpu, mem in points
+                    if cpu is not None and mem is not None
+                ],
+            )
+            known = [ts for ts, cpu, mem in points if cpu is not None and mem is not None]
+            if known:
+                conn.execute(
+                    "UPDATE series SET last_update = MAX(last_update, ?) WHERE id = ?", (max(known), series_id)
+                )
 
-            rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=db)
-            current_trend_data = rrd.dump_trend_data(period=RrdPeriod.PERIOD_7_DAYS_SEC)
-            KOA_LOGGER.debug(
-                "[dump_trend_analytics] db=%s, cpu_data_len=%d, mem_data_len=%d",
-                db,
-                len(current_trend_data[0]),
-                len(current_trend_data[1]),
+    def last_update(self, rrd):
+        row = self.connection().execute("SELECT last_update FROM series WHERE name = ?", (rrd.dbname,)).fetchone()
+        return row[0] if row else 0
+
+    def read_points(self, rrd, step, start, end):
+        return self.read_points_many([rrd.dbname], step, start, end)[rrd.dbname]
+
+    def read_points_many(self, dbnames, step, start, end):
+        resolution = self.resolution(int(step), int(start))
+        first_ts = int(start) - int(start) % resolution
+        last_ts = int(end) - int(end) % resolution + resolution
+        min_samples = resolution / (2.0 * self.polling_interval_sec)
+        decimals = KOA_CONFIG.db_round_decimals
+        values = collections.defaultdict(dict)
+        conn = self.connection()
+        dbnames = list(dbnames)
+        for offset in range(0, len(dbnames), self.max_query_parameters):
+            chunk = dbnames[offset : offset + self.max_query_parameters]
+            cursor = conn.execute(
+                "SELECT series.name, samples.ts, samples.cpu_sum, samples.mem_sum, samples.samples "
+                "FROM samples JOIN series ON series.id = samples.series_id "
+                "WHERE series.name IN (%s) AND samples.resolution = ? AND samples.ts > ? AND samples.ts <= ?"
+                % ",".join("?" * len(chunk)),
+                (*chunk, resolution, first_ts, last_ts),
             )
-            for res in [ResUsageType.CPU, ResUsageType.MEMORY]:
-                if current_trend_data[res]:
-                    res_usage[res].append(current_trend_data[res])
+            for dbname, ts, cpu_sum, mem_sum, samples in cursor:
+                if samples >= min_samples:
+                    values[dbname][ts] = (round(cpu_sum / samples, decimals), round(mem_sum / samples, decimals))
+        timestamps = range(first_ts + resolution, last_ts + 1, resolution)
+        return {dbname: [(ts, *values[dbname].get(ts, (None, None))) for ts in timestamps] for dbname in dbnames}
+
+    def list_databases(self):
+        return [row[0] for row in self.connection().execute("SELECT name FROM series ORDER BY name")]
+
+    def remove(self, dbname):
+        conn = self.connection()
+        with conn:
+            row = conn.execute("SELECT id FROM series WHERE name = ?", (dbname,)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM samples WHERE series_id = ?", (row[0],))
+                conn.execute("DELETE FROM series WHERE id = ?", (row[0],))
+        self.series_ids.pop(dbname, None)
+
+
+class MmapStorage(TimeSeriesStorage):
+    """Store all the databases in one memory-mapped file of fixed-step ring buffers.
+
+    The file starts with a header (magic, polling step, ring capacities and slot count) followed by
+    one slot per database. A slot holds the database name and last update, then cpu and mem rings
+    at the polling step and hourly sum and count rings, with the retention of the RRD archives.
+    Writes are in-place float stores, unknown values being NaN, and reads slice the rings of the
+    mapping. The name to slot index is rebuilt from the slot headers when the file is opened, and
+    refreshed when another process added slots. Slots of removed databases are tombstoned and
+    reused by the next databases created, so the file does not grow with namespace churn.
+
+    Slots are allocated without any lock across processes: the engine assumes a single writer
+    process, the backend, other processes (e.g. analytics workers) only reading the file.
+    """
 
-        mem_label = "mem" if prefix else "memory"
-        with open(str("%s/%scpu_%s_trends.json" % (KOA_CONFIG.frontend_data_location, prefix, category)), "w") as fd:
-            fd.write("[" + ",".join(res_usage[0]) + "]")
+    name = "mmap"
+    bulk_reads = True
+    magic = b"KLRING01"
+    header_format = "<8sqqqq"
+    header_size = 64
+    slot_header_doubles = 32
+    name_size = 240
+    growth_slots = 64
+
+    def __init__(self, path, polling_interval_sec=None):
+        self.path = path
+        step = int(polling_interval_sec or KOA_CONFIG.polling_interval_sec)
+        self.polling_interval_sec = step
+        self.archives = ((step, 4032), (12 * step, 8880))
+        self.fine_capacity = self.archives[0][1]
+        self.hourly_capacity = self.archives[1][1]
+        self.slot_doubles = self.slot_header_doubles + 2 * self.fine_capacity + 3 * self.hourly_capacity
+        self.slot_bytes = self.slot_doubles * 8
+        self.slots = {}
+        self.free_slots = []
+        self.slot_count = 0
+        self.mapping = None
+        self.doubles = None
+        self.lock = threading.RLock()
+
+    def open(self):
+        """Map the file, creating it when missing, and index the slots added since the last call."""
+        with self.lock:
+            if self.mapping is None:
+                create_directory_if_not_exists(os.path.dirname(os.path.abspath(self.path)))
+                with open(self.path, "a+b") as f:
+                    if f.tell() == 0:
+                        header = struct.pack(
+                            self.header_format,
+                            self.magic,
+                            self.polling_interval_sec,
+                            self.fine_capacity,
+                            self.hourly_capacity,
+                            0,
+                        )
+                        f.write(header.ljust(self.header_size, b"\0"))
+                self.remap()
+            magic, step, fine_capacity, hourly_capacity, slot_count = struct.unpack_from(
+                self.header_format, self.mapping, 0
+            )
+            if magic != self.magic or (step, fine_capacity, hourly_capacity) != (
+                self.polling_interval_sec,
+                self.fine_capacity,
+                self.hourly_capacity,
+            ):
+                raise ValueError(
+                    "%s is not a ring buffer store with a step of %ds" % (self.path, self.polling_interval_sec)
+                )
+            if self.header_size + slot_count * self.slot_bytes > len(self.mapping):
+                self.remap()
+            for slot in range(self.slot_count, slot_count):
+                name = self.slot_name(slot)
+                if name:
+                    self.slots[name] = slot
+                else:
+                    heapq.heappush(self.free_slots, slot)
+            self.slot_count = slot_count
+            return self.doubles
+
+    def remap(self):
+        """Map the whole file again, e.g. after it has grown; views of the previous mapping stay valid."""
+        with open(self.path, "r+b") as f:
+            self.mapping = mmap.mmap(f.fileno(), 0)
+        self.doubles = memoryview(self.mapping).cast("d")
+
+    def slot_offset(self, slot):
+        return self.header_size + slot * self.slot_bytes
+
+    def slot_name(self, slot):
+        offset = self.slot_offset(slot)
+        return bytes(self.mapping[offset : offset + self.name_size]).rstrip(b"\0").decode("utf-8")
+
+    def slot_base(self, slot):
+        """Return the index of the first double of a slot in self.doubles."""
+        return self.slot_offset(slot) // 8
+
+    def slot(self, dbname, create=False):
+        """Return the slot of a database, allocating it when create is set, or None."""
+        slot = self.slots.get(dbname)
+        if slot is not None and self.doubles is not None and self.slot_name(slot) == dbname:
+            return slot
+        with self.lock:
+            if slot is not None:
+                # the slot has been removed by another process, index the file again
+                self.slots = {}
+                self.free_slots = []
+                self.slot_count = 0
+            self.open()
+            slot = self.slots.get(dbname)
+            if slot is not None or not create:
+                return slot
+            if self.free_slots:
+                slot = heapq.heappop(self.free_slots)
+                self.init_slot(slot, dbname)
+                self.slots[dbname] = slot
+                return slot
+            slot = self.slot_count
+            needed = self.header_size + (slot + 1) * self.slot_bytes
+            if needed > len(self.mapping):
+                with open(self.path, "r+b") as f:
+                    f.truncate(self.header_size + (slot + self.growth_slots) * self.slot_bytes)
+                self.remap()
+            self.init_slot(slot, dbname)
+            self.slot_count = slot + 1
+            struct.pack_into(
+                self.header_format,
+                self.mapping,
+                0,
+                self.magic,
+                self.polling_interval_sec,
+                self.fine_capacity,
+                self.hourly_capacity,
+                self.slot_count,
+            )
+            self.slots[dbname] = slot
+            return slot
+
+    def init_slot(self, slot, dbname):
+        """Name a new or reused slot and reset it: no last update, fine rings unknown, hourly rings zeroed."""
+        offset = self.slot_offset(slot)
+        fine_offset = offset + self.slot_header_doubles * 8
+        hourly_offset = fine_offset + 2 * self.fine_capacity * 8
+        self.mapping[offset:fine_offset] = bytes(fine_offset - offset)
+        self.mapping[fine_offset:hourly_offset] = struct.pack("<d", math.nan) * (2 * self.fine_capacity)
+        self.mapping[hourly_offset : offset + self.slot_bytes] = bytes(offset + self.slot_bytes - hourly_offset)
+        encoded = dbname.encode("utf-8")[: self.name_size]
+        self.mapping[offset : offset + len(encoded)] = encoded
+
+    def ring_offsets(self, slot):
+        """Return the offsets of the fine cpu and mem rings and of the hourly cpu, mem and count rings."""
+        fine = self.slot_base(slot) + self.slot_header_doubles
+        hourly = fine + 2 * self.fine_capacity
+        return (
+            fine,
+            fine + self.fine_capacity,
+            hourly,
+            hourly + self.hourly_capacity,
+            hourly + 2 * self.hourly_capacity,
+        )
 
-        with open(
-            str("%s/%s%s_%s_trends.json" % (KOA_CONFIG.frontend_data_location, prefix, mem_label, category)), "w"
-        ) as fd:
-            fd.write("[" + ",".join(res_usage[1]) + "]")
+    def ensure(self, rrd, db_files_location):
+        """Do nothing: slots are only allocated when samples are written, by the single writer process.
 
-    @staticmethod
-    def dump_histogram_analytics(dbfiles, period, cost_model, prefix=""):
+        Rrd handles are also opened by readers, e.g. analytics workers, which must not allocate
+        slots; reads of a database without slot return unknown points.
+        """
+
+    def write(self, rrd, samples, writer=None):
+        self.write_many({rrd.dbname: samples})
+
+    def write_many(self, samples_by_dbname, writer=None):
+        """Store samples in the rings; as with rrdtool, samples older than the last update are ignored."""
+        decimals = KOA_CONFIG.db_round_decimals
+        step, fine_capacity = self.archives[0]
+        hour, hourly_capacity = self.archives[1]
+        with self.lock:
+            for dbname, samples in samples_by_dbname.items():
+                slot = self.slot(dbname, create=True)
+                doubles = self.doubles
+                last_update_index = self.slot_base(slot) + self.slot_header_doubles - 1
+                fine_cpu, fine_mem, hourly_cpu, hourly_mem, hourly_count = self.ring_offsets(slot)
+                last_update = int(doubles[last_update_index])
+                for ts, cpu, mem in samples:
+                    ts = int(ts)
+                    if ts <= last_update:
+                        continue
+                    label = -(-ts // step)
+                    previous = -(-last_update // step) if last_update else label - 1
+                    for index in range(max(previous + 1, label - fine_capacity + 1), label):
+                        doubles[fine_cpu + index % fine_capacity] = math.nan
+                        doubles[fine_mem + index % fine_capacity] = math.nan
+                    doubles[fine_cpu + label % fine_capacity] = round(cpu, decimals)
+                    doubles[fine_mem + label % fine_capacity] = round(mem, decimals)
+
+                    label = -(-ts // hour)
+                    previous = -(-last_update // hour) if last_update else label - 1
+                    for index in range(max(previous + 1, label - hourly_capacity + 1), label + 1):
+                        for ring in (hourly_cpu, hourly_mem, hourly_count):
+                            doubles[ring + index % hourly_capacity] = 0.0
+                    doubles[hourly_cpu + label % hourly_capacity] += cpu
+                    doubles[hourly_mem + label % hourly_capacity] += mem
+                    doubles[hourly_count + label % hourly_capacity] += 1
+                    last_update = ts
+                doubles[last_update_index] = last_update
+
+    def import_points(self, dbname, resolution, points):
+        """Store consolidated points of a database at one of the archive resolutions, e.g. on migration."""
+        with self.lock:
+            slot = self.slot(dbname, create=True)
+            doubles = self.doubles
+            last_update_index = self.slot_base(slot) + self.slot_header_doubles - 1
+            fine_cpu, fine_mem, hourly_cpu, hourly_mem, hourly_count = self.ring_offsets(slot)
+            samples = resolution // self.polling_interval_sec
+            for ts, cpu, mem in points:
+                known = cpu is not None and mem is not None
+                if resolution == self.archives[0][0]:
+                    index = ts // resolution % self.fine_capacity
+                    doubles[fine_cpu + index] = cpu if known else math.nan
+                    doubles[fine_mem + index] = mem if known else math.nan
+                else:
+                    index = ts // resolution % self.hourly_capacity
+                    doubles[hourly_cpu + index] = cpu * samples if known else 0.0
+                    doubles[hourly_mem + index] = mem * samples if known else 0.0
+                    doubles[hourly_count + index] = samples if known else 0.0
+                if known:
+                    doubles[last_update_index] = max(doubles[last_update_index], ts)
+
+    def last_update(self, rrd):
+        slot = self.slot(rrd.dbname)
+        return 0 if slot is None else int(self.doubles[self.slot_base(slot) + self.slot_header_doubles - 1])
+
+    @staticmethod
+    def ring_slice(doubles, offset, capacity, first, count):
+        """Return count values of a ring starting at the absolute index first, from at most two slices."""
+        start = first % capacity
+        values = doubles[offset + start : offset + min(start + count, capacity)].tolist()
+        if start + count > capacity:
+            values += doubles[offset : offset + start + count - capacity].tolist()
+        return values
+
+    def read_points(self, rrd, step, start, end):
+        return self.read_points_many([rrd.dbname], step, start, end)[rrd.dbname]
+
+    def read_points_many(self, dbnames, step, start, end):
+        resolution = self.resolution(int(step), int(start))
+        first_ts = int(start) - int(start) % resolution
+        last_ts = int(end) - int(end) % resolution + resolution
+        timestamps = range(first_ts + resolution, last_ts + 1, resolution)
+        fine = resolution == self.archives[0][0]
+        capacity = self.fine_capacity if fine else self.hourly_capacity
+        min_samples = resolution / (2.0 * self.polling_interval_sec)
+        decimals = KOA_CONFIG.db_round_decimals
+        unknown = [(ts, None, None) for ts in timestamps]
+        points_by_dbname = {}
+        for dbname in dbnames:
+            slot = self.slot(dbname)
+            if slot is None or not timestamps:
+                points_by_dbname[dbname] = list(unknown)
+                continue
+            doubles = self.doubles
+            last_update = int(doubles[self.slot_base(slot) + self.slot_header_doubles - 1])
+            last_label = -(-last_update // resolution)
+            # only the cells of the last capacity intervals up to the last update are current
+            first = max(timestamps[0] // resolution, last_label - capacity + 1)
+            last = min(timestamps[-1] // resolution, last_label)
+            if last < first:
+                points_by_dbname[dbname] = list(unknown)
+                continue
+            fine_cpu, fine_mem, hourly_cpu, hourly_mem, hourly_count = self.ring_offsets(slot)
+            count = last - first + 1
+            if fine:
+                cpus = self.ring_slice(doubles, fine_cpu, capacity, first, count)
+                mems = self.ring_slice(doubles, fine_mem, capacity, first, count)
+                counts = [1.0] * count
+            else:
+                cpus = self.ring_slice(doubles, hourly_cpu, capacity, first, count)
+                mems = self.ring_slice(doubles, hourly_mem, capacity, first, count)
+                counts = self.ring_slice(doubles, hourly_count, capacity, first, count)
+            points = []
+            for ts in timestamps:
+                offset = ts // resolution - first
+                if 0 <= offset < count and counts[offset] >= min_samples and cpus[offset] == cpus[offset]:
+                    samples = counts[offset]
+                    points.append(
+                        (ts, round(cpus[offset] / samples, decimals), round(mems[offset] / samples, decimals))
+                    )
+                else:
+                    points.append((ts, None, None))
+            points_by_dbname[dbname] = points
+        return points_by_dbname
+
+    def list_databases(self):
+        with self.lock:
+            self.open()
+            return sorted(self.slots)
+
+    def remove(self, dbname):
+        """Tombstone the slot of a database by clearing its name, and make it free for reuse."""
+        with self.lock:
+            slot = self.slot(dbname)
+            if slot is not None:
+                offset = self.slot_offset(slot)
+                self.mapping[offset : offset + self.name_size] = b"\0" * self.name_size
+                del self.slots[dbname]
+                heapq.heappush(self.free_slots, slot)
+
+
+def create_time_series_storage(backend_name):
+    """Instantiate the storage engine selected by KL_STORAGE_BACKEND."""
+    if backend_name == SqliteStorage.name:
+        return SqliteStorage(KOA_CONFIG.sqlite_path)
+    if backend_name == MmapStorage.name:
+        return MmapStorage(KOA_CONFIG.mmap_path)
+    if backend_name != RrdStorage.name:
+        KOA_LOGGER.warning("Unknown storage backend %s, falling back to rrd", backend_name)
+    return RrdStorage()
+
+
+TIME_SERIES_STORAGE = create_time_series_storage(KOA_CONFIG.storage_backend)
+
+
+class DatabaseCatalog:
+    """Persisted catalog of the databases, maintained by the puller as samples are committed.
+
+    Each database is recorded with its kind, owning namespace, creation time and last update, so
+    that the exporter neither lists the storage every cycle nor recomputes the trends of databases
+    that were not updated. The catalog is saved as JSON in KL_DB_LOCATION, unless KL_CATALOG_PATH is
+    set, and bootstrapped from the storage engine when the file is missing.
+    """
+
+    file_name = ".catalog.json"
+    KIND_NAMESPACE = "namespace"
+    KIND_EFFICIENCY = "efficiency"
+    KIND_GPU = "gpu"
+    KIND_NON_ALLOCATABLE = "non-allocatable"
+    KIND_BILLING = "billing"
+
+    def __init__(self, path=None):
+        self.fixed_path = path
+        self.loaded_path = None
+        self.entries = {}
+        self.lock = threading.RLock()
+
+    @property
+    def path(self):
+        return self.fixed_path or KOA_CONFIG.catalog_path or os.path.join(KOA_CONFIG.db_location, self.file_name)
+
+    @staticmethod
+    def classify(dbname):
+        """Return the kind of a database and the namespace owning it, from its name."""
+        rf_extension = KOA_CONFIG.request_efficiency_db_file_extension()
+        gpu_extension = KOA_CONFIG.gpu_db_file_extension()
+        if dbname == KOA_CONFIG.db_billing_hourly_rate:
+            return DatabaseCatalog.KIND_BILLING, None
+        if dbname == KOA_CONFIG.db_non_allocatable:
+            return DatabaseCatalog.KIND_NON_ALLOCATABLE, None
+        if dbname.endswith(rf_extension):
+            namespace = dbname[: -len(rf_extension)]
+            if namespace.endswith(gpu_extension):
+                namespace = namespace[: -len(gpu_extension)]
+            return DatabaseCatalog.KIND_EFFICIENCY, namespace
+        if dbname.endswith(gpu_extension):
+            return DatabaseCatalog.KIND_GPU, dbname[: -len(gpu_extension)]
+        return DatabaseCatalog.KIND_NAMESPACE, dbname
+
+    def load(self):
+        """Load the catalog from its file, or build it from the storage engine when there is none."""
+        with self.lock:
+            path = self.path
+            if self.loaded_path == path:
+                return
+            self.loaded_path = path
+            try:
+                with open(path, "rb") as f:
+                    self.entries = json.load(f)["databases"]
+                return
+            except FileNotFoundError:
+                pass
+            except (ValueError, KeyError):
+                KOA_LOGGER.error("invalid database catalog %s, rebuilding it => %s", path, traceback.format_exc())
+            self.entries = {}
+            now = calendar.timegm(time.gmtime())
+            for dbname in TIME_SERIES_STORAGE.list_databases():
+                rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=dbname)
+                self.add(dbname, now).update(last_update=TIME_SERIES_STORAGE.last_update(rrd))
+            KOA_LOGGER.info("[catalog] %d databases found in storage", len(self.entries))
+            self.save()
+
+    def add(self, dbname, created):
+        entry = self.entries.get(dbname)
+        if entry is None:
+            kind, namespace = self.classify(dbname)
+            entry = {"kind": kind, "namespace": namespace, "created": created, "last_update": 0}
+            self.entries[dbname] = entry
+        return entry
+
+    def record(self, last_updates):
+        """Record the last sample timestamp of each committed database, and save the catalog."""
+        with self.lock:
+            self.load()
+            now = calendar.timegm(time.gmtime())
+            for dbname, last_update in last_updates.items():
+                entry = self.add(dbname, now)
+                entry["last_update"] = max(entry["last_update"], int(last_update))
+            self.save()
+
+    def save(self):
+        path = self.path
+        create_directory_if_not_exists(os.path.dirname(os.path.abspath(path)))
+        replace_file_atomically(path, json.dumps({"databases": self.entries}, sort_keys=True).encode("utf-8"))
+
+    @staticmethod
+    def is_live(entry):
+        """Tell whether a database is in storage: never archived, or updated again since its archive."""
+        archive = entry.get("archive")
+        return archive is None or entry["last_update"] > archive["end"]
+
+    def databases(self, *kinds):
+        """Return the sorted names of the databases in storage of the given kinds."""
+        with self.lock:
+            self.load()
+            return sorted(
+                dbname for dbname, entry in self.entries.items() if entry["kind"] in kinds and self.is_live(entry)
+            )
+
+    def archived_databases(self, *kinds):
+        """Return the sorted names of the databases of the given kinds having an archive."""
+        with self.lock:
+            self.load()
+            return sorted(
+                dbname for dbname, entry in self.entries.items() if entry["kind"] in kinds and "archive" in entry
+            )
+
+    def namespace_groups(self):
+        """Return the databases in storage of each namespace, with their last updates."""
+        groups = collections.defaultdict(dict)
+        with self.lock:
+            self.load()
+            for dbname, entry in self.entries.items():
+                if entry["namespace"] is not None and self.is_live(entry):
+                    groups[entry["namespace"]][dbname] = entry["last_update"]
+        return groups
+
+    def set_archive(self, dbname, archive):
+        """Record the archive of a database, as {"start": epoch, "end": epoch}, or drop it when None.
+
+        Recording an archive also stamps the database with the time it was archived, its epoch.
+        """
+        with self.lock:
+            self.load()
+            entry = self.entries.get(dbname)
+            if entry is None:
+                return
+            if archive is not None:
+                entry["archive"] = archive
+                entry["archived"] = calendar.timegm(time.gmtime())
+            elif self.is_live(entry):
+                entry.pop("archive", None)
+            else:
+                del self.entries[dbname]
+            self.save()
+
+    def last_updates(self):
+        with self.lock:
+            self.load()
+            return {dbname: entry["last_update"] for dbname, entry in self.entries.items() if self.is_live(entry)}
+
+    def epochs(self):
+        """Return the epoch of the databases in storage: when they were last archived, 0 if never.
+
+        A database recreated after being archived has a new epoch, so that processes caching
+        computations on its previous content can tell them stale.
+        """
+        with self.lock:
+            self.load()
+            return {dbname: entry.get("archived", 0) for dbname, entry in self.entries.items() if self.is_live(entry)}
+
+
+DATABASE_CATALOG = DatabaseCatalog()
+
+
+class StorageLock:
+    """Exclusive lock of the storage and catalog by the process writing them.
+
+    The catalog and the sqlite and mmap engines have a single writer process: the backend holds
+    the lock for its lifetime, and backfill imports refuse to run while it does. The lock is an
+    advisory lock on a file next to the catalog, released by the system when the process exits.
+    """
+
+    def __init__(self):
+        self.fd = None
+
+    @property
+    def path(self):
+        return DATABASE_CATALOG.path + ".lock"
+
+    def acquire(self, blocking=True):
+        """Take the lock, if not already held by this process.
+
+        :return: whether the lock is held, False when another process holds it and blocking is unset
+        """
+        if self.fd is not None:
+            return True
+        path = self.path
+        create_directory_if_not_exists(os.path.dirname(os.path.abspath(path)))
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+STORAGE_LOCK = StorageLock()
+
+
+class DatabaseLifecycleManager:
+    """Move the databases of inactive namespaces out of storage.
+
+    Once all the databases of a namespace have not been updated for KL_RETENTION_GRACE_DAYS, their
+    hourly points are compacted into a read-only gzip archive under KL_ARCHIVE_LOCATION, and the
+    databases are removed from storage and from the export lists. Archives keep counting in the
+    histograms of the periods they overlap, and are deleted once they are older than a year.
+    """
+
+    def __init__(self, grace_sec=None, archive_location=None, run_interval_sec=RrdPeriod.PERIOD_1_HOUR_SEC):
+        self.grace_sec = KOA_CONFIG.retention_grace_days * 86400 if grace_sec is None else grace_sec
+        self.archive_location = archive_location
+        self.run_interval_sec = int(run_interval_sec)
+        self.last_run = 0
+        self.usage_cache = {}
+
+    def archive_path(self, dbname):
+        return os.path.join(self.archive_location or KOA_CONFIG.archive_location, "%s.json.gz" % dbname)
+
+    def run(self, now=None):
+        """Archive the databases of the namespaces inactive for longer than the grace period.
+
+        Runs at most once per run interval.
+
+        :return: the number of archived databases
+        """
+        now = calendar.timegm(time.gmtime()) if now is None else int(now)
+        if self.grace_sec <= 0 or now - self.last_run < self.run_interval_sec:
+            return 0
+        self.last_run = now
+        archived = 0
+        for namespace, last_updates in DATABASE_CATALOG.namespace_groups().items():
+            if max(last_updates.values()) >= now - self.grace_sec:
+                continue
+            KOA_LOGGER.info("[lifecycle] archiving inactive namespace %s (%d databases)", namespace, len(last_updates))
+            for dbname, last_update in last_updates.items():
+                self.archive(dbname, last_update)
+                archived += 1
+        self.expire(now)
+        PROMETHEUS_ARCHIVED_DATABASES_EXPORTER.inc(archived)
+        return archived
+
+    def archive(self, dbname, last_update):
+        """Compact the last year of hourly points of a database into its archive and remove it.
+
+        A database archived before, then recreated, has its new points merged into its archive.
+        """
+        step = int(RrdPeriod.PERIOD_1_HOUR_SEC)
+        rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=dbname)
+        points = rrd.read_points(step, last_update - int(RrdPeriod.PERIOD_YEAR_SEC), last_update)
+        known = [index for index, point in enumerate(points) if point[1] is not None and point[2] is not None]
+        points = points[known[0] : known[-1] + 1] if known else []
+        previous = DATABASE_CATALOG.entries.get(dbname, {}).get("archive")
+        if previous is not None and points:
+            merged = {point[0]: point for point in self.load_points(dbname)}
+            merged.update((point[0], point) for point in points if point[1] is not None or point[0] not in merged)
+            points = [merged.get(ts, (ts, None, None)) for ts in range(min(merged), max(merged) + step, step)]
+        if points:
+            content = {
+                "dbname": dbname,
+                "start": points[0][0],
+                "step": step,
+                "cpu": [point[1] for point in points],
+                "mem": [point[2] for point in points],
+            }
+            path = self.archive_path(dbname)
+            create_directory_if_not_exists(os.path.dirname(path))
+            replace_file_atomically(path, gzip.compress(json.dumps(content).encode("utf-8")))
+            archive = {"start": points[0][0], "end": points[-1][0]}
+        else:
+            archive = {"start": last_update, "end": last_update}
+        if previous is not None:
+            archive = {"start": min(previous["start"], archive["start"]), "end": max(previous["end"], archive["end"])}
+        DATABASE_CATALOG.set_archive(dbname, archive)
+        TIME_SERIES_STORAGE.remove(dbname)
+        HISTOGRAM_ANALYTICS_ENGINE.forget(rrd.rrd_location)
+        TREND_PARTIALS.pop(dbname, None)
+
+    def load_points(self, dbname):
+        """Return the archived (timestamp, cpu, mem) points of a database, or [] when it has none."""
+        try:
+            with open(self.archive_path(dbname), "rb") as f:
+                content = json.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return []
+        timestamps = range(content["start"], content["start"] + content["step"] * len(content["cpu"]), content["step"])
+        return list(zip(timestamps, content["cpu"], content["mem"], strict=True))
+
+    def expire(self, now):
+        """Delete the archives that no longer overlap the yearly period."""
+        window_start = now - int(RrdPeriod.PERIOD_YEAR_SEC)
+        for dbname in DATABASE_CATALOG.archived_databases(*DATABASE_LIFECYCLE_KINDS):
+            if DATABASE_CATALOG.entries[dbname]["archive"]["end"] < window_start:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.archive_path(dbname))
+                DATABASE_CATALOG.set_archive(dbname, None)
+
+    def periodic_usages(self, dbnames, period, now):
+        """Return the (usage, rf) periodic usages of archived databases overlapping period.
+
+        Like the live databases, see Rrd.periodic_usages, only points since now - period count.
+        Results are reused within the same hour.
+        """
+        window_start = int(now - int(period))
+        hour = now // int(RrdPeriod.PERIOD_1_HOUR_SEC)
+        periodic_usages = {}
+        for dbname in dbnames:
+            archive = DATABASE_CATALOG.entries[dbname]["archive"]
+            if archive["end"] < window_start:
+                continue
+            key = (dbname, int(period))
+            cached = self.usage_cache.get(key)
+            if cached is None or cached[0] != hour:
+                usages = []
+                for db in (dbname, KOA_CONFIG.usage_efficiency_db(dbname)):
+                    buckets = Rrd.aggregate_buckets(self.load_points(db), period, min_ts=window_start)
+                    usages.append(tuple(dict(d) for d in Rrd.buckets_to_periodic_usage(buckets, period)))
+                cached = self.usage_cache[key] = (hour, tuple(usages))
+            periodic_usages[dbname] = cached[1]
+        return periodic_usages
+
+
+DATABASE_LIFECYCLE_KINDS = (DatabaseCatalog.KIND_NAMESPACE, DatabaseCatalog.KIND_EFFICIENCY, DatabaseCatalog.KIND_GPU)
+DATABASE_LIFECYCLE_MANAGER = DatabaseLifecycleManager()
+
+
+def merge_periodic_usages(live, archived):
+    """Add the (usage, rf) periodic usages of an archive to those of its live database, if any."""
+    if live is None:
+        return archived
+    merged = []
+    for live_usage, archived_usage in zip(live, archived, strict=True):
+        resources = []
+        for live_resource, archived_resource in zip(live_usage, archived_usage, strict=True):
+            resource = collections.Counter(live_resource)
+            resource.update(archived_resource)
+            resources.append(dict(resource))
+        merged.append(tuple(resources))
+    return tuple(merged)
+
+
+BACKFILL_FIELDS = ("cpu_usage", "mem_usage", "cpu_request", "mem_request", "cpu_capacity", "mem_capacity")
+
+
+def parse_backfill_csv(lines):
+    """Parse a CSV export of namespace usage for backfill, one namespace at a time.
+
+    The header names the columns: timestamp (epoch seconds), namespace, cpu_usage (cores) and
+    mem_usage (bytes), and optionally cpu_request, mem_request, cpu_capacity and mem_capacity.
+    Capacity rows with an empty namespace apply to every namespace. To be read without loading the
+    whole file, rows are expected sorted by namespace, e.g. with sort -t, -k2,2 -k1,1n, so that the
+    cluster-wide rows come first and the rows of each namespace are contiguous.
+
+    :return: iterator of (namespace, dict of {field: value} by timestamp), None for cluster-wide values
+    :raise ValueError: when the rows of a namespace are not contiguous
+    """
+    seen = set()
+    namespace, records = None, None
+    for row in csv.DictReader(lines):
+        row_namespace = row.get("namespace") or None
+        if records is None or row_namespace != namespace:
+            if records is not None:
+                yield namespace, records
+            if row_namespace in seen or (row_namespace is None and seen):
+                raise ValueError(
+                    "backfill rows are not sorted by namespace, cluster-wide rows first (%s found again)"
+                    % (row_namespace or "cluster-wide rows")
+                )
+            seen.add(row_namespace)
+            namespace, records = row_namespace, collections.defaultdict(dict)
+        record = records[int(float(row["timestamp"]))]
+        for field in BACKFILL_FIELDS:
+            if row.get(field) not in (None, ""):
+                record[field] = float(row[field])
+    if records is not None:
+        yield namespace, records
+
+
+def parse_backfill_prometheus(document):
+    """Parse Prometheus range query results of namespace usage for backfill, one namespace at a time.
+
+    The document maps each of BACKFILL_FIELDS to the JSON response of a range query, whose series
+    are labelled by namespace, e.g. cpu_usage to the result of
+    sum by (namespace) (rate(container_cpu_usage_seconds_total{container!=""}[5m])). Series without
+    namespace label, as for capacities, apply to every namespace and come first.
+
+    :return: see parse_backfill_csv
+    """
+    series_by_namespace = collections.defaultdict(list)
+    for field, response in document.items():
+        if field not in BACKFILL_FIELDS:
+            KOA_LOGGER.warning("[backfill] ignoring unknown field %s", field)
+            continue
+        for series in response["data"]["result"]:
+            series_by_namespace[series["metric"].get("namespace")].append((field, series["values"]))
+    namespaces = sorted(series_by_namespace, key=lambda ns: (ns is not None, ns))
+    for namespace in namespaces:
+        records = collections.defaultdict(dict)
+        for field, values in series_by_namespace.pop(namespace):
+            for ts, value in values:
+                records[int(float(ts))][field] = float(value)
+        yield namespace, records
+
+
+def compact_points(points):
+    """Return (timestamp, cpu, mem) points as timestamp, cpu and mem arrays, compact in memory and to pickle."""
+    timestamps, cpus, mems = array.array("q"), array.array("d"), array.array("d")
+    for ts, cpu, mem in points:
+        timestamps.append(ts)
+        cpus.append(cpu)
+        mems.append(mem)
+    return timestamps, cpus, mems
+
+
+def build_backfill_points(namespace_records, step, cpu_capacity=None, mem_capacity=None):
+    """Compute the points of the namespace and __rf databases from backfill records.
+
+    Usages are turned into percentages of the cluster capacity and request efficiencies like in
+    build_sample_batch. Timestamps are aligned on step, and records lacking a usage or a capacity
+    are skipped.
+
+    :param namespace_records: iterator of (namespace, records), see parse_backfill_csv
+    :return: iterator of the points of each namespace, as a dict of compact_points by database name
+    """
+    cluster = {}
+    skipped = 0
+    for ns, by_ts in namespace_records:
+        if ns is None:
+            cluster = by_ts
+            continue
+        usage_points, rf_points = [], []
+        for ts in sorted(by_ts):
+            record = dict(cluster.get(ts, {}), **by_ts[ts])
+            cpu_total = record.get("cpu_capacity", cpu_capacity)
+            mem_total = record.get("mem_capacity", mem_capacity)
+            if "cpu_usage" not in record or "mem_usage" not in record or not cpu_total or not mem_total:
+                skipped += 1
+                continue
+            aligned_ts = ts - ts % step
+            usage_points.append(
+                (
+                    aligned_ts,
+                    compute_usage_percent_ratio(record["cpu_usage"], cpu_total),
+                    compute_usage_percent_ratio(record["mem_usage"], mem_total),
+                )
+            )
+            cpu_request = record.get("cpu_request", 0.0)
+            mem_request = record.get("mem_request", 0.0)
+            rf_points.append(
+                (
+                    aligned_ts,
+                    round(record["cpu_usage"] / cpu_request, 2) if cpu_request > 0.0 else 1.0,
+                    round(record["mem_usage"] / mem_request, 2) if mem_request > 0.0 else 1.0,
+                )
+            )
+        if usage_points:
+            yield {ns: compact_points(usage_points), KOA_CONFIG.usage_efficiency_db(ns): compact_points(rf_points)}
+    if skipped:
+        KOA_LOGGER.warning("[backfill] %d records skipped for lack of usage or capacity", skipped)
+
+
+def upsample_points(points, step, fill_sec):
+    """Repeat each point over the polling steps since the previous one, when they are at most fill_sec apart.
+
+    Points coarser than the polling interval would otherwise leave unknown intervals in storage.
+    """
+    previous = None
+    for ts, cpu, mem in points:
+        if previous is not None and ts <= previous:
+            continue
+        if previous is not None and ts - previous <= fill_sec:
+            for filled_ts in range(previous + step, ts + 1, step):
+                yield filled_ts, cpu, mem
+        else:
+            yield ts, cpu, mem
+        previous = ts
+
+
+def write_backfill_points(points_by_db, fill_sec, chunk_size):
+    """Write the upsampled points of a namespace's databases in chunks of chunk_size samples.
+
+    This runs in the calling process or in a backfill worker process. Samples older than the last
+    update of an existing database cannot be written and are skipped.
+
+    :param points_by_db: dict of compact_points by database name
+    :return: the number of written and skipped samples, and the last timestamp of each database
+    """
+    step = KOA_CONFIG.polling_interval_sec
+    written = skipped = 0
+    last_updates = {}
+    for dbname, (timestamps, cpus, mems) in points_by_db.items():
+        rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=dbname)
+        last_update = rrd.last_update()
+        chunk = []
+        for sample in upsample_points(zip(timestamps, cpus, mems), step, fill_sec):
+            if sample[0] <= last_update:
+                skipped += 1
+                continue
+            chunk.append(sample)
+            if len(chunk) >= chunk_size:
+                rrd.add_samples(chunk)
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            rrd.add_samples(chunk)
+            written += len(chunk)
+        if timestamps and timestamps[-1] > last_update:
+            last_updates[dbname] = timestamps[-1]
+    return written, skipped, last_updates
+
+
+def backfill(namespace_points, workers=0, fill_sec=RrdPeriod.PERIOD_1_HOUR_SEC, chunk_size=1000):
+    """Import historical points into storage, in parallel across namespaces with the rrd engine.
+
+    Namespaces are handed to worker processes one at a time, at most two per worker being queued,
+    so that only the points of a few namespaces are in memory at once. The sqlite and mmap engines
+    have a single writer, so their points are written in the calling process.
+
+    Backfill writes the storage and the catalog, and must run before the backend starts: it takes
+    the storage lock and refuses to run when another process holds it.
+
+    :param namespace_points: iterator of the points of each namespace, see build_backfill_points
+    :return: the number of written and skipped samples
+    :raise RuntimeError: when the storage is in use by another process
+    """
+    if not STORAGE_LOCK.acquire(blocking=False):
+        raise RuntimeError("storage is in use by another process, backfill must run before the backend starts")
+    if not isinstance(TIME_SERIES_STORAGE, RrdStorage):
+        workers = 0
+    written = skipped = databases = 0
+    last_updates = {}
+
+    def collect(result):
+        nonlocal written, skipped
+        written += result[0]
+        skipped += result[1]
+        last_updates.update(result[2])
+
+    if workers <= 0:
+        for points_by_db in namespace_points:
+            databases += len(points_by_db)
+            collect(write_backfill_points(points_by_db, fill_sec, chunk_size))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            pending = set()
+            for points_by_db in namespace_points:
+                databases += len(points_by_db)
+                if len(pending) >= 2 * workers:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        collect(future.result())
+                pending.add(executor.submit(write_backfill_points, points_by_db, fill_sec, chunk_size))
+            for future in concurrent.futures.as_completed(pending):
+                collect(future.result())
+    if last_updates:
+        DATABASE_CATALOG.record(last_updates)
+    KOA_LOGGER.info("[backfill] %d samples written to %d databases, %d skipped", written, databases, skipped)
+    return written, skipped
+
+
+def migrate_rrd_files(source_location, storage):
+    """Copy the archives of the RRD files found in source_location into a SqliteStorage or MmapStorage.
+
+    :return: the number of migrated databases
+    """
+    migrated = 0
+    for _, _, filenames in os.walk(source_location):
+        for dbname in sorted(fn for fn in filenames if not fn.startswith(DatabaseCatalog.file_name)):
+            location = os.path.join(source_location, dbname)
+            try:
+                last_update = int(rrdtool.last(location))
+                for resolution, retained_rows in storage.archives:
+                    result = rrdtool.fetch(
+                        location,
+                        "AVERAGE",
+                        "-r",
+                        str(resolution),
+                        "-s",
+                        str(last_update - resolution * retained_rows),
+                        "-e",
+                        str(last_update),
+                    )
+                    start, _, step = result[0]
+                    if step == resolution:
+                        storage.import_points(dbname, resolution, Rrd.decode_cdps(start, step, result[2]))
+            except rrdtool.OperationalError:
+                KOA_LOGGER.error("failed migrating %s => %s", location, traceback.format_exc())
+                continue
+            migrated += 1
+            KOA_LOGGER.info("[migration] %s migrated", dbname)
+        break
+    return migrated
+
+
+def downsample_lttb(xs, ys, max_points):
+    """Select the indices of at most max_points points of a series with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. Inner points are split into max_points - 2 buckets
+    and each bucket keeps the point forming the largest triangle with the point kept in the previous
+    bucket and the average of the next bucket, except the bucket holding the series maximum, which
+    keeps that maximum so that peaks survive downsampling.
+
+    :return: the indices of the kept points, in order; all indices when max_points is 0 or the series
+        is short enough
+    """
+    count = len(xs)
+    if max_points <= 0 or count <= max_points or max_points < 3:
+        return range(count)
+
+    peak_index = max(range(count), key=ys.__getitem__)
+    bucket_size = (count - 2) / (max_points - 2)
+    indices = [0]
+    previous = 0
+    for bucket in range(max_points - 2):
+        bucket_start = int(bucket * bucket_size) + 1
+        bucket_end = int((bucket + 1) * bucket_size) + 1
+        if bucket_start <= peak_index < bucket_end:
+            previous = peak_index
+            indices.append(previous)
+            continue
+
+        next_start = bucket_end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        next_count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / next_count
+        avg_y = sum(ys[next_start:next_end]) / next_count
+
+        prev_x = xs[previous]
+        prev_y = ys[previous]
+        best_area = -1.0
+        for index in range(bucket_start, bucket_end):
+            area = abs((prev_x - avg_x) * (ys[index] - prev_y) - (prev_x - xs[index]) * (avg_y - prev_y))
+            if area > best_area:
+                best_area = area
+                previous = index
+        indices.append(previous)
+    indices.append(count - 1)
+    return indices
+
+
+class Rrd:
+    def __init__(self, db_files_location=None, dbname=None):
+        self.dbname = dbname
+        self.rrd_location = Rrd.get_location(dbname)
+        TIME_SERIES_STORAGE.ensure(self, db_files_location)
+
+    @staticmethod
+    def get_location(dbname):
+        return str("%s/%s" % (KOA_CONFIG.db_location, dbname))
+
+    def get_creation_time_epoch(self):
+        return int(os.path.getctime(self.rrd_location))
+
+    @staticmethod
+    def get_date_group(timeUTC, period):
+        if period == RrdPeriod.PERIOD_YEAR_SEC:
+            return time.strftime("%b %Y", timeUTC)
+        return time.strftime("%d %b", timeUTC)
+
+    def create_rrd_file_if_not_exists(self):
+        if not os.path.exists(self.rrd_location):
+            xfs = 2 * KOA_CONFIG.polling_interval_sec
+            rrdtool.create(
+                self.rrd_location,
+                "--step",
+                str(KOA_CONFIG.polling_interval_sec),
+                "--start",
+                "0",
+                str("DS:cpu_usage:GAUGE:%d:U:U" % xfs),
+                str("DS:mem_usage:GAUGE:%d:U:U" % xfs),
+                "RRA:AVERAGE:0.5:1:4032",
+                "RRA:AVERAGE:0.5:12:8880",
+            )
+
+    @staticmethod
+    def format_sample(timestamp_epoch, cpu_usage, mem_usage):
+        return "%s:%s:%s" % (
+            timestamp_epoch,
+            round(cpu_usage, KOA_CONFIG.db_round_decimals),
+            round(mem_usage, KOA_CONFIG.db_round_decimals),
+        )
+
+    def add_sample(self, timestamp_epoch, cpu_usage, mem_usage):
+        KOA_LOGGER.debug("[puller][sample] %s, %f, %f", self.dbname, cpu_usage, mem_usage)
+        self.add_samples([(timestamp_epoch, cpu_usage, mem_usage)])
+
+    def add_samples(self, samples, writer=None):
+        """Write samples to the database through the configured storage engine.
+
+        :param samples: list of (timestamp, cpu, mem) tuples in increasing timestamp order
+        :param writer: function called like rrdtool.update by the rrd engine, mainly to substitute it in tests
+        """
+        TIME_SERIES_STORAGE.write(self, samples, writer=writer)
+
+    def trend_points(self, period, step_in=None):
+        """Return the step and the known (timestamp, cpu, mem) points of the usage trend over period.
+
+        Hourly points are used, unless cpu or mem sums to zero over period, in which case 5-minute
+        points are tried instead.
+        """
+        step = int(step_in) if step_in is not None else int(RrdPeriod.PERIOD_1_HOUR_SEC)
+
+        rrd_end_ts_in = int(int(calendar.timegm(time.gmtime()) * step) / step)
+        rrd_start_ts_in = int(rrd_end_ts_in - int(period))
+        points = [
+            point
+            for point in self.fetch_points(step, rrd_start_ts_in, rrd_end_ts_in)
+            if point[1] is not None and point[2] is not None
+        ]
+        if sum(point[1] for point in points) > 0.0 and sum(point[2] for point in points) > 0.0:
+            return step, points
+        if step_in is None:
+            return self.trend_points(period, step_in=RrdPeriod.PERIOD_5_MINS_SEC)
+        return step, []
+
+    @staticmethod
+    def render_trend(dbname, points, max_points=0):
+        """Render trend points as cpu and mem trend items.
+
+        When max_points is set, each of the cpu and mem series is downsampled to at most max_points
+        points with downsample_lttb().
+        """
+        current_hour_ts = int(
+            int(calendar.timegm(time.gmtime()) / RrdPeriod.PERIOD_1_HOUR_SEC) * RrdPeriod.PERIOD_1_HOUR_SEC
+        )
+        hourly_usage = None
+        for rrd_current_ts, current_cpu_usage, current_mem_usage in points:
+            if rrd_current_ts == current_hour_ts:
+                hourly_usage = (current_cpu_usage, current_mem_usage)
+
+        res_usage = collections.defaultdict(list)
+        timestamps = [point[0] for point in points]
+        for res in [ResUsageType.CPU, ResUsageType.MEMORY]:
+            values = [point[res + 1] for point in points]
+            for index in downsample_lttb(timestamps, values, max_points):
+                res_usage[res].append(
+                    '{"name":"%s","dateUTC":"%s","usage":%f}'
+                    % (dbname, format_utc_timestamp(timestamps[index]), values[index])
+                )
+        return ",".join(res_usage[ResUsageType.CPU]), ",".join(res_usage[ResUsageType.MEMORY]), hourly_usage
+
+    @staticmethod
+    def get_bucket_bounds(epoch, period):
+        """Return the start and end epochs of the histogram bucket (day or month) containing epoch."""
+        if period == RrdPeriod.PERIOD_YEAR_SEC:
+            tm = time.gmtime(epoch)
+            start = calendar.timegm((tm.tm_year, tm.tm_mon, 1, 0, 0, 0))
+            if tm.tm_mon == 12:
+                return start, calendar.timegm((tm.tm_year + 1, 1, 1, 0, 0, 0))
+            return start, calendar.timegm((tm.tm_year, tm.tm_mon + 1, 1, 0, 0, 0))
+        start = epoch - epoch % RrdPeriod.PERIOD_1_DAY_SEC
+        return start, start + RrdPeriod.PERIOD_1_DAY_SEC
+
+    def last_update(self):
+        """Return the epoch time of the last update of the database."""
+        return TIME_SERIES_STORAGE.last_update(self)
+
+    def fetch_points(self, step, start, end):
+        """Fetch the points consolidated with AVERAGE between start and end.
+
+        Within an export cycle, the fetch is served by the cycle's fetch planner.
+
+        :return: list of (timestamp, cpu, mem) tuples, where timestamp ends the consolidation interval
+            and cpu and mem are None when unknown
+        """
+        return RRD_FETCH_PLANNER.fetch_points(self, step, start, end)
+
+    def read_points(self, step, start, end):
+        """Read points from the storage engine, see fetch_points."""
+        return TIME_SERIES_STORAGE.read_points(self, step, start, end)
+
+    @staticmethod
+    def decode_cdps(start, step, cdps):
+        """Decode the rows of a rrdtool fetch result column by column.
+
+        Timestamps are derived from the time axis of the result, cpu and mem columns are rounded in
+        bulk, and rows with an unknown (None or NaN) value are masked as a whole.
+
+        :return: list of (timestamp, cpu, mem) tuples, see fetch_points
+        """
+        if not cdps:
+            return []
+        decimals = KOA_CONFIG.db_round_decimals
+        timestamps = range(start + step, start + step * (len(cdps) + 1), step)
+        columns = []
+        for column in itertools.islice(zip(*cdps), 2):
+            columns.append([None if v is None or v != v else round(100 * v, decimals) / 100 for v in column])
+        if len(columns) != 2:
+            return [(ts, None, None) for ts in timestamps]
+        return [
+            (ts, cpu, mem) if cpu is not None and mem is not None else (ts, None, None)
+            for ts, cpu, mem in zip(timestamps, columns[0], columns[1])
+        ]
+
+    @staticmethod
+    def aggregate_buckets(points, period, min_ts=None, max_ts=None):
+        """Sum points per histogram bucket.
+
+        :param points: (timestamp, cpu, mem) tuples as returned by fetch_points
+        :param min_ts: optional lower bound (inclusive) of the timestamps to aggregate
+        :param max_ts: optional upper bound (exclusive) of the timestamps to aggregate
+        :return: dict mapping bucket start epochs to [cpu, mem] sums, in chronological order
+        """
+        buckets = {}
+        bucket_start = bucket_end = None
+        sums = None
+        for ts, cpu, mem in points:
+            if cpu is None or mem is None:
+                continue
+            if (min_ts is not None and ts < min_ts) or (max_ts is not None and ts >= max_ts):
+                continue
+            if bucket_start is None or not bucket_start <= ts < bucket_end:
+                bucket_start, bucket_end = Rrd.get_bucket_bounds(ts, period)
+                sums = buckets.get(bucket_start)
+                if sums is None:
+                    sums = buckets[bucket_start] = [0.0, 0.0]
+            sums[0] += cpu
+            sums[1] += mem
+        return buckets
+
+    @staticmethod
+    def buckets_to_periodic_usage(buckets, period):
+        periodic_cpu_usage = collections.defaultdict(lambda: 0.0)
+        periodic_mem_usage = collections.defaultdict(lambda: 0.0)
+        for bucket_start, (cpu, mem) in buckets.items():
+            date_group = Rrd.get_date_group(time.gmtime(bucket_start), period)
+            periodic_cpu_usage[date_group] += cpu
+            periodic_mem_usage[date_group] += mem
+        return periodic_cpu_usage, periodic_mem_usage
+
+    @staticmethod
+    def periodic_usages(db, period):
+        """Return the periodic usage of a RRD file and of its request efficiency twin."""
+        rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=db)
+        current_periodic_usage = HISTOGRAM_ANALYTICS_ENGINE.periodic_usage(rrd, period)
+
+        rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=KOA_CONFIG.usage_efficiency_db(db))
+        current_periodic_rf = HISTOGRAM_ANALYTICS_ENGINE.periodic_usage(rrd, period)
+        return current_periodic_usage, current_periodic_rf
+
+    @staticmethod
+    def dump_trend_analytics(dbfiles, trend_data, category="usage", prefix=""):
+        """Compute the analytics trends given a category.
+
+        :param dbfiles: array of RRD files
+        :param trend_data: (cpu, mem) trends per RRD file, computed by compute_analytics_partials
+        :param category: may be 'usage' or 'rf' (request factor) according the type of analytics trends expected
+        :param prefix: optional prefix for output filenames (e.g., 'gpu_')
+        :return: None
+        """
+        res_usage = collections.defaultdict(list)
+        KOA_LOGGER.debug(
+            "[dump_trend_analytics] category=%s, prefix=%s, dbfiles_count=%d", category, prefix, len(dbfiles)
+        )
+        for _, db in enumerate(dbfiles):
+            if db == KOA_CONFIG.db_billing_hourly_rate and not KOA_CONFIG.enable_debug:
+                continue
+
+            current_trend_data = trend_data.get(db, ("", ""))
+            KOA_LOGGER.debug(
+                "[dump_trend_analytics] db=%s, cpu_data_len=%d, mem_data_len=%d",
+                db,
+                len(current_trend_data[0]),
+                len(current_trend_data[1]),
+            )
+            for res in [ResUsageType.CPU, ResUsageType.MEMORY]:
+                if current_trend_data[res]:
+                    res_usage[res].append(current_trend_data[res])
+
+        mem_label = "mem" if prefix else "memory"
+        write_dataset_file(
+            str("%s/%scpu_%s_trends.json" % (KOA_CONFIG.frontend_data_location, prefix, category)),
+            "[" + ",".join(res_usage[0]) + "]",
+        )
+        write_dataset_file(
+            str("%s/%s%s_%s_trends.json" % (KOA_CONFIG.frontend_data_location, prefix, mem_label, category)),
+            "[" + ",".join(res_usage[1]) + "]",
+        )
+
+    @staticmethod
+    def dump_histogram_analytics(dbfiles, period, cost_model, periodic_usages, prefix="", metric_samples=None):
         """Dump usage history data.
 
         :param dbfiles: The target RRD file
         :param period: the retrieval period
         :param cost_model: the cost model to use
+        :param periodic_usages: (usage, rf) periodic usages per RRD file, computed by
+            compute_analytics_partials
         :param prefix: optional prefix for output filenames (e.g., 'gpu_')
+        :param metric_samples: optional dict of metric samples per metric name, filled with the usage
+            and requests of the current day or month for the analytics metrics collector
         :return:
         """
-        now_gmtime = time.gmtime()
+        current_date_group = Rrd.get_date_group(time.gmtime(), period)
         usage_export = collections.defaultdict(list)
         usage_per_type_date = {}
         sum_usage_per_type_date = {}
@@ -1103,11 +2944,9 @@ class Rrd:
         sum_requests_per_type_date = {}
 
         for _, db in enumerate(dbfiles):
-            rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=db)
-            current_periodic_usage = rrd.dump_histogram_data(period=period)
-
-            rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=KOA_CONFIG.usage_efficiency_db(db))
-            current_periodic_rf = rrd.dump_histogram_data(period=period)
+            usage, rf = periodic_usages.get(db, (({}, {}), ({}, {})))
+            current_periodic_usage = [collections.defaultdict(float, d) for d in usage]
+            current_periodic_rf = [collections.defaultdict(float, d) for d in rf]
 
             for res in [ResUsageType.CPU, ResUsageType.MEMORY]:
                 for date_key, usage_value in current_periodic_usage[res].items():
@@ -1155,8 +2994,8 @@ class Rrd:
                                 )
 
                         usage_export[res].append('{"stack":"%s","usage":%f,"date":"%s"}' % (db, usage_cost, date_key))
-                        if Rrd.get_date_group(now_gmtime, period) == date_key:
-                            PROMETHEUS_PERIODIC_USAGE_EXPORTERS[period].labels(db, ResUsageType(res).name).set(
+                        if metric_samples is not None and current_date_group == date_key:
+                            metric_samples[PROMETHEUS_PERIODIC_USAGE_METRICS[period]][(db, ResUsageType(res).name)] = (
                                 usage_cost
                             )
 
@@ -1173,61 +3012,32 @@ class Rrd:
                                 )
 
                         requests_export[res].append('{"stack":"%s","usage":%f,"date":"%s"}' % (db, req_cost, date_key))
-                        if Rrd.get_date_group(now_gmtime, period) == date_key:
-                            PROMETHEUS_PERIODIC_REQUESTS_EXPORTERS[period].labels(db, ResUsageType(res).name).set(
-                                req_cost
-                            )  # noqa: E501
+                        if metric_samples is not None and current_date_group == date_key:
+                            metric_samples[PROMETHEUS_PERIODIC_REQUESTS_METRICS[period]][
+                                (db, ResUsageType(res).name)
+                            ] = req_cost
 
         mem_label = "mem" if prefix else "memory"
-        with open(
-            str(
-                "%s/%scpu_usage_period_%d.json"
-                % (
-                    KOA_CONFIG.frontend_data_location,
-                    prefix,
-                    period,
-                )
-            ),
-            "w",
-        ) as fd:
-            fd.write("[" + ",".join(usage_export[0]) + "]")
-        with open(
-            str(
-                "%s/%s%s_usage_period_%d.json"
-                % (
-                    KOA_CONFIG.frontend_data_location,
-                    prefix,
-                    mem_label,
-                    period,
-                )
-            ),
-            "w",
-        ) as fd:
-            fd.write("[" + ",".join(usage_export[1]) + "]")
-        with open(
-            str(
-                "%s/%scpu_requests_period_%d.json"
-                % (
-                    KOA_CONFIG.frontend_data_location,
-                    prefix,
-                    period,
-                )
-            ),
-            "w",
-        ) as fd:
-            fd.write("[" + ",".join(requests_export[0]) + "]")
-        with open(
-            str(
-                "%s/%s%s_requests_period_%d.json" % (KOA_CONFIG.frontend_data_location, prefix, mem_label, period),
-            ),
-            "w",
-        ) as fd:
-            fd.write("[" + ",".join(requests_export[1]) + "]")
-
-
-def pull_k8s(api_context):
-    data = None
-    api_endpoint = "%s%s" % (KOA_CONFIG.k8s_api_endpoint, api_context)
+        write_dataset_file(
+            str("%s/%scpu_usage_period_%d.json" % (KOA_CONFIG.frontend_data_location, prefix, period)),
+            "[" + ",".join(usage_export[0]) + "]",
+        )
+        write_dataset_file(
+            str("%s/%s%s_usage_period_%d.json" % (KOA_CONFIG.frontend_data_location, prefix, mem_label, period)),
+            "[" + ",".join(usage_export[1]) + "]",
+        )
+        write_dataset_file(
+            str("%s/%scpu_requests_period_%d.json" % (KOA_CONFIG.frontend_data_location, prefix, period)),
+            "[" + ",".join(requests_export[0]) + "]",
+        )
+        write_dataset_file(
+            str("%s/%s%s_requests_period_%d.json" % (KOA_CONFIG.frontend_data_location, prefix, mem_label, period)),
+            "[" + ",".join(requests_export[1]) + "]",
+        )
+
+
+def build_k8s_auth_options():
+    """Build the HTTP headers and client certificate used to authenticate against the Kubernetes API."""
     headers = {}
     client_cert = None
     endpoint_info = urllib.parse.urlparse(KOA_CONFIG.k8s_api_endpoint)
@@ -1243,74 +3053,759 @@ def pull_k8s(api_context):
             KOA_CONFIG.k8s_auth_username != "NO_ENV_AUTH_USERNAME"
             and KOA_CONFIG.k8s_auth_password != "NO_ENV_AUTH_PASSWORD"
         ):
-            token = base64.b64encode("%s:%s" % (KOA_CONFIG.k8s_auth_username, KOA_CONFIG.k8s_auth_password))
+            token = base64.b64encode(
+                ("%s:%s" % (KOA_CONFIG.k8s_auth_username, KOA_CONFIG.k8s_auth_password)).encode()
+            ).decode()
             headers["Authorization"] = "Basic %s" % token
         elif os.path.isfile(KOA_CONFIG.k8s_ssl_client_cert) and os.path.isfile(KOA_CONFIG.k8s_ssl_client_cert_key):
             client_cert = (KOA_CONFIG.k8s_ssl_client_cert, KOA_CONFIG.k8s_ssl_client_cert_key)
+    return headers, client_cert
 
-    try:
-        http_req = requests.get(
-            api_endpoint, verify=KOA_CONFIG.koa_verify_ssl_option, headers=headers, cert=client_cert
+
+class K8sListError(Exception):
+    """Raised when a Kubernetes list resource could not be listed completely, or watched.
+
+    expired is set on HTTP 410 Gone, when the continue token of a paginated listing or the resource
+    version of a watch has expired, in which case the listing has to be restarted from scratch.
+    """
+
+    def __init__(self, api_context, status_code=None):
+        super().__init__("listing %s failed (status %s)" % (api_context, status_code))
+        self.api_context = api_context
+        self.status_code = status_code
+        self.expired = status_code == 410
+
+
+class K8sApiCollector:
+    """Fetch Kubernetes API resources concurrently over a shared pool of keep-alive connections.
+
+    A single session is kept across polling cycles so that TCP and TLS handshakes are only made
+    when a pooled connection is dropped, and responses are requested gzip-compressed.
+    """
+
+    def __init__(self, pool_size=None):
+        self.pool_size = max(1, pool_size if pool_size is not None else KOA_CONFIG.k8s_api_pool_size)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip"})
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.pool_size, thread_name_prefix="k8s-collector"
         )
-        if http_req.status_code == 200:
-            data = http_req.text
+        self.latencies = {}
+        # status code of the last get() of each thread
+        self.local = threading.local()
+
+    def get(self, api_context, params=None):
+        """Get a Kubernetes API resource and return its body as text, or None on error."""
+        data = None
+        api_endpoint = "%s%s" % (KOA_CONFIG.k8s_api_endpoint, api_context)
+        headers, client_cert = build_k8s_auth_options()
+        self.local.status_code = None
+        try:
+            http_req = self.session.get(
+                api_endpoint,
+                params=params,
+                verify=KOA_CONFIG.koa_verify_ssl_option,
+                headers=headers,
+                cert=client_cert,
+            )
+            self.local.status_code = http_req.status_code
+            if http_req.status_code == 200:
+                data = http_req.text
+            else:
+                KOA_LOGGER.error("call to %s returned error (%s)", api_endpoint, http_req.text)
+        except Exception as ex:
+            KOA_LOGGER.error("Exception calling HTTP endpoint %s (%s)", api_endpoint, ex)
+
+        return data
+
+    def list_items(self, api_context, page_size, list_metadata=None):
+        """Yield the items of a Kubernetes list resource, fetching it in chunks of page_size items.
+
+        Pages are requested through the limit/continue list options, and each page is released
+        as soon as its items have been consumed, so that memory usage grows with the page size
+        rather than with the size of the cluster.
+
+        :param list_metadata: optional dict updated with the list metadata (e.g. resourceVersion),
+            and left empty when the listing fails
+        :raise K8sListError: when a page cannot be fetched, so that callers never take a partial
+            listing for a complete one
+        """
+        params = {"limit": page_size}
+        while True:
+            data = self.get(api_context, params=params)
+            if data is None:
+                if list_metadata is not None:
+                    list_metadata.clear()
+                raise K8sListError(api_context, getattr(self.local, "status_code", None))
+            page = json.loads(data)
+            del data
+            if list_metadata is not None:
+                list_metadata.update(page.get("metadata", {}))
+            items = page.get("items") or []
+            items.reverse()
+            while items:
+                yield items.pop()
+            continue_token = page.get("metadata", {}).get("continue")
+            if not continue_token:
+                return
+            params = {"limit": page_size, "continue": continue_token}
+
+    def watch_events(self, api_context, resource_version):
+        """Yield the events of a watch on a Kubernetes list resource, starting after resource_version.
+
+        :raise K8sListError: when the watch request is answered with an error status
+        """
+        api_endpoint = "%s%s" % (KOA_CONFIG.k8s_api_endpoint, api_context)
+        headers, client_cert = build_k8s_auth_options()
+        params = {
+            "watch": "1",
+            "resourceVersion": resource_version,
+            "allowWatchBookmarks": "true",
+            "timeoutSeconds": KOA_CONFIG.k8s_watch_timeout_sec,
+        }
+        with self.session.get(
+            api_endpoint,
+            params=params,
+            verify=KOA_CONFIG.koa_verify_ssl_option,
+            headers=headers,
+            cert=client_cert,
+            stream=True,
+            timeout=(30, KOA_CONFIG.k8s_watch_timeout_sec + 30),
+        ) as http_req:
+            if http_req.status_code != 200:
+                KOA_LOGGER.error("watch on %s returned error (%s)", api_endpoint, http_req.text)
+                raise K8sListError(api_context, http_req.status_code)
+            for line in http_req.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def timed_call(self, endpoint, func, *args):
+        """Run func(*args) and record its duration for the given endpoint."""
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            duration = time.perf_counter() - start
+            self.latencies[endpoint] = duration
+            PROMETHEUS_API_LATENCY_EXPORTER.labels(endpoint).set(duration)
+            KOA_LOGGER.debug("[puller] fetched %s in %.3fs", endpoint, duration)
+
+    def collect(self, api_contexts):
+        """Fetch the given API resources, and DCGM metrics when enabled, concurrently.
+
+        :param api_contexts: dict mapping a resource name to its API context (e.g. {"pods": "/api/v1/pods"})
+        :return: dict mapping each resource name, plus "dcgm", to its payload (None on error or when disabled)
+        """
+        futures = {
+            name: self.executor.submit(self.timed_call, api_context, self.get, api_context)
+            for name, api_context in api_contexts.items()
+        }
+        if KOA_CONFIG.nvidia_dcgm_endpoint is not None:
+            futures["dcgm"] = self.executor.submit(
+                self.timed_call, KOA_CONFIG.nvidia_dcgm_endpoint, pull_dcgm_metrics, self.session
+            )
+        results = {name: future.result() for name, future in futures.items()}
+        results.setdefault("dcgm", None)
+        return results
+
+
+class K8sInformer:
+    """Keep a local cache of a Kubernetes list resource up to date through watch events.
+
+    The resource is listed once, then the cache is maintained from the ADDED, MODIFIED and DELETED
+    events of a watch resumed from the last known resourceVersion (advanced by bookmarks). A full
+    relist only happens when the API server reports that the resourceVersion has expired. Other
+    watch errors, e.g. throttling, are counted and the watch is resumed after a back-off.
+    """
+
+    backoff_sec = 5
+
+    def __init__(self, collector, api_context):
+        self.collector = collector
+        self.api_context = api_context
+        self.items = {}
+        self.resource_version = None
+        self.lock = threading.Lock()
+        self.synced = threading.Event()
+        self.thread = None
+        self.watch_errors = 0
+
+    @staticmethod
+    def item_key(item):
+        metadata = item.get("metadata", {})
+        return "%s/%s" % (metadata.get("namespace", ""), metadata.get("name", ""))
+
+    def relist(self):
+        """List the resource from scratch and replace the cache content."""
+        list_metadata = {}
+        page_size = KOA_CONFIG.k8s_list_page_size if KOA_CONFIG.k8s_list_page_size > 0 else 500
+        try:
+            items = {
+                self.item_key(item): item
+                for item in self.collector.list_items(self.api_context, page_size, list_metadata=list_metadata)
+            }
+        except K8sListError as ex:
+            KOA_LOGGER.error("[informer] %s", ex)
+            return False
+        resource_version = list_metadata.get("resourceVersion")
+        if resource_version is None:
+            return False
+        with self.lock:
+            self.items = items
+            self.resource_version = resource_version
+        self.synced.set()
+        KOA_LOGGER.debug("[informer] listed %d items from %s", len(items), self.api_context)
+        return True
+
+    def handle_event(self, event):
+        """Apply a watch event to the cache, and return False if a relist is required."""
+        event_type = event.get("type")
+        obj = event.get("object", {})
+        if event_type == "ERROR":
+            code = obj.get("code")
+            if code == 410:
+                KOA_LOGGER.debug("[informer] watch on %s expired => %s", self.api_context, obj.get("message"))
+                self.resource_version = None
+            else:
+                KOA_LOGGER.warning(
+                    "[informer] watch on %s failed (code %s) => %s", self.api_context, code, obj.get("message")
+                )
+                self.count_watch_error(code)
+            return False
+
+        with self.lock:
+            if event_type in ("ADDED", "MODIFIED"):
+                self.items[self.item_key(obj)] = obj
+            elif event_type == "DELETED":
+                self.items.pop(self.item_key(obj), None)
+            self.resource_version = obj.get("metadata", {}).get("resourceVersion", self.resource_version)
+        return True
+
+    def count_watch_error(self, code):
+        self.watch_errors += 1
+        PROMETHEUS_WATCH_ERRORS_EXPORTER.labels(self.api_context, str(code)).inc()
+
+    def run(self):
+        while True:
+            try:
+                if self.resource_version is None and not self.relist():
+                    time.sleep(self.backoff_sec)
+                    continue
+                failed = False
+                for event in self.collector.watch_events(self.api_context, self.resource_version):
+                    if not self.handle_event(event):
+                        failed = self.resource_version is not None
+                        break
+                if failed:
+                    # resuming right away from the same resource version would likely fail again
+                    time.sleep(self.backoff_sec)
+            except K8sListError as ex:
+                KOA_LOGGER.error("[informer] %s", ex)
+                if ex.expired:
+                    # the resource version is too old to resume from, relist on the next pass
+                    self.resource_version = None
+                else:
+                    self.count_watch_error(ex.status_code)
+                time.sleep(self.backoff_sec)
+            except Exception as ex:
+                KOA_LOGGER.error("[informer] exception watching %s (%s)", self.api_context, ex)
+                time.sleep(self.backoff_sec)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="informer-%s" % self.api_context, daemon=True)
+        self.thread.start()
+        return self
+
+    def snapshot(self):
+        """Return the list of items currently in the cache."""
+        with self.lock:
+            return list(self.items.values())
+
+
+K8S_API_COLLECTOR = K8sApiCollector()
+
+
+class HistogramAnalyticsEngine:
+    """Compute histogram analytics incrementally across export cycles.
+
+    Per-bucket (day or month) sums are kept for each database and period. A bucket is re-read only
+    while it can still change: the buckets updated since the previous refresh, when the RRD file
+    has been updated since then, and the oldest bucket, which the sliding period only partially
+    covers. The other buckets are reused as-is.
+    """
+
+    def __init__(self):
+        self.states = {}
+
+    def periodic_usage(self, rrd, period, now=None):
+        """Return the (cpu, mem) usage per date group over period.
+
+        The result is the same as summing every hourly point since now - period per bucket afresh,
+        which is what a first computation, with no cached buckets, does.
+        """
+        step = int(RrdPeriod.PERIOD_1_HOUR_SEC)
+        now = calendar.timegm(time.gmtime()) if now is None else now
+        window_start = int(now - int(period))
+        _, edge_end = Rrd.get_bucket_bounds(window_start, period)
+        last_update = rrd.last_update()
+
+        key = (rrd.rrd_location, int(period))
+        state = self.states.get(key)
+        if state is None or state["refresh_from"] < edge_end:
+            edge = {}
+            tail = Rrd.aggregate_buckets(rrd.fetch_points(step, window_start, now), period)
+            closed = {}
         else:
-            KOA_LOGGER.error("call to %s returned error (%s)", api_endpoint, http_req.text)
-    except Exception as ex:
-        KOA_LOGGER.error("Exception calling HTTP endpoint %s (%s)", api_endpoint, ex)
+            edge = Rrd.aggregate_buckets(rrd.fetch_points(step, window_start, edge_end), period, max_ts=edge_end)
+            closed = {b: sums for b, sums in state["closed"].items() if b >= edge_end}
+            if last_update != state["last_update"]:
+                refresh_from = state["refresh_from"]
+                tail = Rrd.aggregate_buckets(rrd.fetch_points(step, refresh_from - step, now), period, refresh_from)
+            else:
+                tail = state["tail"]
+
+        # buckets ending before the last update or now can no longer change
+        refresh_from, _ = Rrd.get_bucket_bounds(min(now, last_update) if last_update > 0 else now, period)
+        new_tail = {}
+        for bucket_start, sums in tail.items():
+            if edge_end <= bucket_start < refresh_from:
+                closed[bucket_start] = sums
+            elif bucket_start >= refresh_from:
+                new_tail[bucket_start] = sums
+        self.states[key] = {
+            "closed": closed,
+            "tail": new_tail,
+            "refresh_from": refresh_from,
+            "last_update": last_update,
+        }
 
-    return data
+        buckets = dict(edge)
+        if state is None or state["refresh_from"] < edge_end:
+            # first computation: the oldest bucket comes from the full fetch
+            buckets.update((b, sums) for b, sums in tail.items() if b < edge_end)
+        buckets.update(sorted(closed.items()))
+        buckets.update(new_tail)
+        return Rrd.buckets_to_periodic_usage(buckets, period)
+
+    def planned_ranges(self, rrd_location, period, now):
+        """Return the (step, start, end) ranges that periodic_usage may fetch at the given time."""
+        step = int(RrdPeriod.PERIOD_1_HOUR_SEC)
+        window_start = int(now - int(period))
+        _, edge_end = Rrd.get_bucket_bounds(window_start, period)
+        state = self.states.get((rrd_location, int(period)))
+        if state is None or state["refresh_from"] < edge_end:
+            return [(step, window_start, now)]
+        return [(step, window_start, edge_end), (step, state["refresh_from"] - step, now)]
+
+    def forget(self, rrd_location):
+        """Drop the cached buckets of a RRD file."""
+        for key in [k for k in self.states if k[0] == rrd_location]:
+            del self.states[key]
+
+
+HISTOGRAM_ANALYTICS_ENGINE = HistogramAnalyticsEngine()
+
+
+class RrdFetchPlanner:
+    """Share rrdtool fetches between the consumers of an analytics export cycle.
+
+    At the start of a cycle, the ranges that trend and histogram computations will read are planned
+    per RRD file and resolution. The first read of a file at a resolution fetches the union of its
+    planned ranges at once, and the decoded points are then sliced for every consumer. Planned
+    ranges further apart than max_gap_sec are fetched separately, to avoid reading the points in
+    between. Outside a cycle, reads go straight to the RRD file.
+
+    Fetched points are kept until the consumers of a file release it, so that a cycle only holds
+    the points of the files being processed rather than a whole year of every database.
+    """
+
+    max_gap_sec = RrdPeriod.PERIOD_14_DAYS_SEC
+    prefetch_batch_size = 50
+
+    def __init__(self):
+        self.active = False
+        self.cycle_end = 0
+        self.plans = collections.defaultdict(list)
+        self.fetched = {}
+        self.fetch_count = 0
+        self.lock = threading.Lock()
+
+    def begin_cycle(self, now=None):
+        """Start a cycle; reads ending after now are served with the points fetched up to now."""
+        with self.lock:
+            self.active = True
+            self.cycle_end = calendar.timegm(time.gmtime()) if now is None else int(now)
+            self.plans = collections.defaultdict(list)
+            self.fetched = {}
+            self.fetch_count = 0
+
+    def end_cycle(self):
+        """Close the cycle, release the fetched points and return the number of fetches done."""
+        with self.lock:
+            self.active = False
+            self.plans = collections.defaultdict(list)
+            self.fetched = {}
+            PROMETHEUS_RRD_FETCHES_EXPORTER.set(self.fetch_count)
+            return self.fetch_count
+
+    def release(self, rrd_locations):
+        """Drop the points fetched and the ranges planned for RRD files whose consumers are done."""
+        rrd_locations = set(rrd_locations)
+        with self.lock:
+            for key in [k for k in self.plans if k[0] in rrd_locations]:
+                del self.plans[key]
+            for key in [k for k in self.fetched if k[0] in rrd_locations]:
+                del self.fetched[key]
+
+    def plan(self, rrd_location, step, start, end):
+        """Declare a range that will be read from a RRD file at a given resolution during the cycle."""
+        self.plans[(rrd_location, int(step))].append((int(start), min(int(end), self.cycle_end)))
+
+    def merged_range(self, key, start, end):
+        """Return the union of the planned ranges reachable from [start, end] without a large gap."""
+        ranges = sorted(self.plans.get(key, []) + [(start, end)])
+        merged = [list(ranges[0])]
+        for range_start, range_end in ranges[1:]:
+            if range_start - merged[-1][1] <= self.max_gap_sec:
+                merged[-1][1] = max(merged[-1][1], range_end)
+            else:
+                merged.append([range_start, range_end])
+        for merged_start, merged_end in merged:
+            if merged_start <= start and end <= merged_end:
+                return merged_start, merged_end
+        return start, end
+
+    @staticmethod
+    def slice_points(points, timestamps, step, start, end):
+        """Keep the points that a fetch between start and end would have returned.
+
+        :param timestamps: the sorted timestamps of points, to find the slice bounds by bisection
+        """
+        first_ts = start - start % step
+        last_ts = end - end % step + step
+        return points[bisect.bisect_right(timestamps, first_ts) : bisect.bisect_right(timestamps, last_ts)]
+
+    def store(self, key, start, end, points):
+        """Keep points fetched for the cycle and return their timestamps."""
+        timestamps = [point[0] for point in points]
+        self.fetched.setdefault(key, []).append((start, end, points, timestamps))
+        return timestamps
+
+    def prefetch(self, storage, rrd_locations=None):
+        """Fetch the planned ranges of RRD files upfront when the storage supports bulk reads.
+
+        Files sharing the same merged range and resolution are read with a single query.
+
+        :param rrd_locations: files to prefetch, all the planned ones by default
+        """
+        if not storage.bulk_reads:
+            return
+        groups = collections.defaultdict(set)
+        with self.lock:
+            for (rrd_location, step), ranges in self.plans.items():
+                if rrd_locations is not None and rrd_location not in rrd_locations:
+                    continue
+                for start, end in ranges:
+                    groups[(step, *self.merged_range((rrd_location, step), start, end))].add(rrd_location)
+        for (step, start, end), locations in groups.items():
+            points_by_dbname = storage.read_points_many(
+                [os.path.basename(location) for location in locations], step, start, end
+            )
+            with self.lock:
+                for location in locations:
+                    self.store((location, step), start, end, points_by_dbname[os.path.basename(location)])
+                self.fetch_count += 1
+
+    def fetch_points(self, rrd, step, start, end):
+        if not self.active:
+            return rrd.read_points(step, start, end)
+        step = int(step)
+        start = int(start)
+        end = min(int(end), self.cycle_end)
+        key = (rrd.rrd_location, step)
+        with self.lock:
+            for fetched_start, fetched_end, points, timestamps in self.fetched.get(key, []):
+                if fetched_start <= start and end <= fetched_end:
+                    return self.slice_points(points, timestamps, step, start, end)
+            fetch_start, fetch_end = self.merged_range(key, start, end)
+        points = rrd.read_points(step, fetch_start, fetch_end)
+        with self.lock:
+            timestamps = self.store(key, fetch_start, fetch_end, points)
+            self.fetch_count += 1
+        return self.slice_points(points, timestamps, step, start, end)
+
+
+RRD_FETCH_PLANNER = RrdFetchPlanner()
+
+
+def plan_analytics_fetches(planner, ns_dbfiles, rf_dbfiles, gpu_dbfiles, now, trend_dbfiles=None):
+    """Plan the RRD reads of an export cycle: 7-day trends and 14-day and yearly histograms.
+
+    :param trend_dbfiles: databases whose trend is computed, all of them by default
+    """
+    hourly_step = int(RrdPeriod.PERIOD_1_HOUR_SEC)
+    if trend_dbfiles is None:
+        trend_dbfiles = itertools.chain(ns_dbfiles, rf_dbfiles, gpu_dbfiles)
+    for db in trend_dbfiles:
+        planner.plan(Rrd.get_location(db), hourly_step, now - int(RrdPeriod.PERIOD_7_DAYS_SEC), now)
+    for db in itertools.chain(ns_dbfiles, gpu_dbfiles):
+        for location in (Rrd.get_location(db), Rrd.get_location(KOA_CONFIG.usage_efficiency_db(db))):
+            for period in (RrdPeriod.PERIOD_14_DAYS_SEC, RrdPeriod.PERIOD_YEAR_SEC):
+                for step, start, end in HISTOGRAM_ANALYTICS_ENGINE.planned_ranges(location, period, now):
+                    planner.plan(location, step, start, end)
+
+
+class RrdWriteBatch:
+    """Collect the samples of a polling cycle and write them to the storage engine in one go.
+
+    With the rrd engine, RRD files are resolved through the registry (no filesystem check for known
+    files), and samples of each database are written with a single rrdtool update, through rrdcached
+    when KL_RRDCACHED_ADDRESS is set. The sqlite engine writes the whole batch in one transaction.
+    """
+
+    def __init__(self, writer=None):
+        self.writer = writer
+        self.samples = collections.defaultdict(list)
+        self.sample_count = 0
+
+    def add_sample(self, dbname, timestamp_epoch, cpu_usage, mem_usage):
+        KOA_LOGGER.debug("[puller][sample] %s, %f, %f", dbname, cpu_usage, mem_usage)
+        self.samples[dbname].append((timestamp_epoch, cpu_usage, mem_usage))
+        self.sample_count += 1
+
+    def flush(self):
+        """Write all pending samples and return the write throughput in samples per second."""
+        if not self.samples:
+            return 0.0
+        start = time.perf_counter()
+        TIME_SERIES_STORAGE.write_many(self.samples, writer=self.writer)
+        DATABASE_CATALOG.record({dbname: samples[-1][0] for dbname, samples in self.samples.items()})
+        duration = time.perf_counter() - start
+        throughput = self.sample_count / duration if duration > 0 else float(self.sample_count)
+        PROMETHEUS_RRD_WRITE_THROUGHPUT_EXPORTER.set(throughput)
+        KOA_LOGGER.debug(
+            "[puller] flushed %d samples to %d databases in %.3fs (%.0f samples/s)",
+            self.sample_count,
+            len(self.samples),
+            duration,
+            throughput,
+        )
+        SAMPLE_COMMIT_EVENTS.publish()
+        self.samples = collections.defaultdict(list)
+        self.sample_count = 0
+        return throughput
+
+
+class RrdSampleWriter:
+    """Write sample batches to RRD files from a dedicated thread.
+
+    The puller hands over each cycle's RrdWriteBatch through a bounded queue, so that slow storage
+    does not delay the next collection. When the queue is full the puller blocks (backpressure),
+    which is reported through Prometheus. Pending batches are flushed on stop().
+    """
+
+    def __init__(self, max_pending=None):
+        self.queue = queue.Queue(maxsize=max(1, max_pending or KOA_CONFIG.rrd_write_queue_size))
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self.run, name="rrd-writer", daemon=True)
+                self.thread.start()
+        return self
+
+    def submit(self, batch):
+        """Queue a batch for writing, blocking while the queue is full."""
+        try:
+            self.queue.put_nowait(batch)
+        except queue.Full:
+            PROMETHEUS_WRITE_QUEUE_FULL_EXPORTER.inc()
+            KOA_LOGGER.warning("[puller] sample write queue is full, waiting for the storage to catch up")
+            start = time.perf_counter()
+            self.queue.put(batch)
+            PROMETHEUS_WRITE_QUEUE_BLOCKED_EXPORTER.inc(time.perf_counter() - start)
+        PROMETHEUS_WRITE_QUEUE_DEPTH_EXPORTER.set(self.queue.qsize())
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is None:
+                    return
+                batch.flush()
+            except Exception:
+                KOA_LOGGER.error("[puller] failed writing sample batch => %s", traceback.format_exc())
+            finally:
+                self.queue.task_done()
+                PROMETHEUS_WRITE_QUEUE_DEPTH_EXPORTER.set(self.queue.qsize())
+            if self.stopping.is_set():
+                return
+
+    def stop(self, timeout=None):
+        """Flush the pending batches and stop the writer thread, waiting at most timeout seconds.
+
+        When the queue is still full at the deadline, the thread is told to stop after the batch
+        being written, and the remaining batches are dropped.
+        """
+        with self.lock:
+            if self.thread is None:
+                return
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                KOA_LOGGER.warning(
+                    "[puller] %d sample batches could not be written before stopping", self.queue.qsize()
+                )
+                self.stopping.set()
+            self.thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            self.thread = None
+
+
+RRD_SAMPLE_WRITER = RrdSampleWriter()
+
+
+class SampleCommitEvents:
+    """Notify the exporter of the sample batches committed to RRD files by the puller.
+
+    Batches committed while the exporter is busy are counted until its next wait(). Which databases
+    changed is not tracked here: the exporter finds it from the last updates recorded in the catalog.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = 0
+        self.commit_count = 0
+
+    def publish(self):
+        with self.condition:
+            self.pending += 1
+            self.commit_count += 1
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Wait for committed batches and return how many were committed since the last wait, or 0 on timeout."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending, timeout)
+            pending, self.pending = self.pending, 0
+            return pending
+
+
+SAMPLE_COMMIT_EVENTS = SampleCommitEvents()
+
+
+PROMETHEUS_LABEL_ESCAPES = {"\\": "\\", '"': '"', "n": "\n"}
 
 
-def jsonify_dcgm_metrics(data):
-    """Transform Prometheus metrics from DCGM Exporter to JSON."""
+def parse_prometheus_labels(line, pos):
+    """Parse the label set of a Prometheus exposition line.
+
+    :param line: the exposition line
+    :param pos: position of the first character following the opening brace
+    :return: a tuple (labels, position following the closing brace)
+    """
+    labels = {}
+    while True:
+        while line[pos] in ", ":
+            pos += 1
+        if line[pos] == "}":
+            return labels, pos + 1
+        eq = line.index("=", pos)
+        key = line[pos:eq].strip()
+        pos = line.index('"', eq) + 1
+        end = line.index('"', pos)
+        escape = line.find("\\", pos, end)
+        if escape == -1:
+            labels[key] = line[pos:end]
+            pos = end + 1
+            continue
+        # slow path for values with escaped characters
+        chars = [line[pos:escape]]
+        pos = escape
+        while line[pos] != '"':
+            if line[pos] == "\\":
+                chars.append(PROMETHEUS_LABEL_ESCAPES.get(line[pos + 1], line[pos : pos + 2]))
+                pos += 2
+            else:
+                chars.append(line[pos])
+                pos += 1
+        labels[key] = "".join(chars)
+        pos += 1
+
+
+def parse_dcgm_metrics(lines, metric_names=None):
+    """Parse DCGM exporter metrics from Prometheus text exposition lines in a single pass.
+
+    Lines are consumed one at a time, so they can be streamed from the HTTP response. Samples whose
+    metric name is not in metric_names are skipped before any label is decoded.
+
+    :param lines: iterable of exposition lines
+    :param metric_names: names of the metrics to decode, or None to decode all DCGM metrics
+    :return: dict mapping metric names to lists of {"labels": ..., "value": ...} entries
+    """
+    prefixes = tuple(metric_names) if metric_names is not None else ("DCGM_",)
     metrics = {}
-    for line in data.split("\n"):
-        if line.startswith("DCGM_"):
-            # Parse metric name and value
-            if "{" in line:
-                name = line.split("{")[0]
-                labels_str = line.split("{")[1].split("}")[0]
-                value = line.split("}")[1].strip()
+    for line in lines:
+        if not line.startswith(prefixes):
+            continue
+        brace = line.find("{")
+        space = line.find(" ")
+        try:
+            if brace != -1 and (space == -1 or brace < space):
+                name = line[:brace]
+                if metric_names is not None and name not in metric_names:
+                    continue
+                labels, pos = parse_prometheus_labels(line, brace + 1)
+                value = float(line[pos:].split()[0])
+            elif space != -1:
+                name = line[:space]
+                if metric_names is not None and name not in metric_names:
+                    continue
+                labels = {}
+                value = float(line[space:].split()[0])
             else:
-                parts = line.split()
-                name = parts[0]
-                labels_str = ""
-                value = parts[1] if len(parts) > 1 else None
-
-            # Parse labels
-            labels = {}
-            if labels_str:
-                for label in labels_str.split(","):
-                    if "=" in label:
-                        k, v = label.split("=", 1)
-                        labels[k] = v.strip('"')
-
-            if name not in metrics:
-                metrics[name] = []
-            metrics[name].append({"labels": labels, "value": float(value)})
+                continue
+        except (ValueError, IndexError):
+            KOA_LOGGER.debug("[puller] skipping malformed DCGM line => %s", line)
+            continue
+
+        entries = metrics.get(name)
+        if entries is None:
+            entries = metrics[name] = []
+        entries.append({"labels": labels, "value": value})
 
     return metrics
 
 
-def pull_dcgm_metrics():
+def pull_dcgm_metrics(session=None):
     """Fetch GPU metrics from NVIDIA DCGM exporter endpoint.
 
     The DCGM exporter provides metrics in JSON format when queried at /metrics/json.
     Returns the raw JSON data or None if the endpoint is not configured or on error.
+
+    :param session: optional requests session to reuse pooled connections
     """
     if KOA_CONFIG.nvidia_dcgm_endpoint is None:
         return None
 
     data = None
     try:
-        http_req = requests.get(
+        http_req = (session or requests).get(
             KOA_CONFIG.nvidia_dcgm_endpoint,
             verify=KOA_CONFIG.koa_verify_ssl_option,
             timeout=30,  # 30 second timeout for DCGM endpoint
+            stream=True,
         )
         if http_req.status_code == 200:
-            data = jsonify_dcgm_metrics(http_req.text)
+            http_req.encoding = http_req.encoding or "utf-8"
+            data = parse_dcgm_metrics(http_req.iter_lines(decode_unicode=True), DCGM_METRIC_MAPPING)
             KOA_LOGGER.debug("[puller] Successfully fetched DCGM metrics from %s", KOA_CONFIG.nvidia_dcgm_endpoint)
         else:
             KOA_LOGGER.error(
@@ -1331,129 +3826,285 @@ def pull_dcgm_metrics():
     return data
 
 
-def create_metrics_puller():
-    try:
-        while True:
-            KOA_LOGGER.debug("[puller] collecting new samples")
-
-            KOA_CONFIG.load_rbac_auth_token()
+class PeriodicScheduler:
+    """Schedule runs at fixed periods aligned to step boundaries (multiples of the period since epoch).
 
-            k8s_usage = K8sUsage()
-            k8s_usage.extract_namespaces_and_initialize_usage(pull_k8s("/api/v1/namespaces"))
-            k8s_usage.extract_nodes(pull_k8s("/api/v1/nodes"))
-            k8s_usage.extract_node_metrics(pull_k8s("/apis/metrics.k8s.io/v1beta1/nodes"))
-            k8s_usage.extract_pods(pull_k8s("/api/v1/pods"))
-            k8s_usage.extract_pod_metrics(pull_k8s("/apis/metrics.k8s.io/v1beta1/pods"))
-            # Collect GPU metrics from DCGM exporter if configured
-            k8s_usage.extract_gpu_metrics(pull_dcgm_metrics())
-            k8s_usage.consolidate_ns_usage()
-            k8s_usage.calculate_node_usage()
-            k8s_usage.dump_nodes()
-            k8s_usage.dump_gpu_metrics()
+    Unlike sleeping for the period after each run, the period does not drift with the run duration.
+    When a run overruns, the late run happens right away on the last boundary passed, so that its
+    samples stay aligned, and the earlier ticks missed are skipped and counted rather than piled up.
+    """
 
-            if k8s_usage.cpuCapacity > 0.0 and k8s_usage.memCapacity > 0.0:
-                now_epoch = calendar.timegm(time.gmtime())
+    def __init__(self, name, period_sec, clock=time.time, sleep=time.sleep):
+        self.name = name
+        self.period_sec = period_sec
+        self.clock = clock
+        self.sleep = sleep
+        self.next_tick = None
+        self.missed_ticks = 0
+
+    def next_boundary(self, epoch):
+        return (int(epoch // self.period_sec) + 1) * self.period_sec
+
+    def wait_next_tick(self):
+        """Wait for the next tick and return its epoch time; the first tick is immediate."""
+        now = self.clock()
+        if self.next_tick is None:
+            tick = now
+        elif now < self.next_tick:
+            self.sleep(self.next_tick - now)
+            tick = self.next_tick
+        else:
+            tick = now - (now - self.next_tick) % self.period_sec
+            missed = int((now - self.next_tick) // self.period_sec)
+            if missed > 0:
+                self.missed_ticks += missed
+                PROMETHEUS_MISSED_TICKS_EXPORTER.labels(self.name).inc(missed)
+                KOA_LOGGER.warning("[%s] previous run overran, skipping %d tick(s)", self.name, missed)
+        self.next_tick = self.next_boundary(tick)
+        return tick
+
+
+class CycleStages:
+    """Record the duration of the stages of a cycle and report stages exceeding their deadline.
+
+    Deadlines are expressed as fractions of the cycle period. They are only reported, through a
+    warning and the stage duration gauge: a late stage is not interrupted, and a cycle overrunning
+    its period makes the scheduler skip ticks (see PeriodicScheduler).
+    """
 
-                # handle non-allocatable cpu
-                cpu_non_allocatable = compute_usage_percent_ratio(
-                    k8s_usage.cpuCapacity - k8s_usage.cpuAllocatable, k8s_usage.cpuCapacity
-                )
-                # handle non-allocatable memory
-                mem_non_allocatable = compute_usage_percent_ratio(
-                    k8s_usage.memCapacity - k8s_usage.memAllocatable, k8s_usage.memCapacity
+    deadline_ratios = {
+        "fetch": 0.4,
+        "parse": 0.2,
+        "consolidate": 0.1,
+        "dump": 0.1,
+        "persist": 0.2,
+        "export": 0.8,
+    }
+
+    def __init__(self, name, period_sec):
+        self.name = name
+        self.period_sec = period_sec
+        self.durations = {}
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.durations[stage] = duration
+            PROMETHEUS_STAGE_DURATION_EXPORTER.labels(self.name, stage).set(duration)
+            deadline = self.deadline_ratios.get(stage, 1.0) * self.period_sec
+            if duration > deadline:
+                PROMETHEUS_STAGE_DEADLINE_EXCEEDED_EXPORTER.labels(self.name, stage).inc()
+                KOA_LOGGER.warning(
+                    "[%s] stage %s took %.1fs, exceeding its %.1fs deadline", self.name, stage, duration, deadline
                 )
 
-                rrd = Rrd(
-                    db_files_location=KOA_CONFIG.db_location,
-                    dbname=KOA_CONFIG.db_non_allocatable,
-                )
 
-                rrd.add_sample(
-                    timestamp_epoch=now_epoch,
-                    cpu_usage=cpu_non_allocatable,
-                    mem_usage=mem_non_allocatable,
-                )
+def fetch_k8s_data(informers):
+    """Fetch the Kubernetes resources that are not served by informers, concurrently."""
+    api_contexts = {"node_metrics": "/apis/metrics.k8s.io/v1beta1/nodes"}
+    if not informers:
+        api_contexts["namespaces"] = "/api/v1/namespaces"
+        api_contexts["nodes"] = "/api/v1/nodes"
+    if KOA_CONFIG.k8s_list_page_size <= 0:
+        api_contexts["pod_metrics"] = "/apis/metrics.k8s.io/v1beta1/pods"
+        if not informers:
+            api_contexts["pods"] = "/api/v1/pods"
+    return K8S_API_COLLECTOR.collect(api_contexts)
 
-                hourly_rate = -1
-                if KOA_CONFIG.billing_hourly_rate > 0:
-                    hourly_rate = KOA_CONFIG.billing_hourly_rate
 
-                rrd = Rrd(
-                    db_files_location=KOA_CONFIG.db_location,
-                    dbname=KOA_CONFIG.db_billing_hourly_rate,
-                )
-                rrd.add_sample(
-                    timestamp_epoch=now_epoch,
-                    cpu_usage=hourly_rate,
-                    mem_usage=hourly_rate,
-                )
+def extract_k8s_usage(k8s_data, informers, attempts=3):
+    """Build the K8sUsage of the current cycle from fetched data and informer caches.
 
-                # handle resource request and usage by pods
-                for ns, ns_usage in k8s_usage.usageByNamespace.items():
-                    rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=ns)
-                    cpu_usage = compute_usage_percent_ratio(ns_usage.cpu, k8s_usage.cpuCapacity)
-                    mem_usage = compute_usage_percent_ratio(ns_usage.mem, k8s_usage.memCapacity)
-                    rrd.add_sample(timestamp_epoch=now_epoch, cpu_usage=cpu_usage, mem_usage=mem_usage)
-
-                    cpu_efficiency = 1.0
-                    mem_efficiency = 1.0
-                    request_capacities = k8s_usage.requestByNamespace.get(ns, None)
-                    if request_capacities is not None:
-                        if request_capacities.cpu > 0.0:
-                            cpu_efficiency = round(ns_usage.cpu / request_capacities.cpu, 2)
-                        if request_capacities.mem > 0.0:
-                            mem_efficiency = round(ns_usage.mem / request_capacities.mem, 2)
-
-                    if cpu_efficiency > 0.0 or mem_efficiency > 0.0:
-                        rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=KOA_CONFIG.usage_efficiency_db(ns))
-                        rrd.add_sample(timestamp_epoch=now_epoch, cpu_usage=cpu_efficiency, mem_usage=mem_efficiency)
-
-                # handle GPU metrics by namespace (outside the namespace loop)
-                if k8s_usage.gpuMetricsByPod:
-                    # Aggregate GPU metrics by namespace
-                    gpu_by_namespace = {}
-                    for _, gpu_metrics in k8s_usage.gpuMetricsByPod.items():
-                        gpu_ns = gpu_metrics.namespace
-                        if gpu_ns not in gpu_by_namespace:
-                            gpu_by_namespace[gpu_ns] = {
-                                "gpuCpuUsage": 0.0,
-                                "gpuMemUsage": 0.0,
-                                "gpuMemFree": 0.0,
-                                "gpuCount": 0,
-                            }
-                        gpu_by_namespace[gpu_ns]["gpuCpuUsage"] += gpu_metrics.gpuCpuUsage
-                        gpu_by_namespace[gpu_ns]["gpuMemUsage"] += gpu_metrics.gpuMemUsage
-                        gpu_by_namespace[gpu_ns]["gpuMemFree"] += gpu_metrics.gpuMemFree
-                        gpu_by_namespace[gpu_ns]["gpuCount"] += gpu_metrics.gpuCount
-
-                    # Store GPU metrics in RRD databases
-                    for gpu_ns, gpu_data in gpu_by_namespace.items():
-                        # Calculate average GPU compute utilization across all GPUs in namespace
-                        gpu_count = gpu_data["gpuCount"]
-                        gpu_cpu_usage = gpu_data["gpuCpuUsage"] / gpu_count if gpu_count > 0 else 0.0
-
-                        # Calculate GPU memory utilization percentage
-                        total_gpu_mem = gpu_data["gpuMemUsage"] + gpu_data["gpuMemFree"]
-                        gpu_mem_usage = (gpu_data["gpuMemUsage"] / total_gpu_mem) * 100 if total_gpu_mem > 0 else 0.0
-
-                        rrd = Rrd(
-                            db_files_location=KOA_CONFIG.db_location,
-                            dbname=KOA_CONFIG.gpu_metrics_db(gpu_ns),
-                        )
+    In paginated mode, pods and pod metrics are fetched while being extracted. When a continue token
+    expires meanwhile, the extraction restarts from scratch, up to attempts times.
 
-                        rrd.add_sample(
-                            timestamp_epoch=now_epoch,
-                            cpu_usage=gpu_cpu_usage,
-                            mem_usage=gpu_mem_usage,
-                        )
-                        KOA_LOGGER.debug(
-                            "[puller] GPU metrics for namespace %s: compute=%.2f%%, memory=%.2f%%",
-                            gpu_ns,
-                            gpu_cpu_usage,
-                            gpu_mem_usage,
-                        )
+    :raise K8sListError: when pods or pod metrics cannot be listed completely
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return extract_k8s_usage_once(k8s_data, informers)
+        except K8sListError as ex:
+            if not ex.expired or attempt == attempts:
+                raise
+            KOA_LOGGER.warning("[puller] %s, restarting the listing", ex)
+
+
+def extract_k8s_usage_once(k8s_data, informers):
+    k8s_usage = K8sUsage()
+    if informers:
+        # namespaces, nodes and pods are read from the informer caches
+        k8s_usage.extract_namespace_items(informers["namespaces"].snapshot())
+        k8s_usage.extract_node_items(informers["nodes"].snapshot())
+        k8s_usage.extract_pod_items(informers["pods"].snapshot())
+    else:
+        k8s_usage.extract_namespaces_and_initialize_usage(k8s_data["namespaces"])
+        k8s_usage.extract_nodes(k8s_data["nodes"])
+    k8s_usage.extract_node_metrics(k8s_data["node_metrics"])
+    page_size = KOA_CONFIG.k8s_list_page_size
+    if page_size <= 0:
+        if not informers:
+            k8s_usage.extract_pods(k8s_data["pods"])
+        k8s_usage.extract_pod_metrics(k8s_data["pod_metrics"])
+    else:
+        # stream pods then their metrics page by page to bound memory usage
+        streamed_resources = [("/apis/metrics.k8s.io/v1beta1/pods", k8s_usage.extract_pod_metrics_items)]
+        if not informers:
+            streamed_resources.insert(0, ("/api/v1/pods", k8s_usage.extract_pod_items))
+        for api_context, extract_items in streamed_resources:
+            K8S_API_COLLECTOR.timed_call(
+                api_context, extract_items, K8S_API_COLLECTOR.list_items(api_context, page_size)
+            )
+    # Collect GPU metrics from DCGM exporter if configured
+    k8s_usage.extract_gpu_metrics(k8s_data["dcgm"])
+    return k8s_usage
+
+
+def build_sample_batch(k8s_usage, timestamp_epoch):
+    """Compute the samples of the current cycle for all databases."""
+    # handle non-allocatable cpu
+    cpu_non_allocatable = compute_usage_percent_ratio(
+        k8s_usage.cpuCapacity - k8s_usage.cpuAllocatable, k8s_usage.cpuCapacity
+    )
+    # handle non-allocatable memory
+    mem_non_allocatable = compute_usage_percent_ratio(
+        k8s_usage.memCapacity - k8s_usage.memAllocatable, k8s_usage.memCapacity
+    )
+
+    samples = RrdWriteBatch()
+    samples.add_sample(
+        dbname=KOA_CONFIG.db_non_allocatable,
+        timestamp_epoch=timestamp_epoch,
+        cpu_usage=cpu_non_allocatable,
+        mem_usage=mem_non_allocatable,
+    )
+
+    hourly_rate = -1
+    if KOA_CONFIG.billing_hourly_rate > 0:
+        hourly_rate = KOA_CONFIG.billing_hourly_rate
 
-            time.sleep(int(KOA_CONFIG.polling_interval_sec))
+    samples.add_sample(
+        dbname=KOA_CONFIG.db_billing_hourly_rate,
+        timestamp_epoch=timestamp_epoch,
+        cpu_usage=hourly_rate,
+        mem_usage=hourly_rate,
+    )
+
+    # handle resource request and usage by pods
+    for ns, ns_usage in k8s_usage.usageByNamespace.items():
+        cpu_usage = compute_usage_percent_ratio(ns_usage.cpu, k8s_usage.cpuCapacity)
+        mem_usage = compute_usage_percent_ratio(ns_usage.mem, k8s_usage.memCapacity)
+        samples.add_sample(dbname=ns, timestamp_epoch=timestamp_epoch, cpu_usage=cpu_usage, mem_usage=mem_usage)
+
+        cpu_efficiency = 1.0
+        mem_efficiency = 1.0
+        request_capacities = k8s_usage.requestByNamespace.get(ns, None)
+        if request_capacities is not None:
+            if request_capacities.cpu > 0.0:
+                cpu_efficiency = round(ns_usage.cpu / request_capacities.cpu, 2)
+            if request_capacities.mem > 0.0:
+                mem_efficiency = round(ns_usage.mem / request_capacities.mem, 2)
+
+        if cpu_efficiency > 0.0 or mem_efficiency > 0.0:
+            samples.add_sample(
+                dbname=KOA_CONFIG.usage_efficiency_db(ns),
+                timestamp_epoch=timestamp_epoch,
+                cpu_usage=cpu_efficiency,
+                mem_usage=mem_efficiency,
+            )
+
+    # handle GPU metrics by namespace (outside the namespace loop)
+    if k8s_usage.gpuMetricsByPod:
+        # Aggregate GPU metrics by namespace
+        gpu_by_namespace = {}
+        for _, gpu_metrics in k8s_usage.gpuMetricsByPod.items():
+            gpu_ns = gpu_metrics.namespace
+            if gpu_ns not in gpu_by_namespace:
+                gpu_by_namespace[gpu_ns] = {
+                    "gpuCpuUsage": 0.0,
+                    "gpuMemUsage": 0.0,
+                    "gpuMemFree": 0.0,
+                    "gpuCount": 0,
+                }
+            gpu_by_namespace[gpu_ns]["gpuCpuUsage"] += gpu_metrics.gpuCpuUsage
+            gpu_by_namespace[gpu_ns]["gpuMemUsage"] += gpu_metrics.gpuMemUsage
+            gpu_by_namespace[gpu_ns]["gpuMemFree"] += gpu_metrics.gpuMemFree
+            gpu_by_namespace[gpu_ns]["gpuCount"] += gpu_metrics.gpuCount
+
+        # Store GPU metrics in RRD databases
+        for gpu_ns, gpu_data in gpu_by_namespace.items():
+            # Calculate average GPU compute utilization across all GPUs in namespace
+            gpu_count = gpu_data["gpuCount"]
+            gpu_cpu_usage = gpu_data["gpuCpuUsage"] / gpu_count if gpu_count > 0 else 0.0
+
+            # Calculate GPU memory utilization percentage
+            total_gpu_mem = gpu_data["gpuMemUsage"] + gpu_data["gpuMemFree"]
+            gpu_mem_usage = (gpu_data["gpuMemUsage"] / total_gpu_mem) * 100 if total_gpu_mem > 0 else 0.0
+
+            samples.add_sample(
+                dbname=KOA_CONFIG.gpu_metrics_db(gpu_ns),
+                timestamp_epoch=timestamp_epoch,
+                cpu_usage=gpu_cpu_usage,
+                mem_usage=gpu_mem_usage,
+            )
+            KOA_LOGGER.debug(
+                "[puller] GPU metrics for namespace %s: compute=%.2f%%, memory=%.2f%%",
+                gpu_ns,
+                gpu_cpu_usage,
+                gpu_mem_usage,
+            )
+
+    return samples
+
+
+def create_metrics_puller():
+    try:
+        RRD_SAMPLE_WRITER.start()
+        informers = {}
+        if KOA_CONFIG.k8s_informer_enabled:
+            for name, api_context in [
+                ("namespaces", "/api/v1/namespaces"),
+                ("nodes", "/api/v1/nodes"),
+                ("pods", "/api/v1/pods"),
+            ]:
+                informers[name] = K8sInformer(K8S_API_COLLECTOR, api_context).start()
+            for informer in informers.values():
+                informer.synced.wait(timeout=KOA_CONFIG.polling_interval_sec)
+
+        scheduler = PeriodicScheduler("puller", KOA_CONFIG.polling_interval_sec)
+        while True:
+            tick_epoch = int(scheduler.wait_next_tick())
+            KOA_LOGGER.debug("[puller] collecting new samples")
+            stages = CycleStages("puller", KOA_CONFIG.polling_interval_sec)
+
+            KOA_CONFIG.load_rbac_auth_token()
+            KOA_CONFIG.namespace_filter.reset()
+
+            with stages.stage("fetch"):
+                k8s_data = fetch_k8s_data(informers)
+
+            with stages.stage("parse"):
+                try:
+                    k8s_usage = extract_k8s_usage(k8s_data, informers)
+                except K8sListError as ex:
+                    KOA_LOGGER.error("[puller] %s, skipping the cycle rather than persisting partial usage", ex)
+                    continue
+
+            with stages.stage("consolidate"):
+                k8s_usage.consolidate_ns_usage()
+                k8s_usage.calculate_node_usage()
+
+            with stages.stage("dump"):
+                k8s_usage.dump_nodes()
+                k8s_usage.dump_gpu_metrics()
+                NODE_HEATMAP_CACHE.update(k8s_usage.nodes)
+
+            if k8s_usage.cpuCapacity > 0.0 and k8s_usage.memCapacity > 0.0:
+                with stages.stage("persist"):
+                    RRD_SAMPLE_WRITER.submit(build_sample_batch(k8s_usage, tick_epoch))
 
     except Exception as ex:
         exception_type = type(ex).__name__
@@ -1464,63 +4115,349 @@ def create_metrics_puller():
         )
 
 
-def dump_analytics(cost_model_by_user=None):
+TREND_PARTIALS = {}
+DATABASE_EPOCHS = {}
+
+
+def compute_analytics_partials(ns_dbfiles, rf_dbfiles, gpu_dbfiles, now_epoch_utc, last_updates=None, epochs=None):
+    """Compute the per-database trend and histogram results of a set of RRD files.
+
+    This runs either in the exporter thread or in an analytics worker process, so results are
+    plain picklable structures; the cost model normalization is left to the caller.
+
+    :param last_updates: last update of each database, from the catalog; the trend of a database
+        whose last update has not changed since it was computed within the same hour is reused
+    :param epochs: epoch of each database, from the catalog; the cached trend and histogram buckets
+        of a database whose epoch changed, since it was archived and recreated, are dropped
+    """
+    partials = {"trends": {}, "hourly": {}, "series": {}, "histograms": collections.defaultdict(dict), "fetches": 0}
+    hour = now_epoch_utc // int(RrdPeriod.PERIOD_1_HOUR_SEC)
+    if epochs:
+        for db in itertools.chain(ns_dbfiles, rf_dbfiles, gpu_dbfiles):
+            epoch = epochs.get(db, 0)
+            if DATABASE_EPOCHS.setdefault(db, epoch) != epoch:
+                HISTOGRAM_ANALYTICS_ENGINE.forget(Rrd.get_location(db))
+                TREND_PARTIALS.pop(db, None)
+                DATABASE_EPOCHS[db] = epoch
+    trend_dbfiles = []
+    for db in itertools.chain(ns_dbfiles, rf_dbfiles, gpu_dbfiles):
+        if db == KOA_CONFIG.db_billing_hourly_rate and not KOA_CONFIG.enable_debug:
+            continue
+        version = (last_updates.get(db), hour) if last_updates else None
+        cached = TREND_PARTIALS.get(db)
+        if version is not None and cached is not None and cached[0] == version:
+            _, trend, series, hourly_usage = cached
+            partials["trends"][db] = trend
+            partials["series"][db] = series
+            if hourly_usage is not None:
+                partials["hourly"][db] = hourly_usage
+        else:
+            trend_dbfiles.append(db)
+    # a database is processed with its request efficiency twin, in batches whose fetched points are
+    # released before moving on to the next batch
+    trend_set = set(trend_dbfiles)
+    histogram_set = set(itertools.chain(ns_dbfiles, gpu_dbfiles))
+    twins = {KOA_CONFIG.usage_efficiency_db(db) for db in histogram_set}
+    units = [(db, KOA_CONFIG.usage_efficiency_db(db)) for db in itertools.chain(ns_dbfiles, gpu_dbfiles)]
+    units.extend((db,) for db in rf_dbfiles if db not in twins)
+    RRD_FETCH_PLANNER.begin_cycle(now_epoch_utc)
     try:
-        export_interval = round(1.5 * KOA_CONFIG.polling_interval_sec)
-        while True:
-            dbfiles: List[Any] = []
-            for _, _, filenames in os.walk(KOA_CONFIG.db_location):
-                dbfiles.extend(filenames)
-                break
-
-            ns_dbfiles = []
-            rf_dbfiles = []
-            gpu_dbfiles = []
-            for fn in dbfiles:
-                if fn.endswith(KOA_CONFIG.request_efficiency_db_file_extension()):
-                    rf_dbfiles.append(fn)
-                elif fn.endswith(KOA_CONFIG.gpu_db_file_extension()):
-                    gpu_dbfiles.append(fn)
-                else:
-                    ns_dbfiles.append(fn)
+        plan_analytics_fetches(
+            RRD_FETCH_PLANNER, ns_dbfiles, rf_dbfiles, gpu_dbfiles, now_epoch_utc, trend_dbfiles=trend_dbfiles
+        )
+        for batch_start in range(0, len(units), RRD_FETCH_PLANNER.prefetch_batch_size):
+            batch = units[batch_start : batch_start + RRD_FETCH_PLANNER.prefetch_batch_size]
+            locations = {Rrd.get_location(db) for unit in batch for db in unit}
+            RRD_FETCH_PLANNER.prefetch(TIME_SERIES_STORAGE, locations)
+            for db in itertools.chain.from_iterable(batch):
+                if db in trend_set:
+                    rrd = Rrd(db_files_location=KOA_CONFIG.db_location, dbname=db)
+                    step, points = rrd.trend_points(period=RrdPeriod.PERIOD_7_DAYS_SEC)
+                    cpu_trend, mem_trend, hourly_usage = Rrd.render_trend(db, points, KOA_CONFIG.trend_max_points)
+                    partials["trends"][db] = (cpu_trend, mem_trend)
+                    partials["series"][db] = (step, points)
+                    if hourly_usage is not None:
+                        partials["hourly"][db] = hourly_usage
+                    if last_updates:
+                        TREND_PARTIALS[db] = (
+                            (last_updates.get(db), hour),
+                            (cpu_trend, mem_trend),
+                            (step, points),
+                            hourly_usage,
+                        )
+                if db in histogram_set:
+                    for period in (RrdPeriod.PERIOD_14_DAYS_SEC, RrdPeriod.PERIOD_YEAR_SEC):
+                        usage, rf = Rrd.periodic_usages(db, period)
+                        partials["histograms"][int(period)][db] = (
+                            tuple(dict(d) for d in usage),
+                            tuple(dict(d) for d in rf),
+                        )
+            RRD_FETCH_PLANNER.release(locations)
+    finally:
+        partials["fetches"] = RRD_FETCH_PLANNER.end_cycle()
+    partials["histograms"] = dict(partials["histograms"])
+    return partials
+
+
+def merge_analytics_partials(partials_list):
+    """Merge the results of compute_analytics_partials computed for disjoint sets of RRD files."""
+    merged = {"trends": {}, "hourly": {}, "series": {}, "histograms": collections.defaultdict(dict), "fetches": 0}
+    for partials in partials_list:
+        merged["trends"].update(partials["trends"])
+        merged["hourly"].update(partials["hourly"])
+        merged["series"].update(partials["series"])
+        for period, periodic_usages in partials["histograms"].items():
+            merged["histograms"][period].update(periodic_usages)
+        merged["fetches"] += partials["fetches"]
+    return merged
+
+
+class UsageQueryCache:
+    """Keep the latest usage series of each RRD file in memory to answer /api/v2/usage queries.
+
+    Series are replaced as a whole by each export cycle. At most max_points points are kept, the
+    least recently used series being evicted first.
+    """
 
-            KOA_LOGGER.info(
-                "[dump_analytics] ns_dbfiles=%d, rf_dbfiles=%d, gpu_dbfiles=%d",
-                len(ns_dbfiles),
-                len(rf_dbfiles),
-                len(gpu_dbfiles),
-            )
-            if gpu_dbfiles:
-                KOA_LOGGER.info("[dump_analytics] gpu_dbfiles: %s", gpu_dbfiles)
+    def __init__(self, max_points=None):
+        self.max_points = KOA_CONFIG.usage_cache_max_points if max_points is None else max_points
+        self.series = collections.OrderedDict()
+        self.point_count = 0
+        self.lock = threading.Lock()
+
+    def update(self, series_by_db):
+        """Replace the series of the given RRD files, each one being a (step, points) tuple."""
+        with self.lock:
+            for db, series in series_by_db.items():
+                previous = self.series.pop(db, None)
+                if previous is not None:
+                    self.point_count -= len(previous[1])
+                self.series[db] = series
+                self.point_count += len(series[1])
+            while self.point_count > self.max_points and self.series:
+                _, evicted = self.series.popitem(last=False)
+                self.point_count -= len(evicted[1])
+            PROMETHEUS_USAGE_CACHE_POINTS_EXPORTER.set(self.point_count)
+
+    def get(self, db):
+        with self.lock:
+            series = self.series.get(db)
+            if series is not None:
+                self.series.move_to_end(db)
+        PROMETHEUS_USAGE_CACHE_REQUESTS_EXPORTER.labels("hit" if series is not None else "miss").inc()
+        return series
+
+    def dbnames(self):
+        with self.lock:
+            return list(self.series.keys())
 
-            Rrd.dump_trend_analytics(ns_dbfiles, "usage")
-            Rrd.dump_trend_analytics(rf_dbfiles, "rf")
-            Rrd.dump_trend_analytics(gpu_dbfiles, "usage", prefix="gpu_")
+    @staticmethod
+    def resample(points, native_step, step, start, end):
+        """Select the points between start and end, averaged over step when it is coarser than native_step.
 
-            cost_model_selected = cost_model_by_user
-            if cost_model_by_user is None:
-                cost_model_selected = KOA_CONFIG.cost_model
-            else:
-                if cost_model_by_user not in ["CUMULATIVE", "RATIO", "CHARGE_BACK"]:
-                    cost_model_selected = "CUMULATIVE"
-                    KOA_LOGGER.warning(
-                        "Unexpected cost model => %s (using default => CUMULATIVE)",
-                        cost_model_by_user,
+        :return: list of (timestamp, cpu, mem) tuples, where timestamp ends each step
+        """
+        selected = [point for point in points if start < point[0] <= end]
+        if step <= native_step:
+            return selected
+        sums = collections.OrderedDict()
+        for ts, cpu, mem in selected:
+            bucket_end = ((ts - 1) // step + 1) * step
+            bucket = sums.get(bucket_end)
+            if bucket is None:
+                bucket = sums[bucket_end] = [0.0, 0.0, 0]
+            bucket[0] += cpu
+            bucket[1] += mem
+            bucket[2] += 1
+        return [(ts, cpu / count, mem / count) for ts, (cpu, mem, count) in sums.items()]
+
+
+USAGE_QUERY_CACHE = UsageQueryCache()
+
+
+class AnalyticsWorkerPool:
+    """Spread the per-database analytics computations over worker processes.
+
+    RRD files are sharded by namespace (a namespace database goes with its __rf twin) over
+    worker_count single-process executors, so that each worker keeps the incremental histogram
+    state of its shard from one cycle to the next. Workers are spawned rather than forked since the
+    backend runs threads. With no worker (the default), computations run in the calling thread.
+    """
+
+    def __init__(self, worker_count=None):
+        self.worker_count = KOA_CONFIG.export_workers if worker_count is None else worker_count
+        self.executors = []
+        self.lock = threading.Lock()
+
+    def shard_of(self, db):
+        rf_extension = KOA_CONFIG.request_efficiency_db_file_extension()
+        namespace_db = db[: -len(rf_extension)] if db.endswith(rf_extension) else db
+        return zlib.crc32(namespace_db.encode("utf-8")) % self.worker_count
+
+    @staticmethod
+    def shard_values(shard_dbfiles, values):
+        if values is None:
+            return None
+        return {db: values.get(db) for db in itertools.chain(*shard_dbfiles)}
+
+    def new_executor(self):
+        return concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+
+    def executor(self, shard):
+        with self.lock:
+            if not self.executors:
+                self.executors = [self.new_executor() for _ in range(self.worker_count)]
+            return self.executors[shard]
+
+    def compute(self, ns_dbfiles, rf_dbfiles, gpu_dbfiles, now_epoch_utc, last_updates=None, epochs=None):
+        """Compute and merge the analytics partials of all RRD files, see compute_analytics_partials."""
+        if self.worker_count <= 0:
+            return merge_analytics_partials(
+                [compute_analytics_partials(ns_dbfiles, rf_dbfiles, gpu_dbfiles, now_epoch_utc, last_updates, epochs)]
+            )
+
+        shards = [([], [], []) for _ in range(self.worker_count)]
+        for index, dbfiles in enumerate((ns_dbfiles, rf_dbfiles, gpu_dbfiles)):
+            for db in dbfiles:
+                shards[self.shard_of(db)][index].append(db)
+
+        futures = {
+            shard: self.executor(shard).submit(
+                compute_analytics_partials,
+                *shard_dbfiles,
+                now_epoch_utc,
+                self.shard_values(shard_dbfiles, last_updates),
+                self.shard_values(shard_dbfiles, epochs),
+            )
+            for shard, shard_dbfiles in enumerate(shards)
+            if any(shard_dbfiles)
+        }
+        partials_list = []
+        for shard, future in futures.items():
+            try:
+                partials_list.append(future.result())
+            except concurrent.futures.process.BrokenProcessPool:
+                KOA_LOGGER.error("[dump_analytics] analytics worker %d died, computing its shard in-process", shard)
+                with self.lock:
+                    self.executors[shard] = self.new_executor()
+                partials_list.append(
+                    compute_analytics_partials(
+                        *shards[shard],
+                        now_epoch_utc,
+                        self.shard_values(shards[shard], last_updates),
+                        self.shard_values(shards[shard], epochs),
                     )
+                )
+        return merge_analytics_partials(partials_list)
+
+    def shutdown(self):
+        with self.lock:
+            for executor in self.executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self.executors = []
 
-            Rrd.dump_histogram_analytics(
-                dbfiles=ns_dbfiles, period=RrdPeriod.PERIOD_14_DAYS_SEC, cost_model=cost_model_selected
-            )  # noqa: E501
-            Rrd.dump_histogram_analytics(
-                dbfiles=ns_dbfiles, period=RrdPeriod.PERIOD_YEAR_SEC, cost_model=cost_model_selected
-            )  # noqa: E501
-            Rrd.dump_histogram_analytics(
-                dbfiles=gpu_dbfiles, period=RrdPeriod.PERIOD_14_DAYS_SEC, cost_model=cost_model_selected, prefix="gpu_"
-            )  # noqa: E501
-            Rrd.dump_histogram_analytics(
-                dbfiles=gpu_dbfiles, period=RrdPeriod.PERIOD_YEAR_SEC, cost_model=cost_model_selected, prefix="gpu_"
-            )  # noqa: E501
-            time.sleep(export_interval)
+
+ANALYTICS_WORKER_POOL = AnalyticsWorkerPool()
+
+
+def export_analytics(cost_model_by_user, now_epoch_utc):
+    """Export trend and histogram analytics for all the RRD files, once."""
+    ns_dbfiles = DATABASE_CATALOG.databases(
+        DatabaseCatalog.KIND_NAMESPACE, DatabaseCatalog.KIND_NON_ALLOCATABLE, DatabaseCatalog.KIND_BILLING
+    )
+    rf_dbfiles = DATABASE_CATALOG.databases(DatabaseCatalog.KIND_EFFICIENCY)
+    gpu_dbfiles = DATABASE_CATALOG.databases(DatabaseCatalog.KIND_GPU)
+
+    KOA_LOGGER.info(
+        "[dump_analytics] ns_dbfiles=%d, rf_dbfiles=%d, gpu_dbfiles=%d",
+        len(ns_dbfiles),
+        len(rf_dbfiles),
+        len(gpu_dbfiles),
+    )
+    if gpu_dbfiles:
+        KOA_LOGGER.info("[dump_analytics] gpu_dbfiles: %s", gpu_dbfiles)
+
+    partials = ANALYTICS_WORKER_POOL.compute(
+        ns_dbfiles, rf_dbfiles, gpu_dbfiles, now_epoch_utc, DATABASE_CATALOG.last_updates(), DATABASE_CATALOG.epochs()
+    )
+    PROMETHEUS_RRD_FETCHES_EXPORTER.set(partials["fetches"])
+    KOA_LOGGER.debug("[dump_analytics] rrd fetches=%d", partials["fetches"])
+    metric_samples = collections.defaultdict(dict)
+    for db, (cpu_usage, mem_usage) in partials["hourly"].items():
+        metric_samples[PROMETHEUS_HOURLY_USAGE_METRIC][(db, ResUsageType.CPU.name)] = cpu_usage
+        metric_samples[PROMETHEUS_HOURLY_USAGE_METRIC][(db, ResUsageType.MEMORY.name)] = mem_usage
+    USAGE_QUERY_CACHE.update(partials["series"])
+
+    trends = partials["trends"]
+    Rrd.dump_trend_analytics(ns_dbfiles, "usage", trend_data=trends)
+    Rrd.dump_trend_analytics(rf_dbfiles, "rf", trend_data=trends)
+    Rrd.dump_trend_analytics(gpu_dbfiles, "usage", prefix="gpu_", trend_data=trends)
+
+    cost_model_selected = cost_model_by_user
+    if cost_model_by_user is None:
+        cost_model_selected = KOA_CONFIG.cost_model
+    else:
+        if cost_model_by_user not in ["CUMULATIVE", "RATIO", "CHARGE_BACK"]:
+            cost_model_selected = "CUMULATIVE"
+            KOA_LOGGER.warning(
+                "Unexpected cost model => %s (using default => CUMULATIVE)",
+                cost_model_by_user,
+            )
+
+    histograms = partials["histograms"]
+    # archives of inactive namespaces still count in the periods they overlap
+    histogram_dbfiles = {}
+    for period in (RrdPeriod.PERIOD_14_DAYS_SEC, RrdPeriod.PERIOD_YEAR_SEC):
+        periodic_usages = histograms.setdefault(period, {})
+        for kind, dbfiles in ((DatabaseCatalog.KIND_NAMESPACE, ns_dbfiles), (DatabaseCatalog.KIND_GPU, gpu_dbfiles)):
+            archived = DATABASE_LIFECYCLE_MANAGER.periodic_usages(
+                DATABASE_CATALOG.archived_databases(kind), period, now_epoch_utc
+            )
+            for db, usages in archived.items():
+                periodic_usages[db] = merge_periodic_usages(periodic_usages.get(db), usages)
+            histogram_dbfiles[(kind, period)] = dbfiles + sorted(set(archived) - set(dbfiles))
+
+    for period in (RrdPeriod.PERIOD_14_DAYS_SEC, RrdPeriod.PERIOD_YEAR_SEC):
+        Rrd.dump_histogram_analytics(
+            dbfiles=histogram_dbfiles[(DatabaseCatalog.KIND_NAMESPACE, period)],
+            period=period,
+            cost_model=cost_model_selected,
+            periodic_usages=histograms.get(period, {}),
+            metric_samples=metric_samples,
+        )
+    for period in (RrdPeriod.PERIOD_14_DAYS_SEC, RrdPeriod.PERIOD_YEAR_SEC):
+        Rrd.dump_histogram_analytics(
+            dbfiles=histogram_dbfiles[(DatabaseCatalog.KIND_GPU, period)],
+            period=period,
+            cost_model=cost_model_selected,
+            prefix="gpu_",
+            periodic_usages=histograms.get(period, {}),
+            metric_samples=metric_samples,
+        )
+    ANALYTICS_METRICS_COLLECTOR.publish(metric_samples)
+
+
+def dump_analytics(cost_model_by_user=None):
+    """Export analytics whenever the puller commits new samples.
+
+    The first export runs at startup from the existing RRD files. Afterwards, the exporter waits for
+    committed samples and skips exports while there are none.
+    """
+    try:
+        export_interval = round(1.5 * KOA_CONFIG.polling_interval_sec)
+        exported = False
+        while True:
+            commits = SAMPLE_COMMIT_EVENTS.wait(timeout=export_interval if exported else 0)
+            if not commits and exported:
+                KOA_LOGGER.debug("[dump_analytics] no new samples committed, skipping export")
+                continue
+            KOA_LOGGER.debug("[dump_analytics] exporting, %d sample batches committed", commits)
+            stages = CycleStages("exporter", export_interval)
+            with stages.stage("lifecycle"):
+                DATABASE_LIFECYCLE_MANAGER.run()
+            with stages.stage("export"):
+                export_analytics(cost_model_by_user, calendar.timegm(time.gmtime()))
+            exported = True
     except Exception as ex:
         exception_type = type(ex).__name__
         KOA_LOGGER.error("%s Exception in dump_analytics => %s", exception_type, traceback.format_exc())
@@ -1537,7 +4474,73 @@ if __name__ == "__main__":
         action="version",
         version="%(prog)s {}".format(KOA_CONFIG.version),
     )
+    parser.add_argument(
+        "--migrate-rrd",
+        action="store_true",
+        help="copy the RRD files of KL_DB_LOCATION into the storage engine set by KL_STORAGE_BACKEND, then exit",
+    )
+    parser.add_argument(
+        "--backfill",
+        metavar="FILE",
+        help="import historical namespace usage from a CSV file or Prometheus range query results (.json), then exit",
+    )
+    parser.add_argument(
+        "--backfill-cpu-capacity", type=float, help="cluster CPU capacity in cores, when absent from the backfill file"
+    )
+    parser.add_argument(
+        "--backfill-mem-capacity",
+        type=float,
+        help="cluster memory capacity in bytes, when absent from the backfill file",
+    )
+    parser.add_argument(
+        "--backfill-workers", type=int, default=os.cpu_count(), help="number of processes writing backfilled samples"
+    )
     args = parser.parse_args()
+
+    if args.backfill:
+        with open(args.backfill, newline="") as f:
+            if args.backfill.endswith(".json"):
+                backfill_records = parse_backfill_prometheus(json.load(f))
+            else:
+                backfill_records = parse_backfill_csv(f)
+            try:
+                backfill(
+                    build_backfill_points(
+                        backfill_records,
+                        KOA_CONFIG.polling_interval_sec,
+                        cpu_capacity=args.backfill_cpu_capacity,
+                        mem_capacity=args.backfill_mem_capacity,
+                    ),
+                    workers=args.backfill_workers,
+                )
+            except (RuntimeError, ValueError) as ex:
+                KOA_LOGGER.error("[backfill] %s", ex)
+                sys.exit(1)
+        sys.exit(0)
+
+    if args.migrate_rrd:
+        if not isinstance(TIME_SERIES_STORAGE, (SqliteStorage, MmapStorage)):
+            parser.error("--migrate-rrd requires KL_STORAGE_BACKEND to be sqlite or mmap")
+        if not STORAGE_LOCK.acquire(blocking=False):
+            KOA_LOGGER.error("[migration] storage is in use by another process, migrate before the backend starts")
+            sys.exit(1)
+        count = migrate_rrd_files(KOA_CONFIG.db_location, TIME_SERIES_STORAGE)
+        KOA_LOGGER.info("[migration] %d databases migrated to %s", count, TIME_SERIES_STORAGE.path)
+        sys.exit(0)
+
+    def handle_termination(signum, _frame):
+        KOA_LOGGER.warning("Received signal %d, flushing pending samples before exiting", signum)
+        RRD_SAMPLE_WRITER.stop(timeout=KOA_CONFIG.polling_interval_sec)
+        ANALYTICS_WORKER_POOL.shutdown()
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, handle_termination)
+    signal.signal(signal.SIGINT, handle_termination)
+
+    if not STORAGE_LOCK.acquire(blocking=False):
+        KOA_LOGGER.warning("storage locked by another process (%s), waiting for it to exit", STORAGE_LOCK.path)
+        STORAGE_LOCK.acquire()
+
     th_puller = threading.Thread(target=create_metrics_puller)
     th_exporter = threading.Thread(target=dump_analytics)
     th_puller.start()
@@ -8,6 +8,11 @@ __maintainer__ = "Rodrigue Chakode"
 __email__ = "Rodrigue Chakode <rodrigue.chakode @ gmail dot com"
 __status__ = "Production"
 
+import contextlib
+import gzip
+import json
+import os
+
 import backend
 
 
@@ -71,3 +76,969 @@ class TestDecodeK8sMetrics(object):
         # P = 1e15
         assert round(backend.K8sUsage().decode_capacity("1P"), 9) == 1e15
         assert round(backend.K8sUsage().decode_capacity("875P"), 9) == 875 * 1e15
+
+    def test_decode_quantity_is_memoized(self):
+        backend.decode_quantity.cache_clear()
+        assert backend.decode_quantity("128Mi") == 128 * 1024 * 1024
+        assert backend.decode_quantity("128Mi") == 128 * 1024 * 1024
+        assert backend.decode_quantity.cache_info().hits == 1
+
+
+class TestK8sApiCollector(object):
+    def test_collect_concurrently_and_record_latencies(self, monkeypatch):
+        collector = backend.K8sApiCollector(pool_size=2)
+        monkeypatch.setattr(collector, "get", lambda api_context: '{"context": "%s"}' % api_context)
+        monkeypatch.setattr(backend.KOA_CONFIG, "nvidia_dcgm_endpoint", None)
+        results = collector.collect({"nodes": "/api/v1/nodes", "pods": "/api/v1/pods"})
+        assert results["nodes"] == '{"context": "/api/v1/nodes"}'
+        assert results["pods"] == '{"context": "/api/v1/pods"}'
+        assert results["dcgm"] is None
+        assert set(collector.latencies.keys()) == {"/api/v1/nodes", "/api/v1/pods"}
+
+    def test_list_items_follows_continue_tokens(self, monkeypatch):
+        pages = {
+            None: '{"metadata": {"continue": "p2"}, "items": [{"id": 1}, {"id": 2}]}',
+            "p2": '{"metadata": {}, "items": [{"id": 3}]}',
+        }
+        requested_params = []
+
+        def fake_get(api_context, params=None):
+            requested_params.append(dict(params))
+            return pages[params.get("continue")]
+
+        collector = backend.K8sApiCollector(pool_size=1)
+        monkeypatch.setattr(collector, "get", fake_get)
+        items = list(collector.list_items("/api/v1/pods", page_size=2))
+        assert [i["id"] for i in items] == [1, 2, 3]
+        assert requested_params == [{"limit": 2}, {"limit": 2, "continue": "p2"}]
+
+    def test_list_items_fails_on_incomplete_listing(self, monkeypatch):
+        collector = backend.K8sApiCollector(pool_size=1)
+
+        def fake_get(api_context, params=None):
+            if "continue" in params:
+                collector.local.status_code = 410
+                return None
+            return '{"metadata": {"continue": "p2", "resourceVersion": "1"}, "items": [{"id": 1}]}'
+
+        monkeypatch.setattr(collector, "get", fake_get)
+        list_metadata = {}
+        items = []
+        try:
+            items.extend(collector.list_items("/api/v1/pods", page_size=1, list_metadata=list_metadata))
+        except backend.K8sListError as ex:
+            assert ex.expired
+        else:
+            raise AssertionError("incomplete listing not reported")
+        assert items == [{"id": 1}]
+        assert list_metadata == {}
+
+    def test_expired_listing_restarts_extraction(self, monkeypatch):
+        attempts = []
+
+        def fake_extract(k8s_data, informers):
+            attempts.append(1)
+            if len(attempts) < 2:
+                raise backend.K8sListError("/api/v1/pods", 410)
+            return "usage"
+
+        monkeypatch.setattr(backend, "extract_k8s_usage_once", fake_extract)
+        assert backend.extract_k8s_usage({}, {}) == "usage"
+        assert len(attempts) == 2
+
+
+class TestK8sInformer(object):
+    def test_handle_watch_events(self):
+        informer = backend.K8sInformer(collector=None, api_context="/api/v1/pods")
+        pod = {"metadata": {"namespace": "default", "name": "nginx", "resourceVersion": "10"}}
+        assert informer.handle_event({"type": "ADDED", "object": pod})
+        assert informer.snapshot() == [pod]
+        assert informer.resource_version == "10"
+
+        bookmark = {"metadata": {"resourceVersion": "15"}}
+        assert informer.handle_event({"type": "BOOKMARK", "object": bookmark})
+        assert informer.resource_version == "15"
+        assert len(informer.snapshot()) == 1
+
+        deleted_pod = {"metadata": {"namespace": "default", "name": "nginx", "resourceVersion": "20"}}
+        assert informer.handle_event({"type": "DELETED", "object": deleted_pod})
+        assert informer.snapshot() == []
+
+        assert not informer.handle_event({"type": "ERROR", "object": {"code": 410, "message": "too old"}})
+        assert informer.resource_version is None
+
+    def test_watch_error_status_backs_off_and_relists(self, monkeypatch):
+        class GoneCollector(object):
+            def watch_events(self, api_context, resource_version):
+                raise backend.K8sListError(api_context, 410)
+                yield
+
+        sleeps = []
+
+        def fake_sleep(duration):
+            sleeps.append(duration)
+            raise KeyboardInterrupt()
+
+        informer = backend.K8sInformer(collector=GoneCollector(), api_context="/api/v1/pods")
+        informer.resource_version = "10"
+        monkeypatch.setattr(backend.time, "sleep", fake_sleep)
+        with contextlib.suppress(KeyboardInterrupt):
+            informer.run()
+        assert informer.resource_version is None
+        assert sleeps == [5]
+
+    def test_watch_error_events_back_off(self, monkeypatch):
+        class ThrottledCollector(object):
+            def watch_events(self, api_context, resource_version):
+                yield {"type": "ERROR", "object": {"code": 429, "message": "too many requests"}}
+
+        sleeps = []
+
+        def fake_sleep(duration):
+            sleeps.append(duration)
+            if len(sleeps) == 2:
+                raise KeyboardInterrupt()
+
+        informer = backend.K8sInformer(collector=ThrottledCollector(), api_context="/api/v1/pods")
+        informer.resource_version = "10"
+        monkeypatch.setattr(backend.time, "sleep", fake_sleep)
+        with contextlib.suppress(KeyboardInterrupt):
+            informer.run()
+        # the watch is resumed from the same resource version, after a back-off each time
+        assert informer.resource_version == "10"
+        assert sleeps == [5, 5]
+        assert informer.watch_errors == 2
+
+
+class TestParseDcgmMetrics(object):
+    def test_parse_selected_metrics_only(self):
+        lines = [
+            "# HELP DCGM_FI_DEV_GPU_UTIL GPU utilization (in %).",
+            "# TYPE DCGM_FI_DEV_GPU_UTIL gauge",
+            'DCGM_FI_DEV_GPU_UTIL{gpu="0",UUID="GPU-1",namespace="ml",pod="train-0"} 87',
+            'DCGM_FI_DEV_GPU_UTIL_SAMPLES{gpu="0",UUID="GPU-1"} 3',
+            'DCGM_FI_DEV_SM_CLOCK{gpu="0",UUID="GPU-1",namespace="ml",pod="train-0"} 1410',
+            'DCGM_FI_DEV_FB_USED{gpu="0",UUID="GPU-1",namespace="ml",pod="train-0"} 2048 1700000000000',
+        ]
+        metrics = backend.parse_dcgm_metrics(lines, backend.DCGM_METRIC_MAPPING)
+        assert sorted(metrics.keys()) == ["DCGM_FI_DEV_FB_USED", "DCGM_FI_DEV_GPU_UTIL"]
+        assert metrics["DCGM_FI_DEV_GPU_UTIL"][0] == {
+            "labels": {"gpu": "0", "UUID": "GPU-1", "namespace": "ml", "pod": "train-0"},
+            "value": 87.0,
+        }
+        assert metrics["DCGM_FI_DEV_FB_USED"][0]["value"] == 2048.0
+
+    def test_parse_escaped_label_values(self):
+        lines = ['DCGM_FI_DEV_GPU_UTIL{modelName="A \\"quoted\\", name\\\\x",pod="p",namespace="ns"} 5']
+        metrics = backend.parse_dcgm_metrics(lines)
+        labels = metrics["DCGM_FI_DEV_GPU_UTIL"][0]["labels"]
+        assert labels == {"modelName": 'A "quoted", name\\x', "pod": "p", "namespace": "ns"}
+
+
+class TestNamespaceFilter(object):
+    def test_include_all_by_default(self):
+        ns_filter = backend.NamespaceFilter([], ["kube-*", "ci-??"])
+        assert ns_filter.allow("default")
+        assert not ns_filter.allow("kube-system")
+        assert not ns_filter.allow("ci-42")
+        assert ns_filter.allow("ci-420")
+
+    def test_include_patterns_and_verdict_cache(self):
+        ns_filter = backend.NamespaceFilter(["team-*", "prod"], ["team-sandbox"])
+        assert ns_filter.allow("team-a")
+        assert ns_filter.allow("prod")
+        assert not ns_filter.allow("production")
+        assert not ns_filter.allow("team-sandbox")
+        assert ns_filter.verdicts == {"team-a": True, "prod": True, "production": False, "team-sandbox": False}
+        ns_filter.reset()
+        assert ns_filter.verdicts == {}
+
+
+class TestRrdWriteBatch(object):
+    def test_flush_one_update_per_database(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        monkeypatch.setattr(backend.KOA_CONFIG, "rrdcached_address", None)
+        monkeypatch.setattr(backend.Rrd, "create_rrd_file_if_not_exists", lambda self: None)
+        updates = []
+        batch = backend.RrdWriteBatch(writer=lambda *args: updates.append(args))
+        batch.add_sample("default", 1700000000, 1.5, 2.25)
+        batch.add_sample("default", 1700000300, 1.0, 2.0)
+        batch.add_sample("default__rf", 1700000000, 0.5, 0.75)
+        assert batch.flush() > 0
+        assert sorted(updates) == [
+            ("%s/default" % tmp_path, "1700000000:1.5:2.25", "1700000300:1.0:2.0"),
+            ("%s/default__rf" % tmp_path, "1700000000:0.5:0.75"),
+        ]
+        assert batch.sample_count == 0
+
+
+class TestSqliteStorage(object):
+    def test_storage_engines_must_implement_the_whole_interface(self):
+        class PartialStorage(backend.TimeSeriesStorage):
+            def ensure(self, rrd, db_files_location):
+                pass
+
+        try:
+            PartialStorage()
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("incomplete storage engine instantiated")
+
+    def test_write_and_read_consolidated_points(self, monkeypatch, tmp_path):
+        storage = backend.SqliteStorage(str(tmp_path / "db.sqlite"), polling_interval_sec=300)
+        monkeypatch.setattr(backend, "TIME_SERIES_STORAGE", storage)
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        now = backend.calendar.timegm(backend.time.gmtime())
+        hour = now - now % 3600 - 3600
+        batch = backend.RrdWriteBatch()
+        for i in range(12):
+            batch.add_sample("default", hour - 3600 + (i + 1) * 300, i % 2, 2.0)
+        batch.add_sample("default__rf", hour, 0.5, 0.75)
+        batch.flush()
+        # samples older than the last update are ignored, as with rrdtool
+        storage.write(backend.Rrd(dbname="default"), [(hour - 600, 100.0, 100.0)])
+
+        rrd = backend.Rrd(dbname="default")
+        assert rrd.last_update() == hour
+        assert storage.list_databases() == ["default", "default__rf"]
+        assert rrd.read_points(300, hour - 900, hour - 300) == [
+            (hour - 600, 1.0, 2.0),
+            (hour - 300, 0.0, 2.0),
+            (hour, 1.0, 2.0),
+        ]
+        assert rrd.read_points(3600, hour - 3600, hour) == [(hour, 0.5, 2.0), (hour + 3600, None, None)]
+        # less than half of the hour is sampled
+        assert storage.read_points_many(["default__rf", "unknown"], 3600, hour - 3600, hour) == {
+            "default__rf": [(hour, None, None), (hour + 3600, None, None)],
+            "unknown": [(hour, None, None), (hour + 3600, None, None)],
+        }
+
+    def test_planner_prefetches_with_bulk_reads(self, monkeypatch, tmp_path):
+        storage = backend.SqliteStorage(str(tmp_path / "db.sqlite"), polling_interval_sec=300)
+        monkeypatch.setattr(backend, "TIME_SERIES_STORAGE", storage)
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        now = backend.calendar.timegm(backend.time.gmtime())
+        now -= now % 3600
+        storage.write_many({ns: [(now - i * 300, 1.0, 2.0) for i in range(11, -1, -1)] for ns in ("a", "b", "c")})
+        planner = backend.RrdFetchPlanner()
+        planner.begin_cycle(now)
+        for ns in ("a", "b", "c"):
+            planner.plan(backend.Rrd.get_location(ns), 3600, now - 7 * 86400, now)
+        planner.prefetch(storage)
+        assert planner.fetch_count == 1
+        points = planner.fetch_points(backend.Rrd(dbname="b"), 3600, now - 7200, now)
+        assert points == [(now - 3600, None, None), (now, 1.0, 2.0), (now + 3600, None, None)]
+        assert planner.end_cycle() == 1
+
+
+class TestMmapStorage(object):
+    def test_ring_buffers_are_shared_through_the_file(self, monkeypatch, tmp_path):
+        storage = backend.MmapStorage(str(tmp_path / "db.ring"), polling_interval_sec=300)
+        monkeypatch.setattr(backend, "TIME_SERIES_STORAGE", storage)
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        now = backend.calendar.timegm(backend.time.gmtime())
+        hour = now - now % 3600 - 3600
+        batch = backend.RrdWriteBatch()
+        for i in range(12):
+            batch.add_sample("default", hour - 3600 + (i + 1) * 300, i % 2, 2.0)
+        batch.add_sample("default__rf", hour, 0.5, 0.75)
+        batch.flush()
+        storage.write(backend.Rrd(dbname="default"), [(hour - 600, 100.0, 100.0)])
+
+        # a second mapping, e.g. in an analytics worker, indexes the slots from the file
+        reader = backend.MmapStorage(str(tmp_path / "db.ring"), polling_interval_sec=300)
+        rrd = backend.Rrd(dbname="default")
+        assert reader.last_update(rrd) == hour
+        assert reader.list_databases() == ["default", "default__rf"]
+        assert reader.read_points(rrd, 300, hour - 900, hour - 300) == [
+            (hour - 600, 1.0, 2.0),
+            (hour - 300, 0.0, 2.0),
+            (hour, 1.0, 2.0),
+        ]
+        assert reader.read_points(rrd, 3600, hour - 3600, hour) == [(hour, 0.5, 2.0), (hour + 3600, None, None)]
+        assert reader.read_points_many(["default__rf", "unknown"], 3600, hour - 3600, hour) == {
+            "default__rf": [(hour, None, None), (hour + 3600, None, None)],
+            "unknown": [(hour, None, None), (hour + 3600, None, None)],
+        }
+
+    def test_ring_wraps_around(self, tmp_path):
+        storage = backend.MmapStorage(str(tmp_path / "db.ring"), polling_interval_sec=300)
+        rrd = backend.Rrd.__new__(backend.Rrd)
+        rrd.dbname = "default"
+        now = backend.calendar.timegm(backend.time.gmtime())
+        now -= now % 300
+        capacity = storage.fine_capacity
+        storage.write(rrd, [(now - (capacity + 10) * 300, 9.0, 9.0)])
+        storage.write(rrd, [(now - ts * 300, 1.0, float(ts)) for ts in range(5, -1, -1)])
+        points = storage.read_points(rrd, 300, now - 3600, now)
+        # the stale cells of the wrapped ring read as unknown
+        assert [point[2] for point in points[-8:]] == [None, 5.0, 4.0, 3.0, 2.0, 1.0, 0.0, None]
+        assert all(point[1] is None for point in points[:-7])
+
+    def test_readers_do_not_allocate_slots(self, monkeypatch, tmp_path):
+        writer = backend.MmapStorage(str(tmp_path / "db.ring"), polling_interval_sec=300)
+        now = backend.calendar.timegm(backend.time.gmtime())
+        writer.write_many({"ns": [(now - now % 3600, 1.0, 1.0)]})
+        reader = backend.MmapStorage(writer.path, polling_interval_sec=300)
+        monkeypatch.setattr(backend, "TIME_SERIES_STORAGE", reader)
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        monkeypatch.setattr(backend, "HISTOGRAM_ANALYTICS_ENGINE", backend.HistogramAnalyticsEngine())
+        reader.list_databases()
+        slot_count = reader.slot_count
+        # the __rf twin of ns has never been written
+        backend.Rrd.periodic_usages("ns", backend.RrdPeriod.PERIOD_14_DAYS_SEC)
+        assert backend.Rrd(dbname="ns__rf").last_update() == 0
+        assert reader.slot_count == slot_count == 1
+        assert backend.MmapStorage(writer.path, polling_interval_sec=300).list_databases() == ["ns"]
+
+    def test_removed_slots_are_reused(self, tmp_path):
+        storage = backend.MmapStorage(str(tmp_path / "db.ring"), polling_interval_sec=300)
+        now = backend.calendar.timegm(backend.time.gmtime())
+        hour = now - now % 3600
+        storage.write_many({"ci-1": [(hour - 300, 4.0, 4.0), (hour, 4.0, 4.0)], "default": [(hour, 1.0, 1.0)]})
+        size = os.path.getsize(storage.path)
+        storage.remove("ci-1")
+        storage.write_many({"ci-2": [(hour, 2.0, 2.0)]})
+        assert os.path.getsize(storage.path) == size
+        assert storage.slot_count == 2
+        rrd = backend.Rrd.__new__(backend.Rrd)
+        rrd.dbname = "ci-2"
+        # nothing of the previous database is left in the reused slot
+        assert storage.last_update(rrd) == hour
+        assert storage.read_points(rrd, 300, hour - 600, hour) == [
+            (hour - 300, None, None),
+            (hour, 2.0, 2.0),
+            (hour + 300, None, None),
+        ]
+        assert storage.read_points(rrd, 3600, hour - 3600, hour) == [(hour, None, None), (hour + 3600, None, None)]
+
+        # a second mapping finds the tombstoned slots from the file
+        storage.remove("default")
+        reader = backend.MmapStorage(storage.path, polling_interval_sec=300)
+        assert reader.list_databases() == ["ci-2"]
+        assert reader.free_slots == [1]
+
+
+class TestDatabaseCatalog(object):
+    def test_catalog_is_maintained_by_writes(self, monkeypatch, tmp_path):
+        storage = backend.SqliteStorage(str(tmp_path / "db.sqlite"), polling_interval_sec=300)
+        storage.write_many({"default": [(1700000000, 1.0, 1.0)], "default__rf": [(1700000000, 1.0, 1.0)]})
+        monkeypatch.setattr(backend, "TIME_SERIES_STORAGE", storage)
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        catalog = backend.DatabaseCatalog()
+        monkeypatch.setattr(backend, "DATABASE_CATALOG", catalog)
+
+        # bootstrapped from the storage engine
+        assert catalog.last_updates() == {"default": 1700000000, "default__rf": 1700000000}
+        batch = backend.RrdWriteBatch()
+        batch.add_sample("default", 1700000300, 1.5, 2.25)
+        batch.add_sample("ml__gpu", 1700000300, 1.0, 1.0)
+        batch.add_sample("non-allocatable", 1700000300, 1.0, 1.0)
+        batch.add_sample(".billing-hourly-rate", 1700000300, 1.0, 1.0)
+        batch.flush()
+
+        reloaded = backend.DatabaseCatalog()
+        assert reloaded.databases(backend.DatabaseCatalog.KIND_NAMESPACE) == ["default"]
+        assert reloaded.databases(backend.DatabaseCatalog.KIND_EFFICIENCY) == ["default__rf"]
+        assert reloaded.databases(backend.DatabaseCatalog.KIND_GPU) == ["ml__gpu"]
+        assert reloaded.databases(
+            backend.DatabaseCatalog.KIND_NON_ALLOCATABLE, backend.DatabaseCatalog.KIND_BILLING
+        ) == [".billing-hourly-rate", "non-allocatable"]
+        assert reloaded.entries["ml__gpu"]["namespace"] == "ml"
+        assert reloaded.last_updates()["default"] == 1700000300
+        assert reloaded.last_updates()["default__rf"] == 1700000000
+
+    def test_unchanged_trends_are_reused(self, monkeypatch, tmp_path):
+        storage = backend.SqliteStorage(str(tmp_path / "db.sqlite"), polling_interval_sec=300)
+        monkeypatch.setattr(backend, "TIME_SERIES_STORAGE", storage)
+        monkeypatch.setattr(backend, "TREND_PARTIALS", {})
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        now = backend.calendar.timegm(backend.time.gmtime())
+        now -= now % 3600
+        storage.write_many({ns: [(now - i * 300, 1.0, 2.0) for i in range(11, -1, -1)] for ns in ("a", "b")})
+        last_updates = {"a": now, "b": now}
+        first = backend.compute_analytics_partials(["a", "b"], [], [], now + 60, last_updates)
+        reads = []
+        monkeypatch.setattr(storage, "read_points_many", lambda dbnames, *args: reads.append(dbnames) or {})
+        monkeypatch.setattr(backend.HISTOGRAM_ANALYTICS_ENGINE, "planned_ranges", lambda *args: [])
+        monkeypatch.setattr(backend.Rrd, "periodic_usages", staticmethod(lambda db, period: ((), ())))
+        second = backend.compute_analytics_partials(["a", "b"], [], [], now + 120, last_updates)
+        assert reads == []
+        assert second["trends"] == first["trends"]
+        assert second["series"] == first["series"]
+
+
+class TestDatabaseLifecycleManager(object):
+    def test_inactive_namespaces_are_archived(self, monkeypatch, tmp_path):
+        storage = backend.SqliteStorage(str(tmp_path / "db.sqlite"), polling_interval_sec=300)
+        monkeypatch.setattr(backend, "TIME_SERIES_STORAGE", storage)
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path / "db"))
+        monkeypatch.setattr(backend, "DATABASE_CATALOG", backend.DatabaseCatalog())
+        manager = backend.DatabaseLifecycleManager(grace_sec=30 * 86400, archive_location=str(tmp_path / "archive"))
+        now = backend.calendar.timegm(backend.time.gmtime())
+        now -= now % 3600
+        old = now - 60 * 86400
+        batch = backend.RrdWriteBatch()
+        for i in range(12):
+            for dbname in ("ci-1234", "ci-1234__rf"):
+                batch.add_sample(dbname, old - 3300 + i * 300, 2.0, 4.0)
+            batch.add_sample("default", now - 3300 + i * 300, 1.0, 1.0)
+        batch.flush()
+
+        assert manager.run(now) == 2
+        assert manager.run(now) == 0
+        assert storage.list_databases() == ["default"]
+        catalog = backend.DATABASE_CATALOG
+        assert catalog.databases(backend.DatabaseCatalog.KIND_NAMESPACE) == ["default"]
+        assert catalog.archived_databases(backend.DatabaseCatalog.KIND_NAMESPACE) == ["ci-1234"]
+        assert manager.load_points("ci-1234") == [(old, 2.0, 4.0)]
+
+        # archives only count in the periods they overlap
+        assert manager.periodic_usages(["ci-1234"], backend.RrdPeriod.PERIOD_14_DAYS_SEC, now) == {}
+        usage, rf = manager.periodic_usages(["ci-1234"], backend.RrdPeriod.PERIOD_YEAR_SEC, now)["ci-1234"]
+        month = backend.Rrd.get_date_group(backend.time.gmtime(old), backend.RrdPeriod.PERIOD_YEAR_SEC)
+        assert usage == ({month: 2.0}, {month: 4.0})
+        assert rf == usage
+
+        manager.last_run = 0
+        # a year later, default is inactive too and ci-1234 no longer overlaps any period
+        manager.run(old + 400 * 86400)
+        assert catalog.archived_databases(backend.DatabaseCatalog.KIND_NAMESPACE) == ["default"]
+        assert "ci-1234" not in catalog.entries
+        assert not (tmp_path / "archive" / "ci-1234.json.gz").exists()
+
+    def test_recreated_namespace_is_merged_into_its_archive(self, monkeypatch, tmp_path):
+        storage = backend.SqliteStorage(str(tmp_path / "db.sqlite"), polling_interval_sec=300)
+        monkeypatch.setattr(backend, "TIME_SERIES_STORAGE", storage)
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path / "db"))
+        monkeypatch.setattr(backend, "DATABASE_CATALOG", backend.DatabaseCatalog())
+        monkeypatch.setattr(backend, "DATABASE_EPOCHS", {})
+        forgotten = []
+        monkeypatch.setattr(backend.HISTOGRAM_ANALYTICS_ENGINE, "forget", forgotten.append)
+        manager = backend.DatabaseLifecycleManager(grace_sec=30 * 86400, archive_location=str(tmp_path / "archive"))
+        catalog = backend.DATABASE_CATALOG
+        now = backend.calendar.timegm(backend.time.gmtime())
+        now -= now % 3600
+        old, later = now - 90 * 86400, now - 3 * 86400
+
+        def write(hour, cpu, mem):
+            batch = backend.RrdWriteBatch()
+            for i in range(12):
+                batch.add_sample("ci-1", hour - 3300 + i * 300, cpu, mem)
+            batch.flush()
+
+        write(old, 2.0, 4.0)
+        backend.compute_analytics_partials(["ci-1"], [], [], old, epochs=catalog.epochs())
+        manager.run(old + 31 * 86400)
+        archived_epoch = catalog.entries["ci-1"]["archived"]
+        assert "ci-1" not in catalog.epochs()
+
+        # the namespace comes back: workers drop what they cached on its previous content
+        write(later, 1.0, 1.0)
+        assert catalog.epochs() == {"ci-1": archived_epoch}
+        forgotten.clear()
+        backend.compute_analytics_partials(["ci-1"], [], [], later, epochs=catalog.epochs())
+        assert forgotten == [backend.Rrd.get_location("ci-1")]
+
+        manager.last_run = 0
+        manager.run(later + 31 * 86400)
+        points = manager.load_points("ci-1")
+        assert len(points) == (later - old) // 3600 + 1
+        assert points[0] == (old, 2.0, 4.0) and points[-1] == (later, 1.0, 1.0)
+        assert catalog.entries["ci-1"]["archive"] == {"start": old, "end": later}
+
+    def test_merge_periodic_usages(self):
+        live = (({"Jan": 1.0}, {"Jan": 2.0}), ({"Jan": 0.5}, {}))
+        archived = (({"Jan": 1.0, "Feb": 3.0}, {}), ({}, {"Feb": 1.0}))
+        assert backend.merge_periodic_usages(None, archived) == archived
+        assert backend.merge_periodic_usages(live, archived) == (
+            ({"Jan": 2.0, "Feb": 3.0}, {"Jan": 2.0}),
+            ({"Jan": 0.5}, {"Feb": 1.0}),
+        )
+
+
+class TestBackfill(object):
+    def test_parse_csv_and_prometheus_exports(self):
+        csv_lines = [
+            "timestamp,namespace,cpu_usage,mem_usage,cpu_request,mem_request,cpu_capacity,mem_capacity",
+            "1700000000,,,,,,8,1000",
+            "1700000000,default,2,250,4,,,",
+        ]
+        document = {
+            "cpu_usage": {"data": {"result": [{"metric": {"namespace": "default"}, "values": [[1700000000, "2"]]}]}},
+            "mem_usage": {"data": {"result": [{"metric": {"namespace": "default"}, "values": [[1700000000, "250"]]}]}},
+            "cpu_request": {"data": {"result": [{"metric": {"namespace": "default"}, "values": [[1700000000, "4"]]}]}},
+            "cpu_capacity": {"data": {"result": [{"metric": {}, "values": [[1700000000.0, "8"]]}]}},
+            "mem_capacity": {"data": {"result": [{"metric": {}, "values": [[1700000000.0, "1000"]]}]}},
+        }
+        expected = {
+            "default": [(1700000000 - 1700000000 % 300, 25.0, 25.0)],
+            "default__rf": [(1700000000 - 1700000000 % 300, 0.5, 1.0)],
+        }
+        for records in (backend.parse_backfill_csv(csv_lines), backend.parse_backfill_prometheus(document)):
+            units = list(backend.build_backfill_points(records, 300))
+            assert [{db: list(zip(*points)) for db, points in unit.items()} for unit in units] == [expected]
+
+        # rows are read one namespace at a time, which requires them sorted by namespace
+        try:
+            list(backend.parse_backfill_csv(csv_lines + ["1700000000,kube-system,1,1,,,,", csv_lines[2]]))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("unsorted rows not reported")
+
+    def test_hourly_points_are_upsampled(self, monkeypatch, tmp_path):
+        storage = backend.SqliteStorage(str(tmp_path / "db.sqlite"), polling_interval_sec=300)
+        monkeypatch.setattr(backend, "TIME_SERIES_STORAGE", storage)
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        monkeypatch.setattr(backend.KOA_CONFIG, "polling_interval_sec", 300)
+        monkeypatch.setattr(backend, "DATABASE_CATALOG", backend.DatabaseCatalog())
+        monkeypatch.setattr(backend, "STORAGE_LOCK", backend.StorageLock())
+        now = backend.calendar.timegm(backend.time.gmtime())
+        now -= now % 3600
+        points = [
+            {
+                "default": backend.compact_points(
+                    [(now - 3 * 3600, 1.0, 2.0), (now - 2 * 3600, 3.0, 4.0), (now, 5.0, 6.0)]
+                )
+            }
+        ]
+
+        assert backend.backfill(points, workers=4, chunk_size=5) == (1 + 12 + 1, 0)
+        assert backend.backfill(points, workers=4) == (0, 14)
+        rrd = backend.Rrd(dbname="default")
+        # each point fills the hour before it, except across gaps longer than an hour
+        assert rrd.read_points(3600, now - 3 * 3600, now - 3600) == [
+            (now - 2 * 3600, 3.0, 4.0),
+            (now - 3600, None, None),
+            (now, None, None),
+        ]
+        assert backend.DATABASE_CATALOG.last_updates() == {"default": now}
+
+    def test_backfill_refuses_to_run_alongside_the_backend(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        monkeypatch.setattr(backend, "DATABASE_CATALOG", backend.DatabaseCatalog())
+        monkeypatch.setattr(backend, "STORAGE_LOCK", backend.StorageLock())
+        # the lock file is opened again, as the running backend would
+        backend_lock = backend.StorageLock()
+        assert backend_lock.acquire(blocking=False)
+        try:
+            backend.backfill([])
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("backfill ran while the storage was locked")
+        finally:
+            backend_lock.release()
+        assert backend.backfill([]) == (0, 0)
+        backend.STORAGE_LOCK.release()
+
+
+class TestSampleCommitEvents(object):
+    def test_wait_for_committed_batches(self, monkeypatch, tmp_path):
+        events = backend.SampleCommitEvents()
+        monkeypatch.setattr(backend, "SAMPLE_COMMIT_EVENTS", events)
+        assert events.wait(timeout=0) == 0
+
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_location", str(tmp_path))
+        monkeypatch.setattr(backend.Rrd, "create_rrd_file_if_not_exists", lambda self: None)
+        batch = backend.RrdWriteBatch(writer=lambda *args: None)
+        batch.add_sample("default", 1700000000, 1.5, 2.25)
+        batch.flush()
+        backend.RrdWriteBatch(writer=lambda *args: None).flush()
+        events.publish()
+        assert events.wait(timeout=0) == 2
+        assert events.commit_count == 2
+        assert events.wait(timeout=0) == 0
+
+
+class TestRrdSampleWriter(object):
+    def test_pending_batches_are_flushed_on_stop(self):
+        flushed = []
+
+        class FakeBatch(object):
+            def __init__(self, name):
+                self.name = name
+
+            def flush(self):
+                flushed.append(self.name)
+
+        writer = backend.RrdSampleWriter(max_pending=2)
+        writer.submit(FakeBatch("cycle-1"))
+        writer.submit(FakeBatch("cycle-2"))
+        writer.start()
+        writer.stop(timeout=5)
+        assert flushed == ["cycle-1", "cycle-2"]
+        assert writer.thread is None
+
+    def test_stop_does_not_hang_on_a_full_queue(self):
+        release = backend.threading.Event()
+        flushed = []
+
+        class SlowBatch(object):
+            def __init__(self, name):
+                self.name = name
+
+            def flush(self):
+                release.wait(5)
+                flushed.append(self.name)
+
+        writer = backend.RrdSampleWriter(max_pending=1)
+        writer.start()
+        writer.submit(SlowBatch("cycle-1"))
+        while writer.queue.qsize():
+            backend.time.sleep(0.01)
+        writer.submit(SlowBatch("cycle-2"))
+        started = backend.time.monotonic()
+        writer.stop(timeout=0.2)
+        assert backend.time.monotonic() - started < 2
+        release.set()
+        backend.time.sleep(0.2)
+        assert flushed == ["cycle-1"]
+
+
+class TestPeriodicScheduler(object):
+    def test_ticks_are_aligned_and_missed_ticks_skipped(self):
+        clock = {"now": 1000.0}
+        sleeps = []
+
+        def fake_sleep(duration):
+            sleeps.append(duration)
+            clock["now"] += duration
+
+        scheduler = backend.PeriodicScheduler("test", 300, clock=lambda: clock["now"], sleep=fake_sleep)
+        assert scheduler.wait_next_tick() == 1000.0
+        clock["now"] += 20
+        assert scheduler.wait_next_tick() == 1200
+        assert sleeps == [180]
+        # the run overran past the next two ticks: one late run on the last boundary, one tick skipped
+        clock["now"] = 1850.0
+        assert scheduler.wait_next_tick() == 1800.0
+        assert scheduler.missed_ticks == 1
+        clock["now"] = 1860.0
+        assert scheduler.wait_next_tick() == 2100
+
+
+class TestDecodeCdps(object):
+    def test_decode_columns_and_mask_unknown_rows(self, monkeypatch):
+        monkeypatch.setattr(backend.KOA_CONFIG, "db_round_decimals", 2)
+        rows = [(0.123456, 0.5), (None, 0.25), (0.75, float("nan")), (1.0, 2.0)]
+        assert backend.Rrd.decode_cdps(3600, 3600, rows) == [
+            (7200, 0.1235, 0.5),
+            (10800, None, None),
+            (14400, None, None),
+            (18000, 1.0, 2.0),
+        ]
+        assert backend.Rrd.decode_cdps(3600, 3600, []) == []
+
+
+class FakeHourlyRrd(object):
+    """In-memory stand-in for Rrd serving one point per hour up to last_update."""
+
+    def __init__(self, last_update):
+        self.rrd_location = "fake-rrd"
+        self.updated_at = last_update
+        self.fetches = []
+
+    def last_update(self):
+        return self.updated_at
+
+    def fetch_points(self, step, start, end):
+        self.fetches.append((start, end))
+        points = []
+        ts = start - start % step
+        while ts <= end:
+            ts += step
+            if ts <= self.updated_at:
+                points.append((ts, (ts // step) % 7 + 0.25, (ts // step) % 5 + 0.5))
+            else:
+                points.append((ts, None, None))
+        return points
+
+
+class TestHistogramAnalyticsEngine(object):
+    def full_periodic_usage(self, rrd, period, now):
+        points = rrd.fetch_points(3600, now - int(period), now)
+        return backend.Rrd.buckets_to_periodic_usage(backend.Rrd.aggregate_buckets(points, period), period)
+
+    def test_incremental_results_match_full_recomputation(self):
+        engine = backend.HistogramAnalyticsEngine()
+        # Nov 29th 2023 23:20 UTC, so that cycles cross day and month boundaries
+        now = 1701300000
+        for period in [backend.RrdPeriod.PERIOD_14_DAYS_SEC, backend.RrdPeriod.PERIOD_YEAR_SEC]:
+            rrd = FakeHourlyRrd(last_update=now)
+            for cycle in range(60):
+                current = now + cycle * 1700
+                rrd.updated_at = current - 300 if cycle % 3 else rrd.updated_at
+                expected = self.full_periodic_usage(rrd, period, current)
+                rrd.fetches = []
+                assert engine.periodic_usage(rrd, period, now=current) == expected
+                if cycle > 0:
+                    # only the oldest bucket and the recently updated buckets are read again
+                    assert all(end - start <= 32 * 86400 for start, end in rrd.fetches)
+
+
+class PlannedFakeRrd(FakeHourlyRrd):
+    """FakeHourlyRrd whose reads go through a fetch planner."""
+
+    def __init__(self, last_update, planner):
+        super().__init__(last_update)
+        self.planner = planner
+        self.reads = []
+
+    def read_points(self, step, start, end):
+        self.reads.append((step, start, end))
+        return FakeHourlyRrd.fetch_points(self, step, start, end)
+
+    def fetch_points(self, step, start, end):
+        return self.planner.fetch_points(self, step, start, end)
+
+
+class TestRrdFetchPlanner(object):
+    def test_planned_reads_share_fetches(self):
+        now = 1701300000
+        periods = [backend.RrdPeriod.PERIOD_14_DAYS_SEC, backend.RrdPeriod.PERIOD_YEAR_SEC]
+        reference_engine = backend.HistogramAnalyticsEngine()
+        engine = backend.HistogramAnalyticsEngine()
+        planner = backend.RrdFetchPlanner()
+        reference = FakeHourlyRrd(last_update=now)
+        rrd = PlannedFakeRrd(last_update=now, planner=planner)
+        for cycle in range(3):
+            current = now + cycle * 1700
+            reference.updated_at = rrd.updated_at = current - 300
+            planner.begin_cycle(current)
+            planner.plan(rrd.rrd_location, 3600, current - backend.RrdPeriod.PERIOD_7_DAYS_SEC, current)
+            for period in periods:
+                for step, start, end in engine.planned_ranges(rrd.rrd_location, period, current):
+                    planner.plan(rrd.rrd_location, step, start, end)
+            rrd.reads = []
+
+            trend_start = current - backend.RrdPeriod.PERIOD_7_DAYS_SEC
+            assert rrd.fetch_points(3600, trend_start, current) == reference.fetch_points(3600, trend_start, current)
+            for period in periods:
+                expected = reference_engine.periodic_usage(reference, period, now=current)
+                assert engine.periodic_usage(rrd, period, now=current) == expected
+            # the yearly edge bucket is too far back to be merged with the other ranges
+            assert len(rrd.reads) <= 2
+            assert planner.end_cycle() == len(rrd.reads)
+
+    def test_released_files_drop_their_points(self):
+        now = 1701300000
+        planner = backend.RrdFetchPlanner()
+        rrd = PlannedFakeRrd(last_update=now, planner=planner)
+        planner.begin_cycle(now)
+        planner.plan(rrd.rrd_location, 3600, now - 86400, now)
+        assert rrd.fetch_points(3600, now - 7200, now) == FakeHourlyRrd.fetch_points(rrd, 3600, now - 7200, now)
+        assert rrd.reads == [(3600, now - 86400, now)]
+        planner.release([rrd.rrd_location])
+        assert planner.fetched == {} and rrd.rrd_location not in {key[0] for key in planner.plans}
+        rrd.fetch_points(3600, now - 7200, now)
+        assert rrd.reads[-1] == (3600, now - 7200, now)
+        assert planner.end_cycle() == 2
+
+    def test_reads_outside_cycle_are_not_cached(self):
+        planner = backend.RrdFetchPlanner()
+        rrd = PlannedFakeRrd(last_update=1701300000, planner=planner)
+        rrd.fetch_points(3600, 1701200000, 1701300000)
+        rrd.fetch_points(3600, 1701200000, 1701300000)
+        assert len(rrd.reads) == 2
+
+
+class TestAnalyticsWorkerPool(object):
+    def test_namespace_and_rf_databases_share_a_shard(self):
+        pool = backend.AnalyticsWorkerPool(worker_count=4)
+        for ns in ["default", "kube-system", "ml-team", "team-%d" % 42]:
+            assert pool.shard_of(ns) == pool.shard_of(backend.KOA_CONFIG.usage_efficiency_db(ns))
+            assert 0 <= pool.shard_of(ns) < 4
+
+    def test_merge_partials(self):
+        period = int(backend.RrdPeriod.PERIOD_14_DAYS_SEC)
+        partials_list = [
+            {
+                "trends": {"ns1": ("c1", "m1")},
+                "hourly": {"ns1": (0.5, 1.0)},
+                "series": {"ns1": (3600, [(7200, 0.5, 1.0)])},
+                "histograms": {period: {"ns1": (({"01 Dec": 1.0}, {}), ({}, {}))}},
+                "fetches": 3,
+            },
+            {
+                "trends": {"ns2": ("c2", "m2")},
+                "hourly": {},
+                "series": {"ns2": (3600, [])},
+                "histograms": {period: {"ns2": (({"01 Dec": 2.0}, {}), ({}, {}))}},
+                "fetches": 2,
+            },
+        ]
+        merged = backend.merge_analytics_partials(partials_list)
+        assert merged["trends"] == {"ns1": ("c1", "m1"), "ns2": ("c2", "m2")}
+        assert merged["hourly"] == {"ns1": (0.5, 1.0)}
+        assert sorted(merged["histograms"][backend.RrdPeriod.PERIOD_14_DAYS_SEC]) == ["ns1", "ns2"]
+        assert merged["fetches"] == 5
+
+
+class TestDatasetFiles(object):
+    def test_write_atomically_with_gzip_sibling(self, tmp_path):
+        path = str(tmp_path / "nodes.json")
+        backend.write_dataset_file(path, '{"node-1": {}}')
+        backend.write_dataset_file(path, '{"node-2": {}}')
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["nodes.json", "nodes.json.gz"]
+        with open(path) as fd:
+            assert fd.read() == '{"node-2": {}}'
+        with gzip.open(path + ".gz", "rt") as fd:
+            assert fd.read() == '{"node-2": {}}'
+
+    def test_unchanged_content_is_not_rewritten(self, tmp_path):
+        path = str(tmp_path / "cpu_usage_trends.json")
+        assert backend.write_dataset_file(path, "[1]")
+        mtime_ns = os.stat(path).st_mtime_ns
+        assert not backend.write_dataset_file(path, "[1]")
+        assert os.stat(path).st_mtime_ns == mtime_ns
+        assert backend.write_dataset_file(path, "[2]")
+
+    def test_serve_precompressed_with_etag(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(backend.KOA_CONFIG, "frontend_data_location", str(tmp_path))
+        backend.write_dataset_file(str(tmp_path / "cpu_usage_trends.json"), "[]" * 1000)
+        client = backend.app.test_client()
+        for url in ["/dataset/cpu_usage_trends.json", "/static/data/cpu_usage_trends.json"]:
+            response = client.get(url, headers={"Accept-Encoding": "gzip"})
+            assert response.status_code == 200
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert gzip.decompress(response.data) == b"[]" * 1000
+            etag = response.headers["ETag"]
+
+            response = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+            assert response.status_code == 304
+
+            response = client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 200
+            assert "Content-Encoding" not in response.headers
+            assert response.data == b"[]" * 1000
+
+        assert client.get("/dataset/missing.json").status_code == 404
+        assert client.get("/dataset/../backend.py").status_code == 404
+
+
+class TestUsageQueryCache(object):
+    def test_evict_least_recently_used_series(self):
+        cache = backend.UsageQueryCache(max_points=4)
+        cache.update({"ns1": (3600, [(3600, 0.1, 0.2), (7200, 0.1, 0.2)])})
+        cache.update({"ns2": (3600, [(3600, 0.3, 0.4), (7200, 0.3, 0.4)])})
+        assert cache.get("ns1") is not None
+        cache.update({"ns3": (3600, [(3600, 0.5, 0.6)])})
+        assert cache.get("ns2") is None
+        assert cache.dbnames() == ["ns1", "ns3"]
+        assert cache.point_count == 3
+
+    def test_query_time_range_and_step(self, monkeypatch):
+        cache = backend.UsageQueryCache()
+        points = [(ts, ts / 36000.0, 1.0) for ts in range(3600, 8 * 3600 + 1, 3600)]
+        cache.update({"ns1": (3600, points), "ns1__rf": (3600, points), "ns2": (3600, points)})
+        monkeypatch.setattr(backend, "USAGE_QUERY_CACHE", cache)
+        client = backend.app.test_client()
+
+        response = client.get("/api/v2/usage?namespace=ns1&resource=cpu&from=7200&to=21600&step=7200").get_json()
+        assert [(item["dateUTC"], item["usage"]) for item in response["data"]] == [
+            ("1970-01-01T04:00:00Z", 0.35),
+            ("1970-01-01T06:00:00Z", 0.55),
+        ]
+        response = client.get("/api/v2/usage?category=rf&from=0&to=3600").get_json()
+        assert [item["name"] for item in response["data"]] == ["ns1"]
+        assert client.get("/api/v2/usage?resource=disk").status_code == 400
+
+
+class TestDownsampleLttb(object):
+    def test_keep_bounds_and_peak(self):
+        xs = list(range(0, 2016 * 300, 300))
+        ys = [(i % 288) / 288.0 for i in range(len(xs))]
+        ys[1001] = 5.0
+        indices = list(backend.downsample_lttb(xs, ys, 100))
+        assert len(indices) == 100
+        assert indices[0] == 0 and indices[-1] == len(xs) - 1
+        assert indices == sorted(set(indices))
+        assert 1001 in indices
+
+    def test_short_series_or_disabled_budget_are_unchanged(self):
+        assert list(backend.downsample_lttb([1, 2, 3], [1.0, 2.0, 3.0], 10)) == [0, 1, 2]
+        assert list(backend.downsample_lttb([1, 2, 3], [1.0, 2.0, 3.0], 0)) == [0, 1, 2]
+
+    def test_render_downsampled_trend(self):
+        points = [(3600 * (i + 1), i / 168.0, 1.0) for i in range(168)]
+        cpu_trend, mem_trend, _ = backend.Rrd.render_trend("ns1", points, max_points=24)
+        assert len(json.loads("[" + cpu_trend + "]")) == 24
+        assert len(json.loads("[" + mem_trend + "]")) == 24
+
+
+class TestAnalyticsMetricsCollector(object):
+    def scrape(self, collector):
+        return {
+            (family.name, sample.labels["namespace"], sample.labels["resource"]): sample.value
+            for family in collector.collect()
+            for sample in family.samples
+        }
+
+    def test_snapshot_replaces_stale_series(self):
+        collector = backend.AnalyticsMetricsCollector(top_n=0)
+        collector.publish({"koa_namespace_hourly_usage": {("ns1", "CPU"): 0.5, ("ns2", "CPU"): 0.25}})
+        assert self.scrape(collector) == {
+            ("koa_namespace_hourly_usage", "ns1", "CPU"): 0.5,
+            ("koa_namespace_hourly_usage", "ns2", "CPU"): 0.25,
+        }
+        collector.publish({"koa_namespace_hourly_usage": {("ns2", "CPU"): 0.75}})
+        assert self.scrape(collector) == {("koa_namespace_hourly_usage", "ns2", "CPU"): 0.75}
+
+    def test_top_n_per_metric_and_resource(self):
+        collector = backend.AnalyticsMetricsCollector(top_n=2)
+        collector.publish(
+            {
+                "koa_namespace_daily_usage": {
+                    ("ns1", "CPU"): 1.0,
+                    ("ns2", "CPU"): 3.0,
+                    ("ns3", "CPU"): 2.0,
+                    ("ns1", "MEMORY"): 5.0,
+                }
+            }
+        )
+        assert sorted(self.scrape(collector)) == [
+            ("koa_namespace_daily_usage", "ns1", "MEMORY"),
+            ("koa_namespace_daily_usage", "ns2", "CPU"),
+            ("koa_namespace_daily_usage", "ns3", "CPU"),
+        ]
+
+    def test_registered_in_default_registry(self):
+        assert b"# TYPE koa_namespace_monthly_requests gauge" in backend.prometheus_client.generate_latest()
+
+
+class TestNodeHeatmapCache(object):
+    def make_node(self, name, cpu_usage):
+        node = backend.Node()
+        node.name = name
+        node.state = "Ready"
+        node.cpuCapacity = 8.0
+        node.cpuAllocatable = 4.0
+        node.cpuUsage = cpu_usage
+        node.memAllocatable = 1024.0
+        node.memUsage = 256.0
+        return node
+
+    def test_conditional_heatmap_responses(self, monkeypatch):
+        cache = backend.NodeHeatmapCache()
+        monkeypatch.setattr(backend, "NODE_HEATMAP_CACHE", cache)
+        assert cache.update({"node-1": self.make_node("node-1", 1.0)})
+        assert not cache.update({"node-1": self.make_node("node-1", 1.0)})
+
+        client = backend.app.test_client()
+        response = client.get("/api/nodes/heatmap", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        heatmap = json.loads(gzip.decompress(response.data))
+        assert heatmap["total_nodes"] == 1
+        assert heatmap["nodes"][0]["cpuUsagePercent"] == 25.0
+        assert heatmap["nodes"][0]["memoryUsagePercent"] == 25.0
+
+        etag = response.headers["ETag"]
+        response = client.get("/api/nodes/heatmap", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert response.status_code == 304
+
+        assert cache.update({"node-1": self.make_node("node-1", 2.0)})
+        response = client.get("/api/nodes/heatmap", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert response.status_code == 200
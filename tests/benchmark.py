@@ -0,0 +1,456 @@
+#!/usr/bin/env python
+"""Microbenchmarks of the backend hot paths.
+
+usage: python tests/benchmark.py <benchmark> [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend  # noqa: E402
+
+
+def report(name, durations, unit_count, unit_label):
+    best = min(durations)
+    print("%-40s best=%8.2f ms  per %s=%8.3f us" % (name, best * 1e3, unit_label, best * 1e6 / unit_count))
+    return best
+
+
+def make_dcgm_exposition(gpu_count=8, field_count=60):
+    """Generate a DCGM exporter payload with gpu_count GPUs and field_count metric families."""
+    fields = list(backend.DCGM_METRIC_MAPPING.keys())
+    fields += ["DCGM_FI_PROF_FIELD_%d" % i for i in range(field_count - len(fields))]
+    lines = []
+    for field in fields:
+        lines.append("# HELP %s Synthetic DCGM field." % field)
+        lines.append("# TYPE %s gauge" % field)
+        for gpu in range(gpu_count):
+            lines.append(
+                '%s{gpu="%d",UUID="GPU-%08d-4ee8-d541-2f8e-79ad914cbb44",device="nvidia%d",modelName="NVIDIA L4",'
+                'Hostname="dcgm-exporter-5pbdc",DCGM_FI_DRIVER_VERSION="535.261.03",container="cuda",'
+                'namespace="ml-team",pod="train-%d"} %d' % (field, gpu, gpu, gpu, gpu, gpu * 10)
+            )
+    return "\n".join(lines)
+
+
+def legacy_jsonify_dcgm_metrics(data):
+    """Parse a DCGM exposition the way the backend did before parse_dcgm_metrics was introduced."""
+    metrics = {}
+    for line in data.split("\n"):
+        if line.startswith("DCGM_"):
+            if "{" in line:
+                name = line.split("{")[0]
+                labels_str = line.split("{")[1].split("}")[0]
+                value = line.split("}")[1].strip()
+            else:
+                parts = line.split()
+                name = parts[0]
+                labels_str = ""
+                value = parts[1] if len(parts) > 1 else None
+
+            labels = {}
+            if labels_str:
+                for label in labels_str.split(","):
+                    if "=" in label:
+                        k, v = label.split("=", 1)
+                        labels[k] = v.strip('"')
+
+            if name not in metrics:
+                metrics[name] = []
+            metrics[name].append({"labels": labels, "value": float(value)})
+
+    return metrics
+
+
+def bench_dcgm(args):
+    data = make_dcgm_exposition()
+    line_count = data.count("\n") + 1
+    print("DCGM payload: %d lines, %d bytes" % (line_count, len(data)))
+    legacy = report(
+        "legacy jsonify_dcgm_metrics (full parse)",
+        timeit.repeat(lambda: legacy_jsonify_dcgm_metrics(data), number=1, repeat=args.repeat),
+        line_count,
+        "line",
+    )
+    streaming = report(
+        "parse_dcgm_metrics (pre-filtered)",
+        timeit.repeat(
+            lambda: backend.parse_dcgm_metrics(data.split("\n"), backend.DCGM_METRIC_MAPPING),
+            number=1,
+            repeat=args.repeat,
+        ),
+        line_count,
+        "line",
+    )
+    print("speedup: x%.1f" % (legacy / streaming))
+
+
+LEGACY_CAPACITY_QUANTITIES = {
+    "Ki": 1024,
+    "Mi": 1048576,
+    "Gi": 1073741824,
+    "Ti": 1099511627776,
+    "Pi": 1125899906842624,
+    "Ei": 1152921504606847000,
+    "k": 1e3,
+    "K": 1e3,
+    "M": 1e6,
+    "G": 1e9,
+    "T": 1e12,
+    "P": 1e15,
+    "E": 1e18,
+    "m": 1e-3,
+    "u": 1e-6,
+    "n": 1e-9,
+    "None": 1,
+}
+
+
+def legacy_decode_capacity(cap_input):
+    """Decode a quantity the way K8sUsage.decode_capacity did before decode_quantity was introduced."""
+    data_length = len(cap_input)
+    cap_unit = "None"
+    cap_value = cap_input
+    if cap_input.endswith(("Ki", "Mi", "Gi", "Ti", "Pi", "Ei")):
+        cap_unit = cap_input[data_length - 2 :]
+        cap_value = cap_input[0 : data_length - 2]
+    elif cap_input.endswith(("n", "u", "m", "k", "K", "M", "G", "T", "P", "E")):
+        cap_unit = cap_input[data_length - 1 :]
+        cap_value = cap_input[0 : data_length - 1]
+    backend.KOA_LOGGER.debug(cap_value)
+    return LEGACY_CAPACITY_QUANTITIES[cap_unit] * float(cap_value)
+
+
+def make_pod_quantities(pod_count=50000, containers_per_pod=2):
+    """Generate the requests and usage quantities decoded for each container of pod_count pods."""
+    cpu_requests = ["50m", "100m", "250m", "500m", "1", "2"]
+    mem_requests = ["64Mi", "128Mi", "256Mi", "512Mi", "1Gi", "2Gi"]
+    pods = []
+    for i in range(pod_count):
+        containers = []
+        for c in range(containers_per_pod):
+            containers.append(
+                (
+                    cpu_requests[(i + c) % len(cpu_requests)],
+                    mem_requests[(i + c) % len(mem_requests)],
+                    "%dn" % (1000000 + (i * 7919 + c) % 250000000),
+                    "%dKi" % (20000 + (i * 104729 + c) % 2000000),
+                )
+            )
+        pods.append(containers)
+    return pods
+
+
+def bench_quantity(args):
+    pods = make_pod_quantities()
+
+    def decode_all(decode):
+        for containers in pods:
+            for cpu_request, mem_request, cpu_usage, mem_usage in containers:
+                decode(cpu_request)
+                decode(mem_request)
+                decode(cpu_usage)
+                decode(mem_usage)
+
+    print("synthetic pod list: %d pods, %d containers per pod" % (len(pods), len(pods[0])))
+    legacy = report(
+        "legacy decode_capacity",
+        timeit.repeat(lambda: decode_all(legacy_decode_capacity), number=1, repeat=args.repeat),
+        len(pods),
+        "pod",
+    )
+    backend.decode_quantity.cache_clear()
+    memoized = report(
+        "decode_quantity (memoized)",
+        timeit.repeat(lambda: decode_all(backend.decode_quantity), number=1, repeat=args.repeat),
+        len(pods),
+        "pod",
+    )
+    print("speedup: x%.1f (%s)" % (legacy / memoized, backend.decode_quantity.cache_info()))
+
+
+class DictPod:
+    """Pod record backed by a per-instance __dict__, as before Pod declared __slots__."""
+
+    def __init__(self):
+        for attr in backend.Pod.__slots__:
+            setattr(self, attr, None)
+
+
+def make_pod_items(pod_count=50000, namespace_count=3000, node_count=1000):
+    """Generate pod items as returned by /api/v1/pods for pod_count pods."""
+    items = []
+    for i in range(pod_count):
+        items.append(
+            {
+                "metadata": {"name": "app-%d" % i, "namespace": "ns-%d" % (i % namespace_count), "uid": "uid-%d" % i},
+                "status": {"phase": "Running", "conditions": [{"type": "Ready", "status": "True"}]},
+                "spec": {
+                    "nodeName": "node-%d" % (i % node_count),
+                    "containers": [{"resources": {"requests": {"cpu": "100m", "memory": "128Mi"}}}],
+                },
+            }
+        )
+    return items
+
+
+def measure_allocations(func):
+    tracemalloc.start()
+    result = func()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, allocated
+
+
+def bench_memory(args):
+    items = make_pod_items()
+    pod_count = len(items)
+
+    def build_records(record_class):
+        records = {}
+        for item in items:
+            record = record_class()
+            record.name = "%s.%s" % (item["metadata"]["name"], item["metadata"]["namespace"])
+            record.namespace = sys.intern(item["metadata"]["namespace"])
+            record.nodeName = sys.intern(item["spec"]["nodeName"])
+            record.cpuUsage = record.memUsage = record.cpuRequest = record.memRequest = 0.0
+            records[record.name] = record
+        return records
+
+    _, dict_bytes = measure_allocations(lambda: build_records(DictPod))
+    _, slots_bytes = measure_allocations(lambda: build_records(backend.Pod))
+    print("%-40s %8.1f MB  (%d bytes per pod)" % ("pods with __dict__", dict_bytes / 1e6, dict_bytes / pod_count))
+    print("%-40s %8.1f MB  (%d bytes per pod)" % ("pods with __slots__", slots_bytes / 1e6, slots_bytes / pod_count))
+
+    def consolidate():
+        k8s_usage = backend.K8sUsage()
+        k8s_usage.extract_namespace_items({"metadata": {"name": "ns-%d" % i}} for i in range(3000))
+        k8s_usage.extract_node_items({"metadata": {"name": "node-%d" % i, "uid": str(i)}} for i in range(1000))
+        k8s_usage.extract_pod_items(items)
+        k8s_usage.consolidate_ns_usage()
+        k8s_usage.calculate_node_usage()
+        return k8s_usage
+
+    report(
+        "extract + consolidate + node usage",
+        timeit.repeat(consolidate, number=1, repeat=args.repeat),
+        pod_count,
+        "pod",
+    )
+
+
+def make_fetch_rows(row_count=8880, unknown_ratio=0.1):
+    """Generate rrdtool fetch rows of (cpu, mem) values, with some unknown values."""
+    rows = []
+    for i in range(row_count):
+        cpu = None if i % int(1 / unknown_ratio) == 0 else (i % 97) / 97.0
+        rows.append((cpu, (i % 89) / 89.0))
+    return rows
+
+
+def legacy_decode_and_format(dbname, start, step, rows):
+    """Decode fetch rows and render trend items the way dump_trend_data did row by row."""
+    items = []
+    current_ts = start
+    for cdp in rows:
+        current_ts += step
+        if len(cdp) == 2:
+            try:
+                cpu = round(100 * float(cdp[0]), backend.KOA_CONFIG.db_round_decimals) / 100
+                datetime_utc_json = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(current_ts))
+                items.append('{"name":"%s","dateUTC":"%s","usage":%f}' % (dbname, datetime_utc_json, cpu))
+            except Exception:
+                pass
+    return items
+
+
+def columnar_decode_and_format(dbname, start, step, rows):
+    """Decode fetch rows with Rrd.decode_cdps and render trend items with shared timestamps."""
+    return [
+        '{"name":"%s","dateUTC":"%s","usage":%f}' % (dbname, backend.format_utc_timestamp(ts), cpu)
+        for ts, cpu, _ in backend.Rrd.decode_cdps(start, step, rows)
+        if cpu is not None
+    ]
+
+
+def bench_decode(args):
+    rows = make_fetch_rows(row_count=168)
+    namespaces = ["namespace-%d" % i for i in range(500)]
+    start = 1700000000 - 1700000000 % 3600
+
+    def decode_all(decode):
+        for dbname in namespaces:
+            decode(dbname, start, 3600, rows)
+
+    print("7-day trends: %d namespaces, %d hourly rows" % (len(namespaces), len(rows)))
+    legacy = report(
+        "row by row decode and format",
+        timeit.repeat(lambda: decode_all(legacy_decode_and_format), number=1, repeat=args.repeat),
+        len(namespaces),
+        "namespace",
+    )
+    backend.format_utc_timestamp.cache_clear()
+    columnar = report(
+        "columnar decode, shared timestamps",
+        timeit.repeat(lambda: decode_all(columnar_decode_and_format), number=1, repeat=args.repeat),
+        len(namespaces),
+        "namespace",
+    )
+    print("speedup: x%.1f (%s)" % (legacy / columnar, backend.format_utc_timestamp.cache_info()))
+
+
+def make_rrd_files(db_location, namespace_count, days=14):
+    """Create a namespace RRD file and its __rf twin per namespace, filled with days of samples."""
+    backend.KOA_CONFIG.db_location = db_location
+    step = backend.KOA_CONFIG.polling_interval_sec
+    end = int(time.time()) - int(time.time()) % step
+    namespaces = ["namespace-%d" % i for i in range(namespace_count)]
+    for i, ns in enumerate(namespaces):
+        for dbname in (ns, backend.KOA_CONFIG.usage_efficiency_db(ns)):
+            samples = [
+                (ts, (ts // step + i) % 13 / 13.0, (ts // step + i) % 7 / 7.0)
+                for ts in range(end - days * 86400, end, step)
+            ]
+            backend.Rrd(db_files_location=db_location, dbname=dbname).add_samples(samples)
+    return namespaces
+
+
+def bench_export(args):
+    with tempfile.TemporaryDirectory() as db_location:
+        # spawned analytics workers read their configuration from the environment
+        os.environ["KL_DB_LOCATION"] = db_location
+        namespaces = make_rrd_files(db_location, args.namespaces)
+        rf_dbfiles = [backend.KOA_CONFIG.usage_efficiency_db(ns) for ns in namespaces]
+        print("RRD files: %d namespaces with their __rf twins" % len(namespaces))
+        baseline = None
+        for worker_count in [0, 1, 2, 4, 8]:
+            pool = backend.AnalyticsWorkerPool(worker_count=worker_count)
+            backend.HISTOGRAM_ANALYTICS_ENGINE.states.clear()
+            try:
+                # first cycle: spawns the workers and computes every histogram bucket
+                cold = timeit.repeat(
+                    lambda pool=pool: pool.compute(namespaces, rf_dbfiles, [], int(time.time())), number=1, repeat=1
+                )
+                report("workers=%d first cycle" % worker_count, cold, len(namespaces), "namespace")
+                steady = report(
+                    "workers=%d next cycles" % worker_count,
+                    timeit.repeat(
+                        lambda pool=pool: pool.compute(namespaces, rf_dbfiles, [], int(time.time())),
+                        number=1,
+                        repeat=args.repeat,
+                    ),
+                    len(namespaces),
+                    "namespace",
+                )
+            finally:
+                pool.shutdown()
+            baseline = steady if baseline is None else baseline
+            print("speedup vs in-process: x%.1f" % (baseline / steady))
+
+
+def bench_storage(args):
+    step = backend.KOA_CONFIG.polling_interval_sec
+    end = int(time.time()) - int(time.time()) % step
+    namespaces = ["namespace-%d" % i for i in range(args.namespaces)]
+    cycles = [
+        {ns: [(ts, (ts // step + i) % 13 / 13.0, (ts // step + i) % 7 / 7.0)] for i, ns in enumerate(namespaces)}
+        for ts in range(end - 24 * 3600, end, step)
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        backend.KOA_CONFIG.db_location = os.path.join(tmp_dir, "db")
+        storages = [
+            backend.RrdStorage(),
+            backend.SqliteStorage(os.path.join(tmp_dir, "db.sqlite")),
+            backend.MmapStorage(os.path.join(tmp_dir, "db.ring")),
+        ]
+        for storage in storages:
+            backend.TIME_SERIES_STORAGE = storage
+            for ns in namespaces:
+                backend.Rrd(db_files_location=backend.KOA_CONFIG.db_location, dbname=ns)
+            started = time.perf_counter()
+            for samples in cycles:
+                storage.write_many(samples)
+            report(
+                "%s write, one batch per cycle" % storage.name,
+                [time.perf_counter() - started],
+                len(cycles) * len(namespaces),
+                "sample",
+            )
+            report(
+                "%s 1-day hourly reads, one per database" % storage.name,
+                timeit.repeat(
+                    lambda storage=storage: [
+                        storage.read_points(backend.Rrd(dbname=ns), 3600, end - 24 * 3600, end) for ns in namespaces
+                    ],
+                    number=1,
+                    repeat=args.repeat,
+                ),
+                len(namespaces),
+                "namespace",
+            )
+            if storage.bulk_reads:
+                report(
+                    "%s 1-day hourly reads, one query" % storage.name,
+                    timeit.repeat(
+                        lambda storage=storage: storage.read_points_many(namespaces, 3600, end - 24 * 3600, end),
+                        number=1,
+                        repeat=args.repeat,
+                    ),
+                    len(namespaces),
+                    "namespace",
+                )
+
+
+def bench_backfill(args):
+    step = 3600
+    end = int(time.time()) - int(time.time()) % step
+    namespace_points = []
+    for i in range(args.namespaces):
+        ns = "namespace-%d" % i
+        namespace_points.append(
+            {
+                dbname: backend.compact_points(
+                    (ts, (ts // step + i) % 13 / 13.0, (ts // step + i) % 7 / 7.0)
+                    for ts in range(end - 30 * 86400, end + 1, step)
+                )
+                for dbname in (ns, backend.KOA_CONFIG.usage_efficiency_db(ns))
+            }
+        )
+    sample_count = 2 * len(namespace_points) * 30 * 86400 // backend.KOA_CONFIG.polling_interval_sec
+    print("backfill: %d namespaces, 30 days of hourly points" % args.namespaces)
+    for workers in [0, 1, 4, 8]:
+        with tempfile.TemporaryDirectory() as db_location:
+            # spawned backfill workers read their configuration from the environment
+            os.environ["KL_DB_LOCATION"] = db_location
+            backend.KOA_CONFIG.db_location = db_location
+            started = time.perf_counter()
+            backend.backfill(namespace_points, workers=workers)
+            backend.STORAGE_LOCK.release()
+            report("rrd backfill, workers=%d" % workers, [time.perf_counter() - started], sample_count, "sample")
+
+
+BENCHMARKS = {
+    "backfill": bench_backfill,
+    "dcgm": bench_dcgm,
+    "decode": bench_decode,
+    "export": bench_export,
+    "memory": bench_memory,
+    "quantity": bench_quantity,
+    "storage": bench_storage,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KubeLedger backend microbenchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS.keys()))
+    parser.add_argument("--repeat", type=int, default=20, help="number of timed runs (best is reported)")
+    parser.add_argument("--namespaces", type=int, default=500, help="number of namespaces of the export benchmark")
+    cli_args = parser.parse_args()
+    BENCHMARKS[cli_args.benchmark](cli_args)